@@ -45,4 +45,4 @@ check_syntax:
 
 .PHONY: clean
 clean:
-	rm -rf *.pyc __pycache__ parsetab.py *.out $(OUTPUTDIR)
+	rm -rf *.pyc __pycache__ parsetab.py *.out $(OUTPUTDIR) $(OUTPUTDIR).json $(OUTPUTDIR).lines.json
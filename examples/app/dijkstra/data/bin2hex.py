@@ -1,6 +1,6 @@
 #-------------------------------------------------------------------------------
 # bin2hex.py
-# 
+#
 # binary to Verilog HDL memory image in HEX
 #
 # Copyright (C) 2013, Shinya Takamaeda-Yamazaki
@@ -9,43 +9,164 @@
 
 import os
 import sys
+import mmap
+import binascii
 
-import struct
+# bytes converted at once
+CHUNK = 4 * 1024 * 1024
+# wider words are converted line by line, narrower ones by interleaving the digits
+INTERLEAVE_SIZE = 16
 
-def bin2hex(ifilename, ofilename, size):
+#-------------------------------------------------------------------------------
+def openInput(ifilename):
+    # memory-mapped, not to read a large image at once
     ifile = open(ifilename, 'rb')
-    ofile = open(ofilename, 'w')
-    line = []
-    index = 0
-
-    buf = ifile.read(1)
-    while buf:
-        line.append("%02x" % struct.unpack("B", buf)[0])
-        if (index % size) == (size -1):
-            line.append('\n')
-            ofile.write(''.join(reversed(line)))
-            line = []
-        buf = ifile.read(1)
-        index += 1
+    if os.fstat(ifile.fileno()).st_size == 0:
+        return (ifile, b'')
+    return (ifile, mmap.mmap(ifile.fileno(), 0, access=mmap.ACCESS_READ))
+
+def closeInput(ifile, data):
+    if isinstance(data, mmap.mmap):
+        data.close()
+    ifile.close()
+
+def getChunkSize(size):
+    return max(CHUNK - CHUNK % size, size)
+
+def reverseWords(data, size):
+    # byte order of every 'size'-byte word is reversed
+    if size == 1: return data
+    ret = bytearray(len(data))
+    for i in range(size):
+        ret[i::size] = data[size-1-i::size]
+    return ret
+
+def toLines(hexdata, width, head):
+    # a newline in front of (head) or behind every 'width' hex digits
+    num = len(hexdata) // width
+    ret = bytearray(num * (width + 1))
+    offset = 1 if head else 0
+    ret[(0 if head else width)::width+1] = b'\n' * num
+    for i in range(width):
+        ret[i+offset::width+1] = hexdata[i::width]
+    return ret
+
+def toWordLines(data, size):
+    width = size * 2
+    if size <= INTERLEAVE_SIZE:
+        return toLines(binascii.hexlify(reverseWords(data, size)), width, True)
+    # bytes of the whole chunk reversed: the words come in the reverse order
+    hexdata = binascii.hexlify(data[::-1])
+    return b'\n' + b'\n'.join([ hexdata[pos-width:pos]
+                                for pos in range(len(hexdata), 0, -width) ])
+
+#-------------------------------------------------------------------------------
+def bin2hex(ifilename, ofilename, size):
+    (ifile, data) = openInput(ifilename)
+    ofile = open(ofilename, 'wb')
+    # an incomplete word at the end is dropped
+    length = len(data) - len(data) % size
+    chunksize = getChunkSize(size)
+    for pos in range(0, length, chunksize):
+        chunk = data[pos:min(pos+chunksize, length)]
+        ofile.write(toWordLines(chunk, size))
+    ofile.close()
+    closeInput(ifile, data)
 
 def bin2hex_bank(ifilename, ofilename, size):
-    ifile = open(ifilename, 'rb')
+    (ifile, data) = openInput(ifilename)
     ofilelist = []
     for i in range(size):
-        ofilelist.append( open( ("%03d" % i) + ofilename, 'w') )
+        ofilelist.append( open( ("%03d" % i) + ofilename, 'wb') )
+
+    chunksize = getChunkSize(size)
+    for pos in range(0, len(data), chunksize):
+        chunk = data[pos:pos+chunksize]
+        for i in range(size):
+            ofilelist[i].write( toLines(binascii.hexlify(chunk[i::size]), 2, False) )
+
+    for ofile in ofilelist:
+        ofile.close()
+    closeInput(ifile, data)
 
-    index = 0
-    buf = ifile.read(1)
-    while buf:
-        ofilelist[ index % size ].write( ("%02x\n" % struct.unpack("B", buf)[0]) )
-        buf = ifile.read(1)
-        index += 1
+#-------------------------------------------------------------------------------
+def getHexText(ifilename):
+    # chunks of the text, cut at whitespaces
+    ifile = open(ifilename, 'rb')
+    rest = b''
+    while True:
+        buf = ifile.read(CHUNK)
+        if not buf: break
+        buf = rest + buf
+        # the last word can continue in the next chunk
+        pos = max([ buf.rfind(c) for c in (b'\n', b' ', b'\t', b'\r') ])
+        rest = buf[pos+1:]
+        if pos >= 0: yield buf[:pos+1]
+    if rest: yield rest
+    ifile.close()
+
+def textToBytes(text, size, ifilename):
+    width = size * 2
+    body = text.strip()
+    num = (len(body) + 1) // (width + 1)
+    if (size <= INTERLEAVE_SIZE and len(body) == num * (width + 1) - 1 and
+        body[width::width+1] == b'\n' * (num - 1)):
+        # a word of full width in every line: the digits are converted at once
+        return reverseWords(binascii.unhexlify(body.replace(b'\n', b'')), size)
+    words = text.split()
+    if not words: return b''
+    lengths = set(map(len, words))
+    if max(lengths) > width:
+        raise ValueError("Hex word longer than %d digits in %s" % (width, ifilename))
+    if lengths != set([width]):
+        words = [ w.zfill(width) for w in words ]
+    # reversed twice: the word order is kept, the byte order in a word is reversed
+    return binascii.unhexlify(b''.join(words[::-1]))[::-1]
+
+def getBytes(ifilename, size):
+    for text in getHexText(ifilename):
+        data = textToBytes(text, size, ifilename)
+        if data: yield data
 
+def hex2bin(ifilename, ofilename, size):
+    ofile = open(ofilename, 'wb')
+    for data in getBytes(ifilename, size):
+        ofile.write(data)
+    ofile.close()
+
+def hex2bin_bank(ifilename, ofilename, size):
+    readers = [ getBytes( ("%03d" % i) + ifilename, 1) for i in range(size) ]
+    buffers = [ b'' ] * size
+    ofile = open(ofilename, 'wb')
+    while True:
+        for i in range(size):
+            while readers[i] is not None and len(buffers[i]) < CHUNK:
+                try:
+                    buffers[i] = buffers[i] + next(readers[i])
+                except StopIteration:
+                    readers[i] = None
+        num = min(map(len, buffers))
+        if num == 0: break
+        data = bytearray(num * size)
+        for i in range(size):
+            data[i::size] = buffers[i][:num]
+            buffers[i] = buffers[i][num:]
+        ofile.write(data)
+
+    # the leading banks have one more byte than the others
+    tail = [ b for b in buffers if b ]
+    if len(tail) > 0 and (max(map(len, tail)) > 1 or
+                          [ b for b in buffers[:len(tail)] if not b ]):
+        raise ValueError("Inconsistent lengths of banked hex files: %s" % ifilename)
+    ofile.write(b''.join(tail))
+    ofile.close()
+
+#-------------------------------------------------------------------------------
 if __name__ == '__main__':
     from optparse import OptionParser
     INFO = "Binary to Verilog HDL memory image in HEX"
-    VERSION = "ver.1.0.0"
-    USAGE = "Usage: python bin2hex.py filename"
+    VERSION = "ver.1.1.0"
+    USAGE = "Usage: python bin2hex.py [--reverse] filename"
 
     def showVersion():
         print(INFO)
@@ -59,22 +180,37 @@ if __name__ == '__main__':
     optparser.add_option("--size",dest="size",type='int',
                          default=64,help="Chunk size, default=64")
     optparser.add_option("-o","--output",dest="outputfile",
-                         default="out.hex",help="Output file name, default=out.hex")
+                         default=None,help="Output file name, default=out.hex (out.bin with --reverse)")
     optparser.add_option("--bank",action="store_true",dest="bank",
                          default=False,help="Banked hex file mode")
+    optparser.add_option("--reverse",action="store_true",dest="reverse",
+                         default=False,help="HEX to binary (with --bank, filename is the name without the bank number)")
     (options, args) = optparser.parse_args()
-    
+
     filelist = args
     if options.showversion:
         showVersion()
 
+    if len(filelist) == 0:
+        showVersion()
+
     for f in filelist:
+        if options.reverse and options.bank:
+            f = "%03d" % 0 + f
         if not os.path.exists(f): raise IOError("file not found: %s" % f)
 
-    if len(filelist) == 0:
-        showVersion()
+    if options.size < 1:
+        raise ValueError("Chunk size should be 1 or more: %d" % options.size)
+
+    outputfile = options.outputfile
+    if outputfile is None:
+        outputfile = 'out.bin' if options.reverse else 'out.hex'
 
-    if options.bank:
-        bin2hex_bank(args[0], options.outputfile, options.size)
+    if options.reverse and options.bank:
+        hex2bin_bank(args[0], outputfile, options.size)
+    elif options.reverse:
+        hex2bin(args[0], outputfile, options.size)
+    elif options.bank:
+        bin2hex_bank(args[0], outputfile, options.size)
     else:
-        bin2hex(args[0], options.outputfile, options.size)
+        bin2hex(args[0], outputfile, options.size)
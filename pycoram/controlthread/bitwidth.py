@@ -0,0 +1,326 @@
+#-------------------------------------------------------------------------------
+# bitwidth.py
+#
+# Bit-width inference of control-thread variables by value-range analysis
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+import re
+
+import pyverilog.vparser.ast as vast
+
+# width of an unsized integer constant
+INTEGER_WIDTH = 32
+
+ARITH_OPS = (vast.Plus, vast.Minus, vast.Times, vast.Divide, vast.Mod,
+             vast.And, vast.Or, vast.Xor, vast.Xnor)
+SHIFT_OPS = (vast.Sll, vast.Srl, vast.Sla, vast.Sra, vast.Power)
+COMPARE_OPS = (vast.LessThan, vast.GreaterThan, vast.LessEq, vast.GreaterEq,
+               vast.Eq, vast.NotEq, vast.Eql, vast.NotEql)
+LOGICAL_OPS = (vast.Land, vast.Lor)
+REDUCTION_OPS = (vast.Ulnot, vast.Uand, vast.Unand, vast.Uor, vast.Unor, vast.Uxor, vast.Uxnor)
+
+#-------------------------------------------------------------------------------
+def getBitLength(value):
+    return max(1, len(bin(value)) - 2)
+
+def getIntConst(node):
+    # (value, width) of an integer constant
+    if isinstance(node.value, int): return (node.value, INTEGER_WIDTH)
+    v = str(node.value).replace('_', '')
+    m = re.match(r"^([0-9]*)'[sS]?([bBoOdDhH])([0-9a-fA-F]+)$", v)
+    if m is None:
+        if not re.match(r'^[0-9]+$', v): return None
+        return (int(v), INTEGER_WIDTH)
+    base = {'b':2, 'o':8, 'd':10, 'h':16}[m.group(2).lower()]
+    width = int(m.group(1)) if m.group(1) else INTEGER_WIDTH
+    return (int(m.group(3), base), width)
+
+#-------------------------------------------------------------------------------
+class BitwidthAnalyzer(object):
+    def __init__(self, fsm, variables, constants, signalwidth=32, maxwidth=None,
+                 annotations=None, optimize=None, passes=8):
+        self.fsm = fsm
+        self.variables = set(variables)
+        self.constants = constants
+        self.signalwidth = signalwidth
+        self.maxwidth = max(signalwidth, maxwidth) if maxwidth is not None else signalwidth
+        self.annotations = annotations if annotations is not None else {}
+        self.optimize = optimize if optimize is not None else (lambda x: x)
+        self.passes = passes
+
+        self.top = (0, 2 ** signalwidth - 1)
+        self.env = {}
+        self.widths = {}
+
+    #---------------------------------------------------------------------------
+    def getWidths(self):
+        # inferred widths of the variables narrower than the signal width
+        self.analyze()
+        return dict([ (k, v) for k, v in self.widths.items() if v < self.signalwidth ])
+
+    def analyze(self):
+        self.collect()
+        self.solve()
+        self.widths = {}
+        for var in self.variables:
+            if var in self.annotations:
+                self.widths[var] = self.annotations[var]
+                continue
+            iv = self.env.get(var)
+            if iv is None or iv == self.top:
+                self.widths[var] = self.signalwidth
+                continue
+            self.widths[var] = min(self.signalwidth, getBitLength(iv[1]))
+        self.legalize()
+
+    #---------------------------------------------------------------------------
+    def collect(self):
+        # assigned values of each variable, and all the expressions emitted
+        self.assigns = dict([ (var, []) for var in self.variables ])
+        self.roots = []
+        for state, bindlist in sorted(self.fsm.bind.items(), key=lambda x:x[0]):
+            for bind in bindlist:
+                if bind.dst is None:
+                    if not isinstance(bind.value, vast.SystemCall): continue
+                    if bind.value.syscall.startswith('coram_'): continue
+                    for arg in bind.value.args:
+                        if isinstance(arg, vast.StringConst): continue
+                        self.roots.append( (None, arg) )
+                    continue
+                if bind.dst.name in self.constants: continue
+                value = self.optimize(bind.value)
+                if bind.dst.name in self.assigns:
+                    self.assigns[bind.dst.name].append(value)
+                self.roots.append( (bind.dst.name, value) )
+                if bind.cond is not None:
+                    self.roots.append( (None, self.optimize(bind.cond)) )
+        for src, nodelist in self.fsm.dict.items():
+            for node in nodelist:
+                if node.cond is not None:
+                    self.roots.append( (None, self.optimize(node.cond)) )
+
+        # for-loop updates run only while the iterator is under the bound
+        self.guards = {}
+        for begin, (end, iter_node, step_node) in self.fsm.loop.items():
+            if iter_node is None or step_node is None: continue
+            if not isinstance(iter_node, vast.Identifier): continue
+            name = iter_node.name
+            if name not in self.assigns or len(self.assigns[name]) != 2: continue
+            step = self.optimize(step_node)
+            if not isinstance(step, vast.IntConst): continue
+            bound = None
+            for node in self.fsm.dict.get(begin, ()):
+                if (isinstance(node.cond, vast.LessThan) and
+                    isinstance(node.cond.left, vast.Identifier) and
+                    node.cond.left.name == name):
+                    bound = self.optimize(node.cond.right)
+            if bound is None: continue
+            update = self.optimize(vast.Plus(iter_node, step_node))
+            if update not in self.assigns[name]: continue
+            self.guards[(name, update)] = bound
+
+    def solve(self):
+        for var in self.variables:
+            if var in self.annotations:
+                self.env[var] = (0, 2 ** self.annotations[var] - 1)
+        count = 0
+        changed = True
+        while changed:
+            changed = False
+            count += 1
+            for var in sorted(self.variables):
+                if var in self.annotations: continue
+                iv = self.env.get(var)
+                for value in self.assigns[var]:
+                    r = self.evalAssign(var, value)
+                    if r is False: continue
+                    iv = self.join(iv, r)
+                if iv is None: continue
+                if iv[0] < 0 or iv[1] > self.top[1]: iv = self.top
+                old = self.env.get(var)
+                if iv == old: continue
+                # widening of the values that keep on growing: up to the next power of 2
+                if count > self.passes: iv = (iv[0], 2 ** getBitLength(iv[1]) - 1)
+                self.env[var] = iv
+                changed = True
+
+    def evalAssign(self, var, value):
+        # False when the value is not available yet
+        if (var, value) not in self.guards:
+            return self.getInterval(value, partial=True)
+        bound = self.getInterval(self.guards[(var, value)], partial=True)
+        cur = self.env.get(var)
+        if bound is False or cur is False or cur is None: return False
+        if bound is None: return self.getInterval(value, partial=True)
+        hi = min(cur[1], bound[1] - 1)
+        if hi < cur[0]: return False
+        saved = self.env[var]
+        self.env[var] = (cur[0], hi)
+        try:
+            return self.getInterval(value, partial=True)
+        finally:
+            self.env[var] = saved
+
+    #---------------------------------------------------------------------------
+    def join(self, a, b):
+        if a is None or a is False: return b
+        if b is None: return self.top
+        return (min(a[0], b[0]), max(a[1], b[1]))
+
+    def getInterval(self, node, partial=False):
+        # exact interval of the value, None: unknown, False: not available yet
+        if isinstance(node, vast.IntConst):
+            c = getIntConst(node)
+            if c is None: return None
+            return (c[0], c[0])
+        if isinstance(node, vast.Identifier):
+            if node.name in self.constants:
+                return self.getInterval(self.constants[node.name], partial)
+            if node.name in self.variables:
+                iv = self.env.get(node.name)
+                if iv is None: return False if partial else self.top
+                return iv
+            return (0, 2 ** self.maxwidth - 1)
+        if isinstance(node, COMPARE_OPS + LOGICAL_OPS + REDUCTION_OPS):
+            for c in node.children():
+                if self.getInterval(c, partial) is False: return False
+            return (0, 1)
+        if isinstance(node, vast.Cond):
+            c = self.getInterval(node.cond, partial)
+            t = self.getInterval(node.true_value, partial)
+            f = self.getInterval(node.false_value, partial)
+            if c is False or t is False or f is False: return False
+            if t is None or f is None: return None
+            return (min(t[0], f[0]), max(t[1], f[1]))
+        if isinstance(node, vast.Uplus):
+            return self.getInterval(node.right, partial)
+        if isinstance(node, vast.Uminus):
+            r = self.getInterval(node.right, partial)
+            if r is False or r is None: return r
+            return (-r[1], -r[0])
+        if isinstance(node, ARITH_OPS + SHIFT_OPS):
+            a = self.getInterval(node.left, partial)
+            b = self.getInterval(node.right, partial)
+            if a is False or b is False: return False
+            if a is None or b is None: return None
+            return self.getBinaryInterval(node, a, b)
+        return None
+
+    def getBinaryInterval(self, node, a, b):
+        if isinstance(node, vast.Plus):
+            return (a[0] + b[0], a[1] + b[1])
+        if isinstance(node, vast.Minus):
+            return (a[0] - b[1], a[1] - b[0])
+        if isinstance(node, vast.Times):
+            p = (a[0] * b[0], a[0] * b[1], a[1] * b[0], a[1] * b[1])
+            return (min(p), max(p))
+        # the others are only for non-negative values
+        if a[0] < 0 or b[0] < 0: return None
+        if isinstance(node, vast.Divide):
+            if b[0] == 0: return None
+            return (a[0] // b[1], a[1] // b[0])
+        if isinstance(node, vast.Mod):
+            if b[0] == 0: return None
+            return (0, min(a[1], b[1] - 1))
+        if isinstance(node, vast.And):
+            return (0, min(a[1], b[1]))
+        if isinstance(node, (vast.Or, vast.Xor)):
+            lo = max(a[0], b[0]) if isinstance(node, vast.Or) else 0
+            return (lo, 2 ** getBitLength(max(a[1], b[1])) - 1)
+        if isinstance(node, (vast.Sll, vast.Sla)):
+            if b[1] > self.maxwidth: return None
+            return (a[0] << b[0], a[1] << b[1])
+        if isinstance(node, (vast.Srl, vast.Sra)):
+            return (a[0] >> min(b[1], self.maxwidth), a[1] >> min(b[0], self.maxwidth))
+        if isinstance(node, vast.Power):
+            if b[1] > self.maxwidth: return None
+            return (a[0] ** b[0], a[1] ** b[1])
+        return None
+
+    #---------------------------------------------------------------------------
+    def getWidth(self, node, narrowed=True):
+        # lower bound of the self-determined width of an expression
+        if isinstance(node, vast.IntConst):
+            c = getIntConst(node)
+            return INTEGER_WIDTH if c is None else c[1]
+        if isinstance(node, vast.Identifier):
+            if node.name in self.constants: return INTEGER_WIDTH
+            if node.name in self.variables:
+                return self.widths[node.name] if narrowed else self.signalwidth
+            return 1
+        if isinstance(node, COMPARE_OPS + LOGICAL_OPS + REDUCTION_OPS):
+            return 1
+        if isinstance(node, vast.Cond):
+            return max(self.getWidth(node.true_value, narrowed),
+                       self.getWidth(node.false_value, narrowed))
+        if isinstance(node, SHIFT_OPS):
+            return self.getWidth(node.left, narrowed)
+        if isinstance(node, ARITH_OPS):
+            return max(self.getWidth(node.left, narrowed), self.getWidth(node.right, narrowed))
+        if isinstance(node, vast.UnaryOperator):
+            return self.getWidth(node.right, narrowed)
+        return 1
+
+    def getDstWidth(self, name, narrowed=True):
+        if name is None or name not in self.variables: return 1
+        return self.widths[name] if narrowed else self.signalwidth
+
+    def isExact(self, node, width, orig):
+        # an expression evaluated in a narrower context than before
+        # must not overflow or underflow there
+        if width < orig:
+            iv = self.getInterval(node)
+            if iv is None or iv[0] < 0 or iv[1] >= 2 ** width: return False
+        if isinstance(node, (vast.IntConst, vast.Identifier)):
+            return True
+        if isinstance(node, COMPARE_OPS):
+            w = max(self.getWidth(node.left), self.getWidth(node.right))
+            o = max(self.getWidth(node.left, False), self.getWidth(node.right, False))
+            return self.isExact(node.left, w, o) and self.isExact(node.right, w, o)
+        if isinstance(node, LOGICAL_OPS + REDUCTION_OPS):
+            for c in node.children():
+                if not self.isExact(c, self.getWidth(c), self.getWidth(c, False)): return False
+            return True
+        if isinstance(node, vast.Cond):
+            return (self.isExact(node.cond, self.getWidth(node.cond), self.getWidth(node.cond, False)) and
+                    self.isExact(node.true_value, width, orig) and
+                    self.isExact(node.false_value, width, orig))
+        if isinstance(node, SHIFT_OPS):
+            return (self.isExact(node.left, width, orig) and
+                    self.isExact(node.right, self.getWidth(node.right), self.getWidth(node.right, False)))
+        if isinstance(node, ARITH_OPS):
+            return self.isExact(node.left, width, orig) and self.isExact(node.right, width, orig)
+        if isinstance(node, vast.UnaryOperator):
+            return self.isExact(node.right, width, orig)
+        return not self.getNarrowed(node)
+
+    def getNarrowed(self, node):
+        ret = set()
+        if isinstance(node, vast.Identifier):
+            if (node.name in self.variables and node.name not in self.annotations and
+                self.widths[node.name] < self.signalwidth):
+                ret.add(node.name)
+            return ret
+        if isinstance(node, vast.Node):
+            for c in node.children():
+                ret.update(self.getNarrowed(c))
+        return ret
+
+    def legalize(self):
+        # widen the variables in the expressions that may change their results
+        changed = True
+        while changed:
+            changed = False
+            for dst, value in self.roots:
+                width = max(self.getDstWidth(dst), self.getWidth(value))
+                orig = max(self.getDstWidth(dst, False), self.getWidth(value, False))
+                if self.isExact(value, width, orig): continue
+                narrowed = self.getNarrowed(value)
+                if dst is not None: narrowed.update(self.getNarrowed(vast.Identifier(dst)))
+                for var in narrowed:
+                    self.widths[var] = self.signalwidth
+                    changed = True
@@ -11,20 +11,26 @@ from __future__ import print_function
 import os
 import sys
 import math
-import fractions
 
 import pycoram.controlthread.maketree as maketree
+from pycoram.controlthread.optimizer import CachedOptimizer
+from pycoram.controlthread.bitwidth import BitwidthAnalyzer
 
 import pyverilog.vparser.ast as vast
-import pyverilog.dataflow.optimizer as vopt
 import pyverilog.dataflow.dataflow as vdflow
-import pyverilog.utils.scope as vscope
 from pyverilog.ast_code_generator.codegen import ASTCodeGenerator
 
 #-------------------------------------------------------------------------------
 def log2(v):
     return int(math.ceil(math.log(v, 2)))
 
+if hasattr(math, 'gcd'):
+    gcd = math.gcd
+else:
+    from fractions import gcd
+
+FSM_ENCODINGS = ('binary', 'onehot', 'gray')
+
 #-------------------------------------------------------------------------------
 class CodeGenerator(object):
     def __init__(self, threadname, coram_memories, coram_instreams, coram_outstreams,
@@ -34,7 +40,11 @@ class CodeGenerator(object):
                  signalwidth=64,
                  ext_addrwidth=64, 
                  ext_max_datawidth=512,
-                 fsm_name='state'):
+                 fsm_name='state',
+                 fsm_compaction=False,
+                 fsm_scheduling=False,
+                 fsm_encoding='binary',
+                 bitwidth_inference=False):
         self.threadname = threadname
 
         self.coram_memories = {}
@@ -76,8 +86,23 @@ class CodeGenerator(object):
         if ext_max_datawidth % 8 != 0 or math.log(ext_max_datawidth/8, 2) % 1.0 != 0.0:
             raise ValueError("CoRAM external data width should be greater than 8 and power of 2.")
         self.fsm_name = fsm_name
-
-        self.vopt = vopt.VerilogOptimizer({}, default_width=signalwidth)
+        if fsm_encoding not in FSM_ENCODINGS:
+            raise ValueError("FSM encoding should be one of %s, not '%s'." %
+                             (', '.join(FSM_ENCODINGS), fsm_encoding))
+        self.fsm_encoding = fsm_encoding
+        self.fsm_compaction = fsm_compaction
+        self.fsm_scheduling = fsm_scheduling
+        self.fsm_states_before = None
+        self.fsm_states_after = None
+        self.cycles_before = None
+        self.cycles_per_iteration = None
+        self.loop_mapping = None
+        self.bitwidth_inference = bitwidth_inference
+        self.widths = {}
+        # register name -> bit-width in the generated module
+        self.registers = None
+
+        self.optimizer = CachedOptimizer(default_width=signalwidth)
         self.binds = {}
         self.const_binds = {}
         self.parameters = set([])
@@ -93,20 +118,14 @@ class CodeGenerator(object):
         for name, bindlist in sorted(self.binds.items(), key=lambda x:x[1][0][0]): # younger state order
             if len(bindlist) > 1: continue
             for state, value, cond in bindlist:
-                opt_dfvalue = self.vopt.optimize(maketree.getDFTree(value))
+                opt_dfvalue = self.optimizer.optimizeDF(value)
                 if isinstance(opt_dfvalue, vdflow.DFEvalValue):
-                    varname = vscope.ScopeChain( (vscope.ScopeLabel(name),) )
-                    self.vopt.setConstant(varname, opt_dfvalue)
-                    termtypes = set(['Parameter'])
-                    term = vdflow.Term(varname, termtypes, vdflow.DFEvalValue(31), vdflow.DFEvalValue(0))
-                    self.vopt.setTerm(varname, term)
+                    self.optimizer.setConstant(name, opt_dfvalue)
                     self.const_binds[name] = maketree.makeASTTree(opt_dfvalue)
 
     #-------------------------------------------------------------------------
     def _optimize(self, node):
-        opt_dfnode = self.vopt.optimize(maketree.getDFTree(node))
-        opt_node = maketree.makeASTTree(opt_dfnode)
-        return opt_node
+        return self.optimizer.optimize(node)
 
     #-------------------------------------------------------------------------
     def _optimizeCoramArguments(self):
@@ -157,7 +176,7 @@ class CodeGenerator(object):
                              obj.datawidth if obj.scattergather is None else
                              obj.datawidth if not obj.scattergather else
                              obj.datawidth * obj.length)
-        ext_datawidth = fractions.gcd(req_ext_datawidth, self.ext_max_datawidth)
+        ext_datawidth = gcd(req_ext_datawidth, self.ext_max_datawidth)
         obj.ext_datawidth = ext_datawidth
 
         obj.numranks = (None if obj.length is None else
@@ -723,6 +742,41 @@ class CodeGenerator(object):
                          finish_m1)
         self.fsm.setBind(vast.Identifier('finish'), vast.IntConst('1'), finish_m1)
 
+    #----------------------------------------------------------------------------
+    def _compactFsm(self):
+        self.fsm_states_before = self.fsm.getNumStates()
+        self.fsm.foldConstantBranches(self._optimize)
+        self.cycles_before = self.fsm.getCyclesPerIteration()
+        variables = set(self._getVariableNames())
+        if self.fsm_scheduling:
+            mapping, self.loop_mapping = self.fsm.schedule(variables, ignore=self.const_binds,
+                                                           optimize=self._optimize)
+        else:
+            mapping, self.loop_mapping = self.fsm.compact(variables, ignore=self.const_binds,
+                                                          optimize=self._optimize)
+        self.fsm_states_after = self.fsm.getNumStates()
+
+    #----------------------------------------------------------------------------
+    def _inferBitwidth(self):
+        variables = [ v for v in self._getVariableNames() if v not in self.const_binds ]
+        annotations = {}
+        for name, width in self.scope.getWidths().items():
+            if name not in variables: continue
+            if width > self.signalwidth:
+                print("Warning: bit-width annotation of '%s' is wider than signal width %d" %
+                      (name, self.signalwidth))
+                width = self.signalwidth
+            annotations[name] = width
+        if not self.bitwidth_inference:
+            self.widths = annotations
+            return
+        analyzer = BitwidthAnalyzer(self.fsm, variables, self.const_binds,
+                                    signalwidth=self.signalwidth,
+                                    maxwidth=max(self.ext_addrwidth, self.ext_max_datawidth),
+                                    annotations=annotations,
+                                    optimize=self._optimize)
+        self.widths = analyzer.getWidths()
+
     #----------------------------------------------------------------------------
     def _generateModulePort(self):
         portlist = []
@@ -890,10 +944,8 @@ class CodeGenerator(object):
         return portlist
 
     #----------------------------------------------------------------------------
-    def _generateVariableDefinition(self):
-        signalwidth = vast.Width(vast.IntConst(str(self.signalwidth-1)), vast.IntConst('0'))
-        signallist = []
-
+    def _getVariableNames(self):
+        names = []
         for frame in self.scope.scopeframes:
             for variable in frame.variables:
                 vname = frame.searchVariable(variable)
@@ -905,44 +957,97 @@ class CodeGenerator(object):
                     vname in self.coram_iochannels or 
                     vname in self.coram_ioregisters):
                     continue
-                if vname in self.const_binds:
-                    signallist.append( vast.Parameter(vname, self.const_binds[vname]) )
-                    self.parameters.add( vname )
-                    continue
-                signallist.append( vast.Reg(vname, width=signalwidth) )
+                names.append(vname)
+        return names
+
+    #----------------------------------------------------------------------------
+    def _generateVariableDefinition(self):
+        signalwidth = vast.Width(vast.IntConst(str(self.signalwidth-1)), vast.IntConst('0'))
+        signallist = []
+
+        for vname in self._getVariableNames():
+            if vname in self.const_binds:
+                signallist.append( vast.Parameter(vname, self.const_binds[vname]) )
+                self.parameters.add( vname )
+                continue
+            if vname in self.widths:
+                width = vast.Width(vast.IntConst(str(self.widths[vname]-1)), vast.IntConst('0'))
+                signallist.append( vast.Reg(vname, width=width) )
+                continue
+            signallist.append( vast.Reg(vname, width=signalwidth) )
         return signallist
 
+    #----------------------------------------------------------------------------
+    def _getStateWidth(self):
+        if self.fsm_encoding == 'onehot':
+            return max(max(self.fsm.getStates()) + 1, self.fsm.count)
+        return log2(self.fsm.count) + 1
+
+    def _getStateCode(self, state):
+        # value of the state register
+        if self.fsm_encoding == 'onehot':
+            return 1 << state
+        if self.fsm_encoding == 'gray':
+            return state ^ (state >> 1)
+        return state
+
+    def _getStateValue(self, state):
+        if self.fsm_encoding == 'onehot':
+            return vast.IntConst("%d'h%x" % (self._getStateWidth(), self._getStateCode(state)))
+        if self.fsm_encoding == 'gray':
+            width = self._getStateWidth()
+            return vast.IntConst("%d'b%s" % (width, bin(self._getStateCode(state))[2:].zfill(width)))
+        return vast.IntConst(str(state))
+
+    def _getStateCaseCond(self, state):
+        if self.fsm_encoding == 'onehot':
+            return vast.Pointer(vast.Identifier(self.fsm_name), vast.IntConst(str(state)))
+        return self._getStateValue(state)
+
+    def _getStateCaseStatement(self, caselist):
+        if self.fsm_encoding == 'onehot':
+            # reverse case statement: a single bit is examined for each state
+            return vast.CaseStatement(vast.IntConst("1'b1"), caselist)
+        return vast.CaseStatement(vast.Identifier(self.fsm_name), caselist)
+
     #----------------------------------------------------------------------------
     def _generateFsm(self):
         items = []
-        fsm_width = vast.Width(vast.IntConst(str(log2(self.fsm.count)-1+1)), vast.IntConst('0'))
+        fsm_width = vast.Width(vast.IntConst(str(self._getStateWidth()-1)), vast.IntConst('0'))
         items.append( vast.Reg(self.fsm_name, width=fsm_width) )
 
         fsm_statement = []
 
-        fsm_reset_subs = vast.NonblockingSubstitution(vast.Identifier(self.fsm_name), vast.IntConst('0'))
+        fsm_reset_subs = vast.NonblockingSubstitution(vast.Identifier(self.fsm_name), self._getStateValue(0))
         fsm_reset = vast.Block( (fsm_reset_subs,) )
 
         fsm_caselist = []
         for src, nodelist in self.fsm.dict.items():
-            case_cond = (vast.IntConst(str(src)),)
+            case_cond = (self._getStateCaseCond(src),)
             case_stmt = []
             for node in nodelist:
                 if node.cond is None: # normal
                     case_stmt.append(vast.NonblockingSubstitution(vast.Identifier(self.fsm_name),
-                                                                  vast.IntConst(str(node.dst))))
+                                                                  self._getStateValue(node.dst)))
+                elif node.elsedst is None: # dispatch
+                    opt_cond = self._optimize(node.cond)
+                    transcond = vast.IfStatement(opt_cond,
+                                                 vast.NonblockingSubstitution(vast.Identifier(self.fsm_name),
+                                                                              self._getStateValue(node.dst)),
+                                                 None)
+                    case_stmt.append(transcond)
                 else: # branch
                     opt_cond = self._optimize(node.cond)
                     transcond = vast.IfStatement(opt_cond,
                                                  vast.NonblockingSubstitution(vast.Identifier(self.fsm_name),
-                                                                              vast.IntConst(str(node.dst))),
+                                                                              self._getStateValue(node.dst)),
                                                  vast.NonblockingSubstitution(vast.Identifier(self.fsm_name),
-                                                                              vast.IntConst(str(node.elsedst))))
+                                                                              self._getStateValue(node.elsedst)))
                     case_stmt.append(transcond)
 
             fsm_caselist.append( vast.Case(case_cond, vast.Block(tuple(case_stmt))) )
 
-        fsm_case = vast.CaseStatement(vast.Identifier(self.fsm_name), tuple(fsm_caselist))
+        fsm_case = self._getStateCaseStatement(tuple(fsm_caselist))
         fsm_main = fsm_case
 
         fsm_if = vast.IfStatement(vast.Eq(vast.Identifier('RST'), vast.IntConst('1')), fsm_reset, fsm_main)
@@ -960,7 +1065,7 @@ class CodeGenerator(object):
         bind_statement = []
         bind_caselist = {}
         for state, bindlist in self.fsm.bind.items():
-            case_cond = (vast.IntConst(str(state)),)
+            case_cond = (self._getStateCaseCond(state),)
             case_stmt = []
 
             for bind in bindlist:
@@ -1014,7 +1119,7 @@ class CodeGenerator(object):
                 new_case_stmt = tuple(bind_caselist[state].statement + case_stmt)
                 bind_caselist[state] = vast.Case(case_cond, vast.Block(new_case_stmt))
 
-        bind_case = vast.CaseStatement(vast.Identifier(self.fsm_name), tuple(bind_caselist.values()))
+        bind_case = self._getStateCaseStatement(tuple(bind_caselist.values()))
         bind_statement.append(bind_case)
 
         bind_senslist = (vast.Sens(vast.Identifier('CLK'),'posedge'), )
@@ -1048,10 +1153,77 @@ class CodeGenerator(object):
 
         self._insertCommand()
         self._insertFinish()
+        if self.fsm_compaction or self.fsm_scheduling:
+            self._compactFsm()
+        self.cycles_per_iteration = self.fsm.getCyclesPerIteration()
+        self._inferBitwidth()
         portlist.extend(self._generateModulePort())
         signallist.extend(self._generateVariableDefinition())
         items.extend(self._generateFsm())
         items.extend(self._generateBind())
         source = self._generateSource(paramlist, portlist, signallist, items)
+        self.registers = self._getRegisters(portlist + signallist + items)
         code = self._generateCode(source)
         return code
+
+    #----------------------------------------------------------------------------
+    def _getRegisters(self, items):
+        ret = {}
+        for item in items:
+            regs = (item.list if isinstance(item, vast.Decl) else
+                    (item.second,) if isinstance(item, vast.Ioport) else
+                    (item,))
+            for reg in regs:
+                if not isinstance(reg, vast.Reg): continue
+                ret[reg.name] = self._getRegisterWidth(reg.width)
+        return ret
+
+    def _getRegisterWidth(self, width):
+        if width is None: return 1
+        if (not isinstance(width.msb, vast.IntConst) or
+            not isinstance(width.lsb, vast.IntConst)):
+            return self.signalwidth
+        return abs(int(width.msb.value) - int(width.lsb.value)) + 1
+
+    #----------------------------------------------------------------------------
+    def getCyclesPerIteration(self):
+        return self.cycles_per_iteration
+
+    def getRegisters(self):
+        return self.registers
+
+    def getNumStates(self):
+        # states of the generated FSM, with the finishing states
+        return self.fsm.getNumStates()
+
+    def getLineTable(self):
+        # (state, value of the state register, source line numbers) of each state
+        return { 'width' : self._getStateWidth(),
+                 'states' : [ (state, self._getStateCode(state), self.fsm.getLines(state))
+                              for state in sorted(self.fsm.getStates()) ] }
+
+    #----------------------------------------------------------------------------
+    def dump(self, buf=sys.stdout):
+        if self.fsm_states_before is not None:
+            print("  FSM %s: %d states -> %d states" %
+                  ('scheduling' if self.fsm_scheduling else 'compaction',
+                   self.fsm_states_before, self.fsm_states_after), file=buf)
+        if self.widths:
+            before = self.signalwidth * len(self.widths)
+            after = sum(self.widths.values())
+            print("  Bit-width inference: %d registers, %d bits -> %d bits (%d bits saved)" %
+                  (len(self.widths), before, after, before - after), file=buf)
+            for name, width in sorted(self.widths.items()):
+                print("    %s: %d -> %d" % (name, self.signalwidth, width), file=buf)
+        if not self.cycles_per_iteration: return
+        print("  Cycles per iteration (without stalls):", file=buf)
+        before = {}
+        if self.cycles_before is not None:
+            for loop, cycles in self.cycles_before.items():
+                if loop in self.loop_mapping: before[self.loop_mapping[loop]] = cycles
+        for (begin, end), cycles in sorted(self.cycles_per_iteration.items()):
+            if (begin, end) in before:
+                print("    Loop (State:%d-%d): %s -> %s" %
+                      (begin, end, before[(begin, end)], cycles), file=buf)
+            else:
+                print("    Loop (State:%d-%d): %s" % (begin, end, cycles), file=buf)
@@ -11,11 +11,18 @@ from __future__ import print_function
 import os
 import sys
 import ast
+import time
 import inspect
+import multiprocessing
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 from pycoram.controlthread.fsm import Fsm
 from pycoram.controlthread.scope import ScopeFrameList
 from pycoram.controlthread.codegen import CodeGenerator
+from pycoram.controlthread.optimizer import CachedOptimizer
 from pycoram.controlthread.coram_module import CoramBase
 from pycoram.controlthread.coram_module import CoramMemory
 from pycoram.controlthread.coram_module import CoramInStream
@@ -24,11 +31,11 @@ from pycoram.controlthread.coram_module import CoramChannel
 from pycoram.controlthread.coram_module import CoramRegister
 from pycoram.controlthread.coram_module import CoramIoChannel
 from pycoram.controlthread.coram_module import CoramIoRegister
-import pycoram.controlthread.maketree as maketree
 import pycoram.controlthread.voperator as voperator
+import pycoram.utils.cache as cache
+import pycoram.utils.profiler as profiler
     
 import pyverilog.vparser.ast as vast
-import pyverilog.dataflow.optimizer as vopt
 
 CORAM_MEMORY='CoramMemory'
 CORAM_INSTREAM='CoramInStream'
@@ -38,6 +45,15 @@ CORAM_REGISTER='CoramRegister'
 CORAM_IOCHANNEL='CoramIoChannel'
 CORAM_IOREGISTER='CoramIoRegister'
 
+# default values of the compile options
+DEFAULT_OPTIONS = {
+    'fsm_compaction' : False,
+    'fsm_scheduling' : False,
+    'fsm_encoding' : 'binary',
+    'subroutine_threshold' : 0,
+    'bitwidth_inference' : False,
+}
+
 #-------------------------------------------------------------------------------
 # Management Functions
 #-------------------------------------------------------------------------------
@@ -51,7 +67,8 @@ class FunctionVisitor(ast.NodeVisitor):
 
 #-------------------------------------------------------------------------------
 class CompileVisitor(ast.NodeVisitor):
-    def __init__(self, thread_name, functions, default_width=64):
+    def __init__(self, thread_name, functions, default_width=64, lazy_optimize=True,
+                 subroutine_threshold=0):
         self.thread_name = thread_name
         self.coram_memories = {}
         self.coram_instreams = {}
@@ -65,12 +82,18 @@ class CompileVisitor(ast.NodeVisitor):
         self.fsm = Fsm()
         self.import_list = {}
         self.importfrom_list = {}
-        self.vopt = vopt.VerilogOptimizer({}, default_width=default_width)
+        self.optimizer = CachedOptimizer(default_width=default_width)
+        # bind values are optimized only once by CodeGenerator, after constant discovery
+        self.lazy_optimize = lazy_optimize
+        # functions compiled once into shared sub-FSMs
+        self.subroutine_threshold = subroutine_threshold
+        self.subroutines = {}
+        self.call_counts = {}
 
         for func in functions.values():
             self.scope.addFunction(func)
         
-    def dump(self):
+    def dump(self, buf=sys.stdout):
         memories = {}
         instreams = {}
         outstreams = {}
@@ -114,72 +137,78 @@ class CompileVisitor(ast.NodeVisitor):
             if mv.name not in ioregisters_alias: ioregisters_alias[mv.name] = []
             ioregisters_alias[mv.name].append( mk )
 
-        print("----------------------------------------")
+        print("----------------------------------------", file=buf)
         print("CoRAM Objects in Control-Thread '%s', # FSM = %d" %
-              (self.thread_name, self.getFsmCount()))
+              (self.thread_name, self.getFsmCount()), file=buf)
 
         if len(memories) > 0:
-            print('  CoRAM CoramMemory:')
+            print('  CoRAM CoramMemory:', file=buf)
         for mk, mv in sorted(memories.items(), key=lambda x:int(str(x[1].idx))):
             slist = ['    ', str(mv), ' alias:']
             for a in memories_alias[mk]:
                 slist.append(' ')
                 slist.append(a)
-            print(''.join(slist))
+            print(''.join(slist), file=buf)
 
         if len(instreams) > 0:
-            print('  CoRAM CoramInStream:')
+            print('  CoRAM CoramInStream:', file=buf)
         for mk, mv in sorted(instreams.items(), key=lambda x:int(str(x[1].idx))):
             slist = ['    ', str(mv), ' alias:']
             for a in instreams_alias[mk]:
                 slist.append(' ')
                 slist.append(a)
-            print(''.join(slist))
+            print(''.join(slist), file=buf)
 
         if len(outstreams) > 0:
-            print('  CoRAM CoramOutstream:')
+            print('  CoRAM CoramOutstream:', file=buf)
         for mk, mv in sorted(outstreams.items(), key=lambda x:int(str(x[1].idx))):
             slist = ['    ', str(mv), ' alias:']
             for a in outstreams_alias[mk]:
                 slist.append(' ')
                 slist.append(a)
-            print(''.join(slist))
+            print(''.join(slist), file=buf)
 
         if len(channels) > 0:
-            print('  CoRAM CoramChannel:')
+            print('  CoRAM CoramChannel:', file=buf)
         for mk, mv in sorted(channels.items(), key=lambda x:int(str(x[1].idx))):
             slist = ['    ', str(mv), ' alias:']
             for a in channels_alias[mk]:
                 slist.append(' ')
                 slist.append(a)
-            print(''.join(slist))
+            print(''.join(slist), file=buf)
 
         if len(registers) > 0:
-            print('  CoRAM CoramRegister:')
+            print('  CoRAM CoramRegister:', file=buf)
         for mk, mv in sorted(registers.items(), key=lambda x:int(str(x[1].idx))):
             slist = ['    ', str(mv), ' alias:']
             for a in registers_alias[mk]:
                 slist.append(' ')
                 slist.append(a)
-            print(''.join(slist))
+            print(''.join(slist), file=buf)
 
         if len(iochannels) > 0:
-            print('  CoRAM CoramIoChannel:')
+            print('  CoRAM CoramIoChannel:', file=buf)
         for mk, mv in sorted(iochannels.items(), key=lambda x:int(str(x[1].idx))):
             slist = ['    ', str(mv), ' alias:']
             for a in iochannels_alias[mk]:
                 slist.append(' ')
                 slist.append(a)
-            print(''.join(slist))
+            print(''.join(slist), file=buf)
 
         if len(ioregisters) > 0:
-            print('  CoRAM CoramIoRegister:')
+            print('  CoRAM CoramIoRegister:', file=buf)
         for mk, mv in sorted(ioregisters.items(), key=lambda x:int(str(x[1].idx))):
             slist = ['    ', str(mv), ' alias:']
             for a in ioregisters_alias[mk]:
                 slist.append(' ')
                 slist.append(a)
-            print(''.join(slist))
+            print(''.join(slist), file=buf)
+
+        if len(self.subroutines) > 0:
+            print('  Subroutine:', file=buf)
+        for sub in sorted(self.subroutines.values(), key=lambda x:x['entry']):
+            print('    %s (State:%d-%d, # Call = %d)' %
+                  (sub['name'], sub['entry'], sub['exit'], sub['calls']), file=buf)
 
     def getStatus(self):
         return (self.coram_memories,
@@ -188,6 +217,17 @@ class CompileVisitor(ast.NodeVisitor):
                 self.coram_iochannels, self.coram_ioregisters,
                 self.scope, self.fsm)
 
+    #-------------------------------------------------------------------------
+    def visit(self, node):
+        # the states created in a statement are tagged with its line number
+        if not isinstance(node, ast.stmt):
+            return ast.NodeVisitor.visit(self, node)
+        lineno = self.fsm.getLineno()
+        self.fsm.setLineno(node.lineno)
+        ret = ast.NodeVisitor.visit(self, node)
+        self.fsm.setLineno(lineno)
+        return ret
+
     #-------------------------------------------------------------------------
     def visit_Import(self, node):
         for alias in node.names:
@@ -216,6 +256,12 @@ class CompileVisitor(ast.NodeVisitor):
         raise TypeError("class definition is not supported.")
 
     #-------------------------------------------------------------------------
+    def visit_Module(self, node):
+        for n in ast.walk(node):
+            if isinstance(n, ast.Call) and isinstance(n.func, ast.Name):
+                self.call_counts[n.func.id] = self.call_counts.get(n.func.id, 0) + 1
+        self.generic_visit(node)
+
     def visit_FunctionDef(self, node):
         self.scope.addFunction(node)
             
@@ -228,6 +274,18 @@ class CompileVisitor(ast.NodeVisitor):
             self.setFsm()
             self.incFsmCount()
 
+    def visit_AnnAssign(self, node):
+        if self.skip(): return
+        left = self.visit(node.target)
+        if isinstance(left, vast.Identifier):
+            self.setVariableWidth(left.name, node.annotation)
+        if node.value is None: return
+        right = self.visit(node.value)
+        self.setBind(left, right)
+        if isinstance(right, vast.Node):
+            self.setFsm()
+            self.incFsmCount()
+
     def visit_AugAssign(self, node):
         if self.skip(): return
         right = self.visit(node.value)
@@ -512,6 +570,11 @@ class CompileVisitor(ast.NodeVisitor):
         for key in node.keywords:
             keywords.append( self.visit(key.value) )
 
+        # CoRAM objects can not be passed to a shared sub-FSM
+        if (self.isSubroutine(name, tree) and
+            all([ isinstance(v, vast.Node) for v in args + keywords ])):
+            return self._call_Name_subroutine(node, name, tree, args, keywords)
+
         # stack a new scope frame
         self.pushScope(ftype='call')
 
@@ -520,6 +583,7 @@ class CompileVisitor(ast.NodeVisitor):
             baseobj = tree.args.args[pos]
             argname = baseobj.id if isinstance(baseobj, ast.Name) else baseobj.arg
             left = vast.Identifier(self.getVariable(argname, store=True))
+            self.setVariableWidth(left.name, getattr(baseobj, 'annotation', None))
             right = args[pos]
             self.setBind(left, right)
 
@@ -551,8 +615,92 @@ class CompileVisitor(ast.NodeVisitor):
 
         return ret 
 
+    def isSubroutine(self, name, tree):
+        decorators = [ d.id for d in tree.decorator_list if isinstance(d, ast.Name) ]
+        if 'inline' in decorators: return False
+        for n in ast.walk(tree):
+            if isinstance(n, ast.Nonlocal):
+                if 'subroutine' in decorators:
+                    print("Warning: function '%s' with nonlocal variables is inlined." % name)
+                return False
+        if 'subroutine' in decorators: return True
+        if self.subroutine_threshold <= 0: return False
+        if self.call_counts.get(name, 0) < 2: return False
+        # a small function is cheaper to inline
+        size = len([ n for n in ast.walk(tree) if isinstance(n, ast.stmt) ]) - 1
+        return size >= self.subroutine_threshold
+
+    def _call_Name_subroutine(self, node, name, tree, args, keywords):
+        sub = self.subroutines.get(tree)
+        if sub is not None and sub['compiling']:
+            raise TypeError("recursive call of subroutine '%s' is not supported" % name)
+
+        first = sub is None
+        if first:
+            # compiled at the first call site, the other call sites jump into it
+            self.pushScope(ftype='call')
+            sub = { 'name' : name, 'compiling' : True, 'calls' : 0, 'retvar' : None }
+            sub['retid'] = self.getTmpVariable()
+            sub['args'] = []
+            for baseobj in tree.args.args:
+                argname = baseobj.id if isinstance(baseobj, ast.Name) else baseobj.arg
+                argvar = self.getVariable(argname, store=True)
+                self.setVariableWidth(argvar, getattr(baseobj, 'annotation', None))
+                sub['args'].append( (argname, argvar) )
+            self.subroutines[tree] = sub
+
+        # arguments and the return address
+        sub['calls'] += 1
+        retid = sub['calls']
+        argvars = dict(sub['args'])
+        for pos, arg in enumerate(args):
+            self.setBind(vast.Identifier(sub['args'][pos][1]), arg)
+        for pos, key in enumerate(node.keywords):
+            if key.arg not in argvars:
+                raise TypeError("%s() got an unexpected keyword argument '%s'" % (name, key.arg))
+            self.setBind(vast.Identifier(argvars[key.arg]), keywords[pos])
+        self.setBind(vast.Identifier(sub['retid']), vast.IntConst(str(retid)))
+
+        if first:
+            self.setFsm()
+            self.incFsmCount()
+            sub['entry'] = self.getFsmCount()
+
+            self.__visit_FunctionDef(tree)
+            sub['exit'] = self.getFsmCount()
+            sub['retvar'] = self.getReturnVariable()
+            for ret_count, value in self.getUnresolvedReturn():
+                self.setFsm(ret_count, sub['exit'])
+
+            self.clearBreak()
+            self.clearContinue()
+            self.clearReturn()
+            self.clearReturnVariable()
+            self.popScope()
+            sub['compiling'] = False
+        else:
+            self.setFsm(self.getFsmCount(), sub['entry'])
+
+        # return to the call site
+        self.incFsmCount()
+        self.setFsm(sub['exit'], self.getFsmCount(),
+                    vast.Eq(vast.Identifier(sub['retid']), vast.IntConst(str(retid))))
+
+        if sub['retvar'] is None:
+            return vast.IntConst('0')
+
+        # the return value register is shared by all the call sites
+        tmp = vast.Identifier(self.getTmpVariable())
+        self.setBind(tmp, vast.Identifier(sub['retvar']))
+        self.setFsm()
+        self.incFsmCount()
+        return tmp
+
     def __visit_FunctionDef(self, node):
-        self.generic_visit(node)
+        # decorators are not a part of the function body
+        self.visit(node.args)
+        for b in node.body:
+            self.visit(b)
         retvar = self.getReturnVariable()
         if retvar is not None:
             return vast.Identifier(retvar)
@@ -1514,6 +1662,16 @@ class CompileVisitor(ast.NodeVisitor):
                 ret = r
         return ret
 
+    def visit_Constant(self, node):
+        # for Python 3.8: Num, Str and NameConstant are Constant
+        if node.value is None or isinstance(node.value, bool):
+            return vast.IntConst('1' if node.value else '0')
+        if isinstance(node.value, str):
+            return vast.StringConst(node.value)
+        if isinstance(node.value, int):
+            return vast.IntConst(str(node.value))
+        return vast.Constant(str(node.value))
+
     def visit_NameConstant(self, node):
         # for Python 3.4
         if node.value == True:
@@ -1610,6 +1768,15 @@ class CompileVisitor(ast.NodeVisitor):
         var = self.scope.addTmpVariable()
         return var
 
+    def setVariableWidth(self, name, annotation):
+        # an integer annotation is the bit-width of the variable
+        if annotation is None: return
+        if isinstance(annotation, (ast.Name, ast.Attribute)): return # type hint
+        width = self.optimize(self.visit(annotation))
+        if not isinstance(width, vast.IntConst) or int(width.value) <= 0:
+            raise TypeError("bit-width annotation of '%s' should be a positive constant integer" % name)
+        self.scope.setWidth(name, int(width.value))
+
     def addNonlocal(self, name):
         self.scope.addNonlocal(name)
 
@@ -1624,8 +1791,12 @@ class CompileVisitor(ast.NodeVisitor):
 
     def setBind(self, var, value, cond=None):
         if isinstance(value, vast.Node):
-            opt_value = self.optimize(value) if var is not None else value
-            opt_cond = self.optimize(cond) if cond is not None and var is not None else None
+            if self.lazy_optimize or var is None:
+                opt_value = value
+                opt_cond = cond if var is not None else None
+            else:
+                opt_value = self.optimize(value)
+                opt_cond = self.optimize(cond) if cond is not None else None
             self.fsm.setBind(var, opt_value, cond=opt_cond)
             state = self.getFsmCount()
             vname = var.name if var is not None else None
@@ -1651,9 +1822,11 @@ class CompileVisitor(ast.NodeVisitor):
 
     #-------------------------------------------------------------------------
     def optimize(self, node):
-        opt_dfnode = self.vopt.optimize(maketree.getDFTree(node))
-        opt_node = maketree.makeASTTree(opt_dfnode)
-        return opt_node
+        return self.optimizer.optimize(node)
+
+    def getEarlyBind(self, state):
+        # optimized form of binds without the constants found by CodeGenerator
+        return self.fsm.getBind(state, self.optimize)
 
     #-------------------------------------------------------------------------
     def setFsm(self, src=None, dst=None, cond=None, elsedst=None):
@@ -1822,15 +1995,19 @@ class CompileVisitor(ast.NodeVisitor):
 # Generator Class
 #-------------------------------------------------------------------------------
 class ControlThreadGenerator(object):
-    def __init__(self):
+    def __init__(self, cache_dir=None, cache_store=None):
         self.status = {}
-
-    def compile(self, thread_name,
-                filename=None, func=None, function_lib=None,
-                signalwidth=64, 
-                ext_addrwidth=64,
-                ext_max_datawidth=512,
-                dump=False):
+        self.dumps = {}
+        self.cycles = {}
+        self.stats = {}
+        self.linetables = {}
+        self.times = {}
+        self.cache_dir = cache_dir
+        self.cache = cache_store
+        if self.cache is None and cache_dir is not None:
+            self.cache = cache.FileCache(cache_dir, 'controlthread')
+
+    def getSource(self, filename=None, func=None, function_lib=None):
         if filename is not None and func is not None:
             raise IOError('Only filename or func should be defined.')
 
@@ -1852,28 +2029,147 @@ class ControlThreadGenerator(object):
         if func is not None:
             source_src.append( func.__name__ + '()' )
 
-        source = ''.join(source_src)
+        return ''.join(source_src)
 
+    def compile(self, thread_name,
+                filename=None, func=None, function_lib=None,
+                signalwidth=64, 
+                ext_addrwidth=64,
+                ext_max_datawidth=512,
+                dump=False, options=None):
+        source = self.getSource(filename, func, function_lib)
+        code = self.compileSource(thread_name, source,
+                                  signalwidth, ext_addrwidth, ext_max_datawidth, options)
+        if dump:
+            sys.stdout.write(self.dumps[thread_name])
+        return code
+
+    def compileThreads(self, sources,
+                       signalwidth=64, 
+                       ext_addrwidth=64,
+                       ext_max_datawidth=512,
+                       jobs=1, dump=False, options=None, thread_options=None):
+        if jobs is None or jobs < 1:
+            jobs = multiprocessing.cpu_count()
+
+        # per-thread options override the common options
+        thread_opts = []
+        for thread_name, source in sources:
+            opts = {} if options is None else dict(options)
+            if thread_options is not None and thread_name in thread_options:
+                opts.update(thread_options[thread_name])
+            thread_opts.append(opts)
+
+        if jobs == 1 or len(sources) < 2:
+            codes = []
+            for (thread_name, source), opts in zip(sources, thread_opts):
+                codes.append( self.compileSource(thread_name, source, signalwidth,
+                                                 ext_addrwidth, ext_max_datawidth, opts) )
+                if dump:
+                    sys.stdout.write(self.dumps[thread_name])
+            return codes
+
+        # the workers profile themselves, and dump to the same directory
+        profile = profiler.getProfiler() is not None
+        profile_dir = profiler.getProfiler().dumpdir if profile else None
+
+        # cached threads are not sent to the workers
+        keys = []
+        results = []
+        args = []
+        for (thread_name, source), opts in zip(sources, thread_opts):
+            key = None
+            entry = None
+            if self.cache is not None:
+                key = self.getCacheKey(thread_name, source, signalwidth,
+                                       ext_addrwidth, ext_max_datawidth, self.getOptions(opts))
+                entry = self.cache.get(key)
+            keys.append(key)
+            results.append(entry)
+            self.times[thread_name] = 0.0
+            if entry is None:
+                args.append( (self.cache_dir, thread_name, source,
+                              signalwidth, ext_addrwidth, ext_max_datawidth, opts,
+                              profile, profile_dir) )
+
+        if args:
+            # started outside of the profiling stages, not to fork a running cProfile
+            pool = multiprocessing.Pool(min(jobs, len(args)))
+            profiler.begin('workers')
+            try:
+                compiled = pool.map(compileWorker, args)
+            finally:
+                profiler.end('workers')
+                pool.close()
+                pool.join()
+            compiled.reverse()
+            for i, entry in enumerate(results):
+                if entry is not None: continue
+                results[i], self.times[sources[i][0]], profile_data = compiled.pop()
+                if profile_data is not None:
+                    profiler.getProfiler().merge(profile_data)
+                # the workers write to the file cache, but not to the in-memory one
+                if self.cache is not None and self.cache_dir is None:
+                    self.cache.put(keys[i], results[i])
+
+        # merged in the given order, independently of the completion order
+        codes = []
+        for (thread_name, source), (code, status, dumptext, cycles, stats, linetable) in zip(sources, results):
+            self.status[thread_name] = status
+            self.dumps[thread_name] = dumptext
+            self.cycles[thread_name] = cycles
+            self.stats[thread_name] = stats
+            self.linetables[thread_name] = linetable
+            codes.append(code)
+            if dump:
+                sys.stdout.write(dumptext)
+        return codes
+
+    def getOptions(self, options=None):
+        ret = dict(DEFAULT_OPTIONS)
+        if options is not None:
+            for k, v in options.items():
+                if k not in ret:
+                    raise ValueError("No such compile option: %s" % k)
+                ret[k] = v
+        return ret
+
+    def compileSource(self, thread_name, source,
+                      signalwidth=64, 
+                      ext_addrwidth=64,
+                      ext_max_datawidth=512,
+                      options=None):
+        options = self.getOptions(options)
+        start = time.time()
+
+        key = None
+        if self.cache is not None:
+            key = self.getCacheKey(thread_name, source,
+                                   signalwidth, ext_addrwidth, ext_max_datawidth, options)
+            entry = self.cache.get(key)
+            if entry is not None:
+                (code, self.status[thread_name], self.dumps[thread_name],
+                 self.cycles[thread_name], self.stats[thread_name],
+                 self.linetables[thread_name]) = entry
+                self.times[thread_name] = time.time() - start
+                return code
+
+        profiler.begin('visit')
         tree = ast.parse(source)
         functionvisitor = FunctionVisitor()
         functionvisitor.visit(tree)
         functions = functionvisitor.getFunctions()
 
-        compilevisitor = CompileVisitor(thread_name, functions, signalwidth)
+        compilevisitor = CompileVisitor(thread_name, functions, signalwidth,
+                                        subroutine_threshold=options['subroutine_threshold'])
         compilevisitor.visit(tree)
+        profiler.end('visit')
 
         (coram_memories, coram_instreams, coram_outstreams, 
          coram_channels, coram_registers,
          coram_iochannels, coram_ioregisters,
          scope, fsm) = compilevisitor.getStatus()
 
-        self.status[thread_name] = ( tuple(set(coram_memories.values())),
-                                     tuple(set(coram_instreams.values())),
-                                     tuple(set(coram_outstreams.values())),
-                                     tuple(set(coram_channels.values())),
-                                     tuple(set(coram_registers.values())),
-                                     tuple(set(coram_iochannels.values())),
-                                     tuple(set(coram_ioregisters.values())),)
         codegen = CodeGenerator(thread_name, coram_memories,
                                 coram_instreams, coram_outstreams,
                                 coram_channels, coram_registers, 
@@ -1882,14 +2178,93 @@ class ControlThreadGenerator(object):
                                 signalwidth=signalwidth, 
                                 ext_addrwidth=ext_addrwidth,
                                 ext_max_datawidth=ext_max_datawidth,
+                                fsm_compaction=options['fsm_compaction'],
+                                fsm_scheduling=options['fsm_scheduling'],
+                                fsm_encoding=options['fsm_encoding'],
+                                bitwidth_inference=options['bitwidth_inference'],
                                 )
-        #fsm.analysis()
+        profiler.begin('codegen')
         code = codegen.generate()
+        profiler.end('codegen')
+
+        # sorted by ID to get the same status (and the same output) in every run
+        self.status[thread_name] = ( self.sortCoramObjects(coram_memories),
+                                     self.sortCoramObjects(coram_instreams),
+                                     self.sortCoramObjects(coram_outstreams),
+                                     self.sortCoramObjects(coram_channels),
+                                     self.sortCoramObjects(coram_registers),
+                                     self.sortCoramObjects(coram_iochannels),
+                                     self.sortCoramObjects(coram_ioregisters),)
+
+        self.cycles[thread_name] = codegen.getCyclesPerIteration()
+        registers = codegen.getRegisters()
+        self.stats[thread_name] = { 'states' : codegen.getNumStates(),
+                                    'registers' : len(registers),
+                                    'register_bits' : sum(registers.values()) }
+        self.linetables[thread_name] = codegen.getLineTable()
+        self.linetables[thread_name]['source'] = source.splitlines()
+
+        buf = StringIO()
+        compilevisitor.dump(buf)
+        codegen.dump(buf)
+        self.dumps[thread_name] = buf.getvalue()
+
+        if self.cache is not None:
+            self.cache.put(key, (code, self.status[thread_name], self.dumps[thread_name],
+                                 self.cycles[thread_name], self.stats[thread_name],
+                                 self.linetables[thread_name]))
+
+        self.times[thread_name] = time.time() - start
+        return code
 
-        if dump:
-            compilevisitor.dump()
+    def sortCoramObjects(self, objs):
+        return tuple(sorted(set(objs.values()), key=lambda x:int(str(x.idx))))
 
-        return code
+    def getCacheKey(self, thread_name, source,
+                    signalwidth, ext_addrwidth, ext_max_datawidth, options=None):
+        # the compiler itself is a part of the key
+        compiler = cache.packageDigest(os.path.dirname(os.path.abspath(__file__)))
+        return cache.digest(compiler, thread_name, source,
+                            signalwidth, ext_addrwidth, ext_max_datawidth, options)
 
     def getStatus(self):
         return self.status
+
+    def getDump(self, thread_name):
+        return self.dumps[thread_name]
+
+    def getCyclesPerIteration(self, thread_name):
+        return self.cycles[thread_name]
+
+    def getStateCount(self, thread_name):
+        return self.stats[thread_name]['states']
+
+    def getStats(self, thread_name):
+        return self.stats[thread_name]
+
+    def getLineTable(self, thread_name):
+        return self.linetables[thread_name]
+
+    def getCompileTime(self, thread_name):
+        return self.times[thread_name]
+
+#-------------------------------------------------------------------------------
+def compileWorker(args):
+    (cache_dir, thread_name, source,
+     signalwidth, ext_addrwidth, ext_max_datawidth, options, profile, profile_dir) = args
+    if profile:
+        profiler.enable(profile_dir, prefix=thread_name + '.')
+    try:
+        generator = ControlThreadGenerator(cache_dir=cache_dir)
+        code = generator.compileSource(thread_name, source,
+                                       signalwidth, ext_addrwidth, ext_max_datawidth, options)
+    finally:
+        prof = profiler.disable() if profile else None
+    profile_data = None
+    if prof is not None:
+        prof.writeStats()
+        profile_data = prof.getData()
+    return ((code, generator.getStatus()[thread_name], generator.getDump(thread_name),
+             generator.getCyclesPerIteration(thread_name), generator.getStats(thread_name),
+             generator.getLineTable(thread_name)),
+            generator.getCompileTime(thread_name), profile_data)
@@ -166,6 +166,17 @@ class CoramSlaveStream(CoramBase):
     def write(self, value):
         pass
 
+#-------------------------------------------------------------------------------
+# Function Decorators
+#-------------------------------------------------------------------------------
+def subroutine(func):
+    # compiled once into a shared sub-FSM
+    return func
+
+def inline(func):
+    # expanded at every call site
+    return func
+
 #-------------------------------------------------------------------------------
 # Management Class
 #-------------------------------------------------------------------------------
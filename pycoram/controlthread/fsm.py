@@ -64,6 +64,9 @@ class Fsm(object):
         self.constant = {}
         self.loop = {}
         self.loop_bind = {}
+        # state -> line numbers of the source statements
+        self.lines = {}
+        self.lineno = None
 
     def set(self, src=None, dst=None, cond=None, elsedst=None):
         if src is None:
@@ -73,6 +76,7 @@ class Fsm(object):
         self.add(src, dst, cond, elsedst)
 
     def add(self, src, dst, cond, elsedst):
+        self.addLine(src)
         if src not in self.dict:
             self.dict[src] = []
         for n in self.dict[src]:
@@ -95,6 +99,7 @@ class Fsm(object):
 
     def setBind(self, dst, value, st=None, cond=None):
         state = self.getCount() if st is None else st
+        self.addLine(state)
         if state not in self.bind:
             self.bind[state] = []
         self.bind[state].append( Bind(dst, value, cond=cond) )
@@ -103,6 +108,18 @@ class Fsm(object):
         else:
             self.unsetConstant(dst)
 
+    def getBind(self, state, optimize=None):
+        if state not in self.bind: return ()
+        if optimize is None: return tuple(self.bind[state])
+        ret = []
+        for bind in self.bind[state]:
+            if bind.dst is None:
+                ret.append(bind)
+                continue
+            cond = optimize(bind.cond) if bind.cond is not None else None
+            ret.append( Bind(bind.dst, optimize(bind.value), cond=cond) )
+        return tuple(ret)
+
     def setObjectBind(self, dst, value, st=None, cond=None):
         state = self.getCount() if st is None else st
         if state not in self.object_bind:
@@ -122,6 +139,22 @@ class Fsm(object):
             return None
         return self.constant[dst]
 
+    def setLineno(self, lineno):
+        self.lineno = lineno
+
+    def getLineno(self):
+        return self.lineno
+
+    def addLine(self, state):
+        # the statements that bind values or transitions in a state
+        if self.lineno is None: return
+        if state not in self.lines:
+            self.lines[state] = set()
+        self.lines[state].add(self.lineno)
+
+    def getLines(self, state):
+        return tuple(sorted(self.lines.get(state, ())))
+
     def setLoop(self, begin, end, iter_node=None, step_node=None):
         self.loop[begin] = (end, iter_node, step_node)
 
@@ -149,8 +182,12 @@ class Fsm(object):
     def getSources(self, n):
         if n is None: return []
         if isinstance(n, vast.Constant): return []
-        if isinstance(n, vast.Operator):
-            return self.getSources(n.left) + self.getSources(n.right)
+        if isinstance(n, vast.Identifier): return [n]
+        if isinstance(n, vast.Node):
+            ret = []
+            for c in n.children():
+                ret.extend(self.getSources(c))
+            return ret
         return [n]
 
     def getBindmap(self):
@@ -195,11 +232,318 @@ class Fsm(object):
                         write_set[innermostloop] = set([])
                     write_set[innermostloop].add(bind.value.args[-1])
         return write_set
-        
-    def analysis(self):
-        read_set = self.getReadSet()
-        write_set = self.getWriteSet()
-        bindmap = self.getBindmap()
-        print('read_set', read_set)
-        print('write_set', write_set)
-        print('bindmap', bindmap)
+
+    #---------------------------------------------------------------------------
+    # state compaction
+    #---------------------------------------------------------------------------
+    def getStates(self):
+        states = set([0])
+        states.update(self.dict.keys())
+        states.update(self.bind.keys())
+        for nodelist in self.dict.values():
+            for node in nodelist:
+                states.add(node.dst)
+                if node.elsedst is not None: states.add(node.elsedst)
+        return states
+
+    def getNumStates(self):
+        return len(self.getStates())
+
+    def getNext(self, state):
+        # destination of an unconditional transition
+        if state not in self.dict: return None
+        nodelist = self.dict[state]
+        if len(nodelist) != 1 or nodelist[0].cond is not None: return None
+        return nodelist[0].dst
+
+    def getPredecessors(self):
+        preds = {}
+        for src, nodelist in self.dict.items():
+            for node in nodelist:
+                for dst in (node.dst, node.elsedst):
+                    if dst is None: continue
+                    if dst not in preds: preds[dst] = []
+                    preds[dst].append(src)
+        return preds
+
+    def getAccess(self, state, ignore=()):
+        # names written and read in a state, including its transition conditions
+        writes = set()
+        reads = set()
+        for bind in self.bind.get(state, ()):
+            if bind.dst is not None:
+                if bind.dst.name in ignore: continue
+                writes.add(bind.dst.name)
+            elif isinstance(bind.value, vast.SystemCall) and bind.value.syscall.startswith('coram_'):
+                continue
+            for n in self.getSources(bind.value) + self.getSources(bind.cond):
+                reads.add(n.name)
+        for node in self.dict.get(state, ()):
+            for n in self.getSources(node.cond):
+                reads.add(n.name)
+        return writes, reads
+
+    def isMergeable(self, src, dst, variables, ignore=()):
+        src_writes, src_reads = self.getAccess(src, ignore)
+        dst_writes, dst_reads = self.getAccess(dst, ignore)
+        # read-after-write and write-after-write in a single cycle
+        if src_writes & dst_reads: return False
+        if src_writes & dst_writes: return False
+        # the interface signals keep their cycle-by-cycle order
+        src_ext_writes = src_writes - variables
+        if src_ext_writes and (dst_reads - variables): return False
+        if src_ext_writes and (dst_writes - variables): return False
+        return True
+
+    def foldConstantBranches(self, optimize):
+        for src, nodelist in self.dict.items():
+            if len(nodelist) != 1 or nodelist[0].cond is None: continue
+            node = nodelist[0]
+            cond = optimize(node.cond)
+            if not isinstance(cond, vast.IntConst): continue
+            try:
+                value = int(cond.value)
+            except ValueError:
+                continue
+            dst = node.dst if value != 0 else node.elsedst
+            if dst is None: continue
+            self.dict[src] = [ FsmNode(src, dst, None, None) ]
+
+    def skipEmptyStates(self, alias):
+        for state in sorted(self.dict.keys()):
+            if state == 0 or state in self.bind: continue
+            nxt = self.getNext(state)
+            if nxt is None or nxt == state: continue
+            for nodelist in self.dict.values():
+                for node in nodelist:
+                    if node.src == state: continue
+                    if node.dst == state: node.dst = nxt
+                    if node.elsedst == state: node.elsedst = nxt
+            alias[state] = nxt
+
+    def removeUnreachableStates(self):
+        reachable = set()
+        visit = [0]
+        while visit:
+            state = visit.pop()
+            if state in reachable: continue
+            reachable.add(state)
+            for node in self.dict.get(state, ()):
+                visit.append(node.dst)
+                if node.elsedst is not None: visit.append(node.elsedst)
+        for state in list(self.dict.keys()):
+            if state not in reachable: del self.dict[state]
+        for state in list(self.bind.keys()):
+            if state not in reachable: del self.bind[state]
+        for state in list(self.lines.keys()):
+            if state not in reachable: del self.lines[state]
+
+    def mergeChains(self, variables, ignore, alias):
+        preds = self.getPredecessors()
+        for src in sorted(self.dict.keys()):
+            if src not in self.dict: continue
+            while True:
+                dst = self.getNext(src)
+                if dst is None or dst == src or dst == 0: break
+                if dst not in self.dict: break # terminal state
+                if len(preds.get(dst, ())) != 1: break
+                if not self.isMergeable(src, dst, variables, ignore): break
+                if dst in self.bind:
+                    if src not in self.bind: self.bind[src] = []
+                    self.bind[src].extend(self.bind[dst])
+                    del self.bind[dst]
+                if dst in self.lines:
+                    if src not in self.lines: self.lines[src] = set()
+                    self.lines[src].update(self.lines[dst])
+                    del self.lines[dst]
+                self.dict[src] = [ FsmNode(src, node.dst, node.cond, node.elsedst)
+                                   for node in self.dict[dst] ]
+                del self.dict[dst]
+                for node in self.dict[src]:
+                    for d in (node.dst, node.elsedst):
+                        if d is None: continue
+                        preds[d] = [ src if p == dst else p for p in preds[d] ]
+                alias[dst] = src
+
+    def renumber(self, alias):
+        # returns the mappings of states and loops from old to new
+        states = sorted(self.getStates())
+        mapping = dict([ (s, i) for i, s in enumerate(states) ])
+        for state in sorted(alias.keys()):
+            if state in mapping: continue
+            s = alias[state]
+            while s not in mapping and s in alias: s = alias[s]
+            if s in mapping: mapping[state] = mapping[s]
+
+        new_dict = {}
+        for src, nodelist in sorted(self.dict.items(), key=lambda x:x[0]):
+            new_dict[mapping[src]] = [ FsmNode(mapping[src], mapping[node.dst], node.cond,
+                                               None if node.elsedst is None else mapping[node.elsedst])
+                                       for node in nodelist ]
+        self.dict = new_dict
+        self.bind = dict([ (mapping[state], bindlist) for state, bindlist in self.bind.items() ])
+        self.object_bind = dict([ (mapping[state], bindlist) for state, bindlist in self.object_bind.items()
+                                  if state in mapping ])
+        # the lines of the skipped states are not carried, they take no cycle
+        live = set(states)
+        self.lines = dict([ (mapping[state], lines) for state, lines in self.lines.items()
+                            if state in live ])
+
+        # a loop spans the remaining states of its body, and its head is
+        # the state that the entering transitions now reach
+        loop_mapping = {}
+        new_loop = {}
+        for begin, (end, iter_node, step_node) in self.loop.items():
+            if begin not in mapping: continue
+            body = [ mapping[s] for s in states if begin <= s and s <= end ]
+            if not body: continue
+            new_begin = mapping[begin]
+            new_end = max(body)
+            if new_begin > new_end: continue
+            new_loop[new_begin] = (new_end, iter_node, step_node)
+            loop_mapping[(begin, end)] = (new_begin, new_end)
+        self.loop = new_loop
+        self.count = len(states)
+        return mapping, loop_mapping
+
+    def compact(self, variables, ignore=(), optimize=None):
+        alias = {}
+        if optimize is not None:
+            self.foldConstantBranches(optimize)
+        self.skipEmptyStates(alias)
+        self.removeUnreachableStates()
+        self.mergeChains(variables, ignore, alias)
+        return self.renumber(alias)
+
+    #---------------------------------------------------------------------------
+    # list scheduling
+    #---------------------------------------------------------------------------
+    def isExternal(self, state, variables, ignore=()):
+        # a state that touches the interface signals or calls a system task
+        writes, reads = self.getAccess(state, ignore)
+        if (writes | reads) - variables: return True
+        for bind in self.bind.get(state, ()):
+            if bind.dst is None: return True
+        return False
+
+    def getBlocks(self):
+        # straight-line sequences of states: every state except the head has
+        # a single predecessor, and only the last one may branch
+        preds = self.getPredecessors()
+
+        def isSequential(state):
+            if state not in self.dict: return False
+            for node in self.dict[state]:
+                if node.dst == state or node.elsedst == state: return False
+            return True
+
+        def isContinued(state):
+            if state == 0 or not isSequential(state): return False
+            if len(preds.get(state, ())) != 1: return False
+            p = preds[state][0]
+            return p != 0 and self.getNext(p) == state
+
+        blocks = []
+        for head in sorted(self.dict.keys()):
+            if head == 0 or isContinued(head): continue
+            if self.getNext(head) is None or not isSequential(head): continue
+            block = [head]
+            state = head
+            while self.getNext(state) is not None:
+                state = self.getNext(state)
+                if state == head or not isContinued(state): break
+                block.append(state)
+            if len(block) > 1: blocks.append(block)
+        return blocks
+
+    def scheduleBlock(self, block, variables, ignore=()):
+        # ASAP list scheduling in the program order:
+        # RAW/WAW go to a later cycle, WAR may share the cycle,
+        # and the states on the interface keep their order in distinct cycles
+        access = [ self.getAccess(state, ignore) for state in block ]
+        external = [ self.isExternal(state, variables, ignore) for state in block ]
+        cycles = []
+        last_external = None
+        for j, (writes, reads) in enumerate(access):
+            c = 0
+            for i in range(j):
+                w, r = access[i]
+                if (w & reads) or (w & writes): c = max(c, cycles[i] + 1)
+                elif r & writes: c = max(c, cycles[i])
+            if external[j]:
+                if last_external is not None: c = max(c, cycles[last_external] + 1)
+                last_external = j
+            cycles.append(c)
+        # the transition of the block leaves from its last cycle
+        cycles[-1] = max(cycles)
+        return cycles
+
+    def scheduleBlocks(self, variables, ignore, alias):
+        for block in self.getBlocks():
+            cycles = self.scheduleBlock(block, variables, ignore)
+            length = max(cycles) + 1
+            if length == len(block): continue
+
+            binds = [ [] for i in range(length) ]
+            object_binds = [ [] for i in range(length) ]
+            lines = [ set() for i in range(length) ]
+            for state, c in zip(block, cycles):
+                binds[c].extend(self.bind.get(state, ()))
+                object_binds[c].extend(self.object_bind.get(state, ()))
+                lines[c].update(self.lines.get(state, ()))
+            last = self.dict[block[-1]]
+
+            for state in block:
+                if state in self.bind: del self.bind[state]
+                if state in self.object_bind: del self.object_bind[state]
+                if state in self.lines: del self.lines[state]
+                del self.dict[state]
+
+            for c, state in enumerate(block[:length]):
+                if binds[c]: self.bind[state] = binds[c]
+                if object_binds[c]: self.object_bind[state] = object_binds[c]
+                if lines[c]: self.lines[state] = lines[c]
+                if c < length - 1:
+                    self.dict[state] = [ FsmNode(state, block[c+1], None, None) ]
+                else:
+                    self.dict[state] = [ FsmNode(state, node.dst, node.cond, node.elsedst)
+                                         for node in last ]
+            for state in block[length:]:
+                alias[state] = block[length-1]
+
+    def schedule(self, variables, ignore=(), optimize=None):
+        alias = {}
+        if optimize is not None:
+            self.foldConstantBranches(optimize)
+        self.skipEmptyStates(alias)
+        self.removeUnreachableStates()
+        self.scheduleBlocks(variables, ignore, alias)
+        self.mergeChains(variables, ignore, alias)
+        return self.renumber(alias)
+
+    #---------------------------------------------------------------------------
+    # latency estimation
+    #---------------------------------------------------------------------------
+    def getLoopLatency(self, begin, end):
+        # the shortest path from the loop head back to itself in the body,
+        # assuming that every wait state passes in a single cycle
+        dist = { begin : 0 }
+        visit = [begin]
+        while visit:
+            nxt = []
+            for state in visit:
+                for node in self.dict.get(state, ()):
+                    for dst in (node.dst, node.elsedst):
+                        if dst is None or dst == state: continue
+                        if dst == begin: return dist[state] + 1
+                        if dst < begin or dst > end or dst in dist: continue
+                        dist[dst] = dist[state] + 1
+                        nxt.append(dst)
+            visit = nxt
+        return None
+
+    def getCyclesPerIteration(self):
+        ret = {}
+        for begin, (end, iter_node, step_node) in self.loop.items():
+            ret[(begin, end)] = self.getLoopLatency(begin, end)
+        return ret
@@ -0,0 +1,100 @@
+#-------------------------------------------------------------------------------
+# optimizer.py
+#
+# Memoized expression optimizer over structurally hashed AST trees
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+
+import pycoram.controlthread.maketree as maketree
+import pycoram.utils.profiler as profiler
+
+import pyverilog.vparser.ast as vast
+import pyverilog.dataflow.dataflow as vdflow
+import pyverilog.dataflow.optimizer as vopt
+import pyverilog.utils.scope as vscope
+
+#-------------------------------------------------------------------------------
+class CachedOptimizer(object):
+    def __init__(self, default_width=64):
+        self.vopt = vopt.VerilogOptimizer({}, default_width=default_width)
+        # hash-consing table: (node type, attributes, IDs of children) -> (ID, referred names)
+        self.keys = {}
+        # ID -> [optimized DF tree, optimized AST tree]
+        self.cache = {}
+        # name -> set of IDs whose results depend on the name
+        self.users = {}
+        self.hits = 0
+        self.misses = 0
+
+    #-------------------------------------------------------------------------
+    def setConstant(self, name, value, width=32):
+        varname = vscope.ScopeChain( (vscope.ScopeLabel(name),) )
+        self.vopt.setConstant(varname, value)
+        termtypes = set(['Parameter'])
+        term = vdflow.Term(varname, termtypes,
+                           vdflow.DFEvalValue(width-1), vdflow.DFEvalValue(0))
+        self.vopt.setTerm(varname, term)
+        self.invalidate(name)
+
+    def invalidate(self, name):
+        if name not in self.users: return
+        for key in self.users[name]:
+            if key in self.cache: del self.cache[key]
+        del self.users[name]
+
+    #-------------------------------------------------------------------------
+    def optimizeDF(self, node):
+        profiler.begin('optimize')
+        ret = self._lookup(node)[0]
+        profiler.end('optimize')
+        return ret
+
+    def optimize(self, node):
+        profiler.begin('optimize')
+        entry = self._lookup(node)
+        if entry[1] is None:
+            entry[1] = maketree.makeASTTree(entry[0])
+        profiler.end('optimize')
+        return entry[1]
+
+    def _lookup(self, node):
+        profiler.count('optimize')
+        key, names = self.getKey(node)
+        if key in self.cache:
+            self.hits += 1
+            return self.cache[key]
+        self.misses += 1
+        profiler.count('optimize_miss')
+        entry = [ self.vopt.optimize(maketree.getDFTree(node)), None ]
+        self.cache[key] = entry
+        for name in names:
+            if name not in self.users: self.users[name] = set()
+            self.users[name].add(key)
+        return entry
+
+    #-------------------------------------------------------------------------
+    def getKey(self, node):
+        if isinstance(node, vast.Rvalue):
+            return self.getKey(node.var)
+        if isinstance(node, str):
+            return self._intern(('Identifier', node), (node,))
+        if isinstance(node, vast.Identifier):
+            return self._intern(('Identifier', node.name), (node.name,))
+        attrs = tuple([ getattr(node, a) for a in node.attr_names ])
+        children = [ self.getKey(c) for c in node.children() ]
+        key = (node.__class__.__name__, attrs) + tuple([ k for k, n in children ])
+        names = set()
+        for k, n in children:
+            names.update(n)
+        return self._intern(key, names)
+
+    def _intern(self, key, names):
+        if key in self.keys:
+            return self.keys[key]
+        ret = (len(self.keys), frozenset(names))
+        self.keys[key] = ret
+        return ret
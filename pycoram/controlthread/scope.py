@@ -8,7 +8,6 @@
 #-------------------------------------------------------------------------------
 from __future__ import absolute_import
 from __future__ import print_function
-import copy
 import os
 import sys
 
@@ -40,6 +39,7 @@ class ScopeFrameList(object):
         self.tmp_prefix = 'tmp'
         self.tmp_count = 0
         self.binds = {}
+        self.widths = {}
 
     def getCurrent(self):
         return self.current
@@ -48,7 +48,7 @@ class ScopeFrameList(object):
         if name is None:
             name = self.label_prefix + str(self.label_count)
             self.label_count += 1
-        prefix = copy.deepcopy(self.current.name.namelist)
+        prefix = self.current.name.namelist
         framename = ScopeName(prefix + (name,))
         f = ScopeFrame(framename, ftype)
         self.scopeframes.append(f)
@@ -135,6 +135,12 @@ class ScopeFrameList(object):
     def getBinds(self):
         return self.binds
 
+    def setWidth(self, name, width):
+        self.widths[name] = width
+
+    def getWidths(self):
+        return self.widths
+
     #----------------------------------------------------------------------------
     def addBreak(self, count):
         self.current.addBreak(count)
@@ -0,0 +1,659 @@
+#-------------------------------------------------------------------------------
+# simulator.py
+#
+# Transaction-level functional simulator of the control threads
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import ast
+import csv
+import math
+import heapq
+import struct
+import threading
+import traceback
+import collections
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pycoram.controlthread.coram_module import CoramMemory
+from pycoram.controlthread.coram_module import CoramInStream
+from pycoram.controlthread.coram_module import CoramOutStream
+from pycoram.controlthread.coram_module import CoramChannel
+from pycoram.controlthread.coram_module import CoramRegister
+from pycoram.controlthread.coram_module import CoramIoChannel
+from pycoram.controlthread.coram_module import CoramIoRegister
+from pycoram.controlthread.coram_module import subroutine, inline
+import pycoram.utils.sparsemem as sparsemem
+
+# default values of the configuration items used by the simulator
+DEFAULT_CONFIGS = {
+    'signal_width' : 32,
+    'ext_datawidth' : 512,
+    'sim_addrwidth' : 27,
+    'mem_read_latency' : 8,
+    'mem_write_latency' : 4,
+    'mem_bytes_per_cycle' : 0,
+}
+
+# maximum burst length of the DMA controllers
+EXT_BURSTLENGTH = 256
+
+if hasattr(math, 'gcd'):
+    gcd = math.gcd
+else:
+    from fractions import gcd
+
+#-------------------------------------------------------------------------------
+# Byte buffers: NumPy arrays if available
+#-------------------------------------------------------------------------------
+def newBuffer(size):
+    if numpy is not None:
+        return numpy.zeros(size, dtype=numpy.uint8)
+    return bytearray(size)
+
+def getBuffer(buf, pos, size):
+    if numpy is not None:
+        return buf[pos:pos+size].tobytes()
+    return bytes(buf[pos:pos+size])
+
+def putBuffer(buf, pos, data):
+    if numpy is not None:
+        buf[pos:pos+len(data)] = numpy.frombuffer(bytes(data), dtype=numpy.uint8)
+        return
+    buf[pos:pos+len(data)] = data
+
+#-------------------------------------------------------------------------------
+class Dram(object):
+    def __init__(self, addrwidth):
+        self.size = 2 ** addrwidth
+        # allocated by 4KB pages on the first write
+        self.pages = {}
+        self.image = False
+
+    def getDefaultPage(self, page):
+        # as the test bench: the word address in every 4-byte word
+        # without a memory image, and zeros with it
+        if self.image: return sparsemem.ZERO_PAGE
+        words = sparsemem.PAGE_SIZE // 4
+        base = page * words
+        if numpy is not None:
+            return (numpy.arange(base, base + words, dtype=numpy.uint64) &
+                    0xffffffff).astype('<u4').tobytes()
+        return struct.pack('<%dI' % words, *[ (base + i) & 0xffffffff for i in range(words) ])
+
+    def getPages(self, addr, size):
+        # (page, offset, position, bytes): an address wraps around the
+        # address space, as the address port of the test bench
+        pos = 0
+        while pos < size:
+            a = (addr + pos) % self.size
+            (page, offset) = divmod(a, sparsemem.PAGE_SIZE)
+            n = min(sparsemem.PAGE_SIZE - offset, size - pos, self.size - a)
+            yield (page, offset, pos, n)
+            pos += n
+
+    def read(self, addr, size):
+        ret = []
+        for page, offset, pos, n in self.getPages(addr, size):
+            if page in self.pages:
+                ret.append(getBuffer(self.pages[page], offset, n))
+            else:
+                ret.append(self.getDefaultPage(page)[offset:offset+n])
+        return b''.join(ret)
+
+    def write(self, addr, data):
+        for page, offset, pos, n in self.getPages(addr, len(data)):
+            if page not in self.pages:
+                self.pages[page] = newBuffer(sparsemem.PAGE_SIZE)
+                putBuffer(self.pages[page], 0, self.getDefaultPage(page))
+            putBuffer(self.pages[page], offset, data[pos:pos+n])
+
+    def getArray(self, addr, length, dtype='uint32'):
+        if numpy is None:
+            raise ImportError("numpy is required to get an array of the DRAM image")
+        dtype = numpy.dtype(dtype)
+        return numpy.frombuffer(self.read(addr, length * dtype.itemsize), dtype=dtype).copy()
+
+    def setArray(self, addr, array):
+        if numpy is None:
+            raise ImportError("numpy is required to set an array to the DRAM image")
+        self.write(addr, numpy.ascontiguousarray(array).tobytes())
+
+    def load(self, filename):
+        # same formats as the memory image of the test benches
+        pages = (sparsemem.getBinaryPages(filename) if filename.endswith('.bin') else
+                 sparsemem.getHexPages(filename))
+        self.image = True
+        for page, data in sorted(pages.items()):
+            self.write(page * sparsemem.PAGE_SIZE, bytes(data))
+
+    def save(self, filename):
+        numbers = sorted(self.pages.keys())
+        if filename.endswith('.bin'):
+            f = open(filename, 'wb')
+            for page in range(numbers[-1] + 1 if numbers else 0):
+                f.write(self.read(page * sparsemem.PAGE_SIZE, sparsemem.PAGE_SIZE))
+            f.close()
+            return
+        f = open(filename, 'w')
+        for page in numbers:
+            f.write('@%x\n' % (page * sparsemem.PAGE_SIZE))
+            data = bytearray(getBuffer(self.pages[page], 0, sparsemem.PAGE_SIZE))
+            f.write(''.join([ '%02x\n' % b for b in data ]))
+        f.close()
+
+#-------------------------------------------------------------------------------
+class Port(object):
+    # state of a CoRAM object, shared by its aliases in a thread
+    def __init__(self, thread_name, name):
+        self.thread_name = thread_name
+        self.name = name
+        self.bram = None
+        self.fifo = bytearray()
+        self.inbox = collections.deque() # (time, value) to the thread
+        self.outbox = collections.deque() # (time, value) from the thread
+        self.values = {} # address -> value of the registers
+        self.done = 0
+        self.handler = None
+        self.warned = False
+        self.requests = 0
+        self.bytes = 0
+
+class ThreadContext(object):
+    def __init__(self, index, name, source, filename):
+        self.index = index
+        self.name = name
+        self.source = source
+        self.filename = filename
+        self.time = 0
+        self.waiting = None
+        self.finished = False
+        self.thread = None
+
+class SimulationAbort(Exception): pass
+
+#-------------------------------------------------------------------------------
+# CoRAM objects of the simulator
+#-------------------------------------------------------------------------------
+class SimObject(object):
+    def setup(self, sim, ctx):
+        # the same name as the object of the compiler
+        self.name = ''.join( (self.__class__.__bases__[0].__name__.lower(), '_', str(self.idx)) )
+        self.sim = sim
+        self.ctx = ctx
+        self.port = sim.getPort(ctx.name, self.name)
+
+    def getWordBytes(self):
+        return int(self.datawidth) // 8 if self.datawidth is not None else 4
+
+    def push(self, *values):
+        # from the user-logic (or the host) to the thread
+        for value in values:
+            self.port.inbox.append( (self.sim.now(), value) )
+
+    def pop(self):
+        # from the thread to the user-logic (or the host)
+        if not self.port.outbox: return None
+        return self.port.outbox.popleft()[1]
+
+    def getValue(self, addr=0):
+        return self.port.values.get(addr, 0)
+
+    def setValue(self, value, addr=0):
+        self.port.values[addr] = value
+
+class SimMemory(CoramMemory, SimObject):
+    def __init__(self, sim, ctx, *args, **kwargs):
+        CoramMemory.__init__(self, *args, **kwargs)
+        self.setup(sim, ctx)
+        if self.port.bram is None:
+            length = int(self.length) if self.length is not None else 1
+            self.port.bram = newBuffer(int(self.size) * length * self.getWordBytes())
+    def read(self, ram_addr, mem_addr, size):
+        self.sim.dma(self, 'read', ram_addr, mem_addr, size, True)
+    def write(self, ram_addr, mem_addr, size):
+        self.sim.dma(self, 'write', ram_addr, mem_addr, size, True)
+    def read_nonblocking(self, ram_addr, mem_addr, size):
+        self.sim.dma(self, 'read', ram_addr, mem_addr, size, False)
+    def write_nonblocking(self, ram_addr, mem_addr, size):
+        self.sim.dma(self, 'write', ram_addr, mem_addr, size, False)
+    def wait(self):
+        self.sim.waitDma(self)
+    def test(self):
+        return self.sim.testDma(self)
+    def getBram(self):
+        return self.port.bram
+
+class SimInStream(CoramInStream, SimObject):
+    def __init__(self, sim, ctx, *args, **kwargs):
+        CoramInStream.__init__(self, *args, **kwargs)
+        self.setup(sim, ctx)
+    def write(self, mem_addr, size):
+        self.sim.dma(self, 'write', None, mem_addr, size, True)
+    def write_nonblocking(self, mem_addr, size):
+        self.sim.dma(self, 'write', None, mem_addr, size, False)
+    def wait(self):
+        self.sim.waitDma(self)
+    def test(self):
+        return self.sim.testDma(self)
+    def popBytes(self, size=None):
+        size = len(self.port.fifo) if size is None else size
+        data = bytes(self.port.fifo[:size])
+        del self.port.fifo[:size]
+        return data
+
+class SimOutStream(CoramOutStream, SimObject):
+    def __init__(self, sim, ctx, *args, **kwargs):
+        CoramOutStream.__init__(self, *args, **kwargs)
+        self.setup(sim, ctx)
+    def read(self, mem_addr, size):
+        self.sim.dma(self, 'read', None, mem_addr, size, True)
+    def read_nonblocking(self, mem_addr, size):
+        self.sim.dma(self, 'read', None, mem_addr, size, False)
+    def wait(self):
+        self.sim.waitDma(self)
+    def test(self):
+        return self.sim.testDma(self)
+    def pushBytes(self, data):
+        self.port.fifo.extend(data)
+
+class SimChannel(CoramChannel, SimObject):
+    def __init__(self, sim, ctx, *args, **kwargs):
+        CoramChannel.__init__(self, *args, **kwargs)
+        self.setup(sim, ctx)
+    def read(self):
+        return self.sim.readQueue(self, blocking=False)
+    def write(self, value):
+        self.sim.writeQueue(self, value)
+
+class SimRegister(CoramRegister, SimObject):
+    def __init__(self, sim, ctx, *args, **kwargs):
+        CoramRegister.__init__(self, *args, **kwargs)
+        self.setup(sim, ctx)
+    def read(self):
+        return self.sim.readRegister(self)
+    def write(self, value):
+        self.sim.writeRegister(self, value)
+
+class SimIoChannel(CoramIoChannel, SimObject):
+    def __init__(self, sim, ctx, *args, **kwargs):
+        CoramIoChannel.__init__(self, *args, **kwargs)
+        self.setup(sim, ctx)
+    def read(self):
+        # waits for the host
+        return self.sim.readQueue(self, blocking=True)
+    def write(self, value):
+        self.sim.writeQueue(self, value)
+
+class SimIoRegister(CoramIoRegister, SimObject):
+    def __init__(self, sim, ctx, *args, **kwargs):
+        CoramIoRegister.__init__(self, *args, **kwargs)
+        self.setup(sim, ctx)
+    def read(self, addr):
+        return self.sim.readRegister(self, addr)
+    def write(self, addr, value):
+        self.sim.writeRegister(self, value, addr)
+
+SIM_CLASSES = (
+    ('CoramMemory', SimMemory),
+    ('CoramInStream', SimInStream),
+    ('CoramOutStream', SimOutStream),
+    ('CoramChannel', SimChannel),
+    ('CoramRegister', SimRegister),
+    ('CoramIoChannel', SimIoChannel),
+    ('CoramIoRegister', SimIoRegister),
+)
+
+#-------------------------------------------------------------------------------
+class HardwareSemantics(ast.NodeTransformer):
+    # '/' is the integer division of the generated hardware,
+    # and the 'coram' module is given by the simulator
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Div):
+            node.op = ast.FloorDiv()
+        return node
+    def visit_AugAssign(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Div):
+            node.op = ast.FloorDiv()
+        return node
+    def visit_Import(self, node):
+        node.names = [ alias for alias in node.names if alias.name != 'coram' ]
+        return node if node.names else ast.Pass()
+    def visit_ImportFrom(self, node):
+        return node if node.module != 'coram' else ast.Pass()
+
+#-------------------------------------------------------------------------------
+class Simulator(object):
+    def __init__(self, configs=None, timing=False, max_cycles=None):
+        self.configs = dict(DEFAULT_CONFIGS)
+        if configs is not None:
+            for k in DEFAULT_CONFIGS.keys():
+                if k in configs: self.configs[k] = configs[k]
+        self.timing = timing
+        self.max_cycles = max_cycles
+        self.dram = Dram(self.configs['sim_addrwidth'])
+        self.dram_free = 0
+        # (done, index, thread name, transfer) of the DMA transfers in flight
+        self.pending = []
+        self.transfer_time = None
+        self.contexts = []
+        self.ports = collections.OrderedDict()
+        self.handlers = {}
+        self.trace = []
+        self.cond = threading.Condition()
+        self.running = None
+        self.current = None
+        self.stopped = False
+        self.timeout = False
+        self.error = None
+
+    #---------------------------------------------------------------------------
+    def addThread(self, thread_name, source, filename=None):
+        self.contexts.append( ThreadContext(len(self.contexts), thread_name, source,
+                                            filename if filename is not None else thread_name) )
+
+    def addThreadFile(self, filename):
+        (thread_name, ext) = os.path.splitext(os.path.basename(filename))
+        self.addThread(thread_name, open(filename, 'r').read(), filename)
+
+    def loadMemoryImage(self, filename):
+        self.dram.load(filename)
+
+    def getPort(self, thread_name, obj_name):
+        key = (thread_name, obj_name)
+        if key not in self.ports:
+            if thread_name not in [ ctx.name for ctx in self.contexts ]:
+                raise NameError("no such thread: %s" % thread_name)
+            self.ports[key] = Port(thread_name, obj_name)
+        return self.ports[key]
+
+    def setHandler(self, thread_name, obj_name, handler):
+        # handler(obj, command, *args) is called after every command of the object
+        self.getPort(thread_name, obj_name).handler = handler
+
+    def push(self, thread_name, obj_name, *values):
+        # values to a channel or an I/O channel
+        port = self.getPort(thread_name, obj_name)
+        for value in values:
+            port.inbox.append( (self.now(), value) )
+
+    def setValue(self, thread_name, obj_name, value, addr=0):
+        self.getPort(thread_name, obj_name).values[addr] = value
+
+    def now(self):
+        if self.transfer_time is not None: return self.transfer_time
+        return self.current.time if self.current is not None else 0
+
+    #---------------------------------------------------------------------------
+    # scheduler: the thread with the earliest time runs, one at a time
+    #---------------------------------------------------------------------------
+    def getReadyTime(self, ctx):
+        if ctx.finished: return None
+        if ctx.waiting is None: return ctx.time
+        if not ctx.waiting: return None
+        return max(ctx.time, ctx.waiting[0][0])
+
+    def schedule(self):
+        while True:
+            ready = [ (self.getReadyTime(ctx), ctx.index, ctx) for ctx in self.contexts
+                      if self.getReadyTime(ctx) is not None ]
+            # the transfers done until the next thread runs, which can wake up a thread
+            if (not self.pending or self.stopped or
+                (ready and self.pending[0][0] > min(ready)[0])):
+                break
+            (done, index, thread_name, transfer) = heapq.heappop(self.pending)
+            self.transfer_time = done
+            try:
+                transfer()
+            except Exception:
+                # an exception of the user-logic model called at the transfer
+                if self.error is None:
+                    self.error = (thread_name, traceback.format_exc())
+                self.stopped = True
+            self.transfer_time = None
+        self.running = min(ready)[2] if ready and not self.stopped else None
+        self.cond.notify_all()
+
+    def waitTurn(self, ctx):
+        while self.running is not ctx:
+            if self.stopped: raise SimulationAbort()
+            self.cond.wait()
+        self.current = ctx
+
+    def advance(self, ctx, cycles):
+        with self.cond:
+            ctx.time += cycles
+            if self.max_cycles is not None and ctx.time > self.max_cycles:
+                self.timeout = True
+                self.stopped = True
+            self.schedule()
+            self.waitTurn(ctx)
+
+    def waitQueue(self, ctx, queue):
+        with self.cond:
+            while not queue:
+                ctx.waiting = queue
+                self.schedule()
+                self.waitTurn(ctx)
+            ctx.waiting = None
+            ctx.time = max(ctx.time, queue[0][0])
+
+    def execute(self, ctx):
+        namespace = { '__name__' : '__main__',
+                      'subroutine' : subroutine,
+                      'inline' : inline }
+        for name, cls in SIM_CLASSES:
+            namespace[name] = self.getFactory(cls, ctx)
+        try:
+            tree = HardwareSemantics().visit(ast.parse(ctx.source, ctx.filename))
+            code = compile(ast.fix_missing_locations(tree), ctx.filename, 'exec')
+            with self.cond:
+                self.waitTurn(ctx)
+            exec(code, namespace)
+        except SimulationAbort:
+            pass
+        except Exception:
+            with self.cond:
+                if self.error is None:
+                    self.error = (ctx.name, traceback.format_exc())
+                self.stopped = True
+        with self.cond:
+            ctx.finished = True
+            self.schedule()
+
+    def getFactory(self, cls, ctx):
+        def create(*args, **kwargs):
+            return cls(self, ctx, *args, **kwargs)
+        return create
+
+    def run(self):
+        if not self.contexts:
+            raise ValueError("No control thread to simulate")
+        for ctx in self.contexts:
+            ctx.thread = threading.Thread(target=self.execute, args=(ctx,))
+            ctx.thread.daemon = True
+        with self.cond:
+            for ctx in self.contexts:
+                ctx.thread.start()
+            self.schedule()
+            while self.running is not None:
+                self.cond.wait()
+            # the threads waiting for the host are stopped
+            self.stopped = True
+            self.cond.notify_all()
+        for ctx in self.contexts:
+            ctx.thread.join()
+        if self.error is not None:
+            raise RuntimeError("Exception in thread '%s':\n%s" % self.error)
+
+    #---------------------------------------------------------------------------
+    # CoRAM commands
+    #---------------------------------------------------------------------------
+    def callHandler(self, obj, command, *args):
+        if obj.port.handler is not None:
+            obj.port.handler(obj, command, *args)
+
+    def getExtBytes(self, obj):
+        # beat size of the DMA controller
+        datawidth = int(obj.datawidth) if obj.datawidth is not None else 32
+        if obj.length is not None and obj.scattergather:
+            datawidth *= int(obj.length)
+        return gcd(datawidth, self.configs['ext_datawidth']) // 8
+
+    def getDmaDone(self, obj, start, size, dram_read):
+        # bursts of a port in sequence, and data of all the ports share the DRAM bandwidth
+        if not self.timing or size == 0:
+            return start
+        latency = self.configs['mem_read_latency' if dram_read else 'mem_write_latency']
+        beat = self.getExtBytes(obj)
+        bytes_per_cycle = (self.configs['mem_bytes_per_cycle']
+                           if self.configs['mem_bytes_per_cycle'] > 0 else beat)
+        time = start
+        pos = 0
+        while pos < size:
+            n = min(beat * EXT_BURSTLENGTH, size - pos)
+            data_start = max(time + latency, self.dram_free)
+            time = data_start + int(math.ceil(float(n) / bytes_per_cycle))
+            self.dram_free = time
+            pos += n
+        return time
+
+    def dma(self, obj, command, ram_addr, mem_addr, size, blocking):
+        ctx = obj.ctx
+        port = obj.port
+        ram_addr = int(ram_addr) if ram_addr is not None else None
+        # the address register of the generated hardware
+        mem_addr = int(mem_addr) & ((1 << self.configs['signal_width']) - 1)
+        size = int(size)
+        wordbytes = obj.getWordBytes()
+        nbytes = size * wordbytes
+
+        # a new request waits for the previous one of the same object
+        start = max(ctx.time, port.done)
+        dram_read = (command == 'write')
+
+        if port.bram is not None:
+            pos = ram_addr * wordbytes
+            if pos < 0 or pos + nbytes > len(port.bram):
+                raise ValueError("thread:%s memory:%s illegal local address [%d:%d] (capacity %d)" %
+                                 (ctx.name, obj.name, ram_addr, ram_addr + size - 1,
+                                  len(port.bram) // wordbytes))
+
+        def transfer():
+            if port.bram is not None:
+                if dram_read:
+                    putBuffer(port.bram, pos, self.dram.read(mem_addr, nbytes))
+                else:
+                    self.dram.write(mem_addr, getBuffer(port.bram, pos, nbytes))
+            elif dram_read:
+                port.fifo.extend(self.dram.read(mem_addr, nbytes))
+            else:
+                if len(port.fifo) < nbytes and not port.warned:
+                    print("Warning: thread:%s stream:%s has no data from the user-logic, zeros are written" %
+                          (ctx.name, obj.name))
+                    port.warned = True
+                data = bytes(port.fifo[:nbytes])
+                del port.fifo[:nbytes]
+                self.dram.write(mem_addr, data + bytes(bytearray(nbytes - len(data))))
+            self.callHandler(obj, command, ram_addr, mem_addr, size)
+
+        done = self.getDmaDone(obj, start, nbytes, dram_read)
+        port.done = done
+        port.requests += 1
+        port.bytes += nbytes
+        self.trace.append( (start, done, ctx.name, obj.name, command, mem_addr,
+                            ram_addr, size, nbytes) )
+        # with the timing, the data is moved when the transfer is done
+        if self.timing:
+            heapq.heappush(self.pending, (done, len(self.trace), ctx.name, transfer))
+        else:
+            transfer()
+
+        if blocking:
+            self.advance(ctx, done - ctx.time + 1)
+        else:
+            self.advance(ctx, start - ctx.time + 1)
+
+    def waitDma(self, obj):
+        ctx = obj.ctx
+        self.advance(ctx, max(obj.port.done - ctx.time, 0) + 1)
+
+    def testDma(self, obj):
+        ctx = obj.ctx
+        self.advance(ctx, 1)
+        return ctx.time >= obj.port.done
+
+    def readQueue(self, obj, blocking):
+        ctx = obj.ctx
+        port = obj.port
+        if not port.inbox:
+            self.callHandler(obj, 'read')
+        if not port.inbox and not blocking:
+            # no user-logic model: the same value as the compiler stub
+            if not port.warned:
+                print("Warning: thread:%s channel:%s has no data from the user-logic, 0 is read" %
+                      (ctx.name, obj.name))
+                port.warned = True
+            self.advance(ctx, 1)
+            return 0
+        self.waitQueue(ctx, port.inbox)
+        value = port.inbox.popleft()[1]
+        self.advance(ctx, 1)
+        return value
+
+    def writeQueue(self, obj, value):
+        obj.port.outbox.append( (obj.ctx.time, value) )
+        self.callHandler(obj, 'write', value)
+        self.advance(obj.ctx, 1)
+
+    def readRegister(self, obj, addr=0):
+        addr = int(addr)
+        self.callHandler(obj, 'read', addr)
+        self.advance(obj.ctx, 1)
+        return obj.port.values.get(addr, 0)
+
+    def writeRegister(self, obj, value, addr=0):
+        addr = int(addr)
+        obj.port.values[addr] = value
+        self.callHandler(obj, 'write', value, addr)
+        self.advance(obj.ctx, 1)
+
+    #---------------------------------------------------------------------------
+    # results
+    #---------------------------------------------------------------------------
+    def getTrace(self):
+        return sorted(self.trace, key=lambda x:(x[0], x[2], x[3]))
+
+    def writeTrace(self, filename):
+        f = open(filename, 'w')
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow( ('time', 'done', 'thread', 'object', 'command',
+                          'mem_addr', 'ram_addr', 'size', 'bytes') )
+        for row in self.getTrace():
+            writer.writerow( tuple([ '' if v is None else v for v in row ]) )
+        f.close()
+
+    def dump(self, buf=sys.stdout):
+        print("----------------------------------------", file=buf)
+        print("Functional Simulation (timing: %s)" %
+              ('approximate' if self.timing else 'none'), file=buf)
+        for ctx in self.contexts:
+            status = ('time out' if self.max_cycles is not None and ctx.time > self.max_cycles else
+                      'waiting for the host' if ctx.waiting is not None else
+                      'finished')
+            print("  Thread %s: %s at cycle %d" % (ctx.name, status, ctx.time), file=buf)
+        for (thread_name, obj_name), port in self.ports.items():
+            if port.requests == 0: continue
+            print("  DMA %s.%s: %d requests, %d bytes" %
+                  (thread_name, obj_name, port.requests, port.bytes), file=buf)
+        print("  DRAM pages written: %d" % len(self.dram.pages), file=buf)
@@ -12,10 +12,17 @@ import os
 import sys
 import math
 import copy
-import shutil
-from jinja2 import Environment, FileSystemLoader
+import time
+import collections
+import jinja2
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 
 import pycoram.utils.componentgen
+import pycoram.utils.cache
+import pycoram.utils.report
+import pycoram.utils.profiler
+import pycoram.utils.sparsemem
+import pycoram.utils.hotspot
 from pycoram.controlthread.controlthread import ControlThreadGenerator
 from pycoram.rtlconverter.rtlconverter import RtlConverter
 from pycoram.controlthread.coram_module import *
@@ -27,12 +34,22 @@ from pyverilog.ast_code_generator.codegen import ASTCodeGenerator
 
 TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__)) + '/template/'
 
+# DRAM timing model of the test benches
+MEM_TIMING = ('mem_read_latency', 'mem_write_latency', 'mem_bytes_per_cycle', 'mem_outstanding',
+              'mem_row_size', 'mem_banks', 'mem_row_penalty', 'mem_jitter', 'mem_seed')
+
 #-------------------------------------------------------------------------------
 class PycoramIp(object):
     def __init__(self, signal_width=32, ext_addrwidth=32, ext_datawidth=512,
                  if_type='axi', io_lite=True, single_clock=True,
                  sim_addrwidth=27, hperiod_ulogic=5, hperiod_cthread=5, hperiod_bus=5,
-                 topmodule='TOP', memimg=None, usertest=None, output='out.v'):
+                 sim_memory='flat', sim_pages=4096,
+                 mem_read_latency=8, mem_write_latency=4, mem_bytes_per_cycle=0, mem_outstanding=0,
+                 mem_row_size=2048, mem_banks=8, mem_row_penalty=0, mem_jitter=0, mem_seed=1,
+                 perf_interval=0, sim_profile=False,
+                 topmodule='TOP', memimg=None, usertest=None, output='out.v',
+                 fsm_compaction=False, fsm_scheduling=False, fsm_encoding='binary',
+                 subroutine_threshold=0, bitwidth_inference=False, cache_dir=None, jobs=1):
         self.signal_width = signal_width
         self.ext_addrwidth = ext_addrwidth
         self.ext_datawidth = ext_datawidth
@@ -40,6 +57,19 @@ class PycoramIp(object):
         self.io_lite = True
         self.single_clock = True
         self.sim_addrwidth = sim_addrwidth
+        self.sim_memory = sim_memory
+        self.sim_pages = sim_pages
+        self.mem_read_latency = mem_read_latency
+        self.mem_write_latency = mem_write_latency
+        self.mem_bytes_per_cycle = mem_bytes_per_cycle
+        self.mem_outstanding = mem_outstanding
+        self.mem_row_size = mem_row_size
+        self.mem_banks = mem_banks
+        self.mem_row_penalty = mem_row_penalty
+        self.mem_jitter = mem_jitter
+        self.mem_seed = mem_seed
+        self.perf_interval = perf_interval
+        self.sim_profile = sim_profile
         self.hperiod_ulogic = hperiod_ulogic
         self.hperiod_cthread = hperiod_cthread
         self.hperiod_bus = hperiod_bus
@@ -47,6 +77,13 @@ class PycoramIp(object):
         self.memimg = memimg
         self.usertest = usertest
         self.output = output
+        self.fsm_compaction = fsm_compaction
+        self.fsm_scheduling = fsm_scheduling
+        self.fsm_encoding = fsm_encoding
+        self.subroutine_threshold = subroutine_threshold
+        self.bitwidth_inference = bitwidth_inference
+        self.cache_dir = cache_dir
+        self.jobs = jobs
 
         self.include_paths = []
         self.macros = []
@@ -55,6 +92,7 @@ class PycoramIp(object):
         
         self.rtl_files = []
         self.controlthreads = {}
+        self.thread_options = {}
 
     def add_include_path(self, path):
         self.include_paths.append(path)
@@ -71,14 +109,25 @@ class PycoramIp(object):
             raise ValueError("function '%s' is already defined." % name)
         self.function_lib[name] = func
         
-    def add_controlthread(self, cthread, threadname=None):
+    def add_controlthread(self, cthread, threadname=None,
+                          fsm_compaction=None, fsm_scheduling=None, fsm_encoding=None,
+                          subroutine_threshold=None, bitwidth_inference=None):
         if threadname is None:
             threadname = cthread.__name__
         if threadname in self.controlthreads:
             raise ValueError("cthread '%s' is already defined." % threadname)
         self.controlthreads[threadname] = cthread
-
-    def generate(self):
+        # the same per-thread options as in [cthread:<thread name>]
+        opts = {}
+        if fsm_compaction is not None: opts['fsm_compaction'] = fsm_compaction
+        if fsm_scheduling is not None: opts['fsm_scheduling'] = fsm_scheduling
+        if fsm_encoding is not None: opts['fsm_encoding'] = fsm_encoding
+        if subroutine_threshold is not None: opts['subroutine_threshold'] = subroutine_threshold
+        if bitwidth_inference is not None: opts['bitwidth_inference'] = bitwidth_inference
+        if opts:
+            self.thread_options[threadname] = opts
+
+    def generate(self, profile=False, profile_dir=None):
         for f in self.rtl_files:
             if not os.path.exists(f): raise IOError("file not found: " + f)
 
@@ -100,35 +149,97 @@ class PycoramIp(object):
             'io_lite' : self.io_lite,
             'if_type' : self.if_type,
             'output' : self.output,
+            'fsm_compaction' : self.fsm_compaction,
+            'fsm_scheduling' : self.fsm_scheduling,
+            'fsm_encoding' : self.fsm_encoding,
+            'subroutine_threshold' : self.subroutine_threshold,
+            'bitwidth_inference' : self.bitwidth_inference,
             'sim_addrwidth' : self.sim_addrwidth,
+            'sim_memory' : self.sim_memory,
+            'sim_pages' : self.sim_pages,
+            'mem_read_latency' : self.mem_read_latency,
+            'mem_write_latency' : self.mem_write_latency,
+            'mem_bytes_per_cycle' : self.mem_bytes_per_cycle,
+            'mem_outstanding' : self.mem_outstanding,
+            'mem_row_size' : self.mem_row_size,
+            'mem_banks' : self.mem_banks,
+            'mem_row_penalty' : self.mem_row_penalty,
+            'mem_jitter' : self.mem_jitter,
+            'mem_seed' : self.mem_seed,
+            'perf_interval' : self.perf_interval,
+            'sim_profile' : self.sim_profile,
             'hperiod_ulogic' : self.hperiod_ulogic,
             'hperiod_cthread' : self.hperiod_cthread,
             'hperiod_bus' : self.hperiod_bus,
         }
 
-        systembuilder = SystemBuilder()
-        systembuilder.build(configs,
-                            self.topmodule,
-                            self.rtl_files,
-                            controlthread_funcs=self.controlthreads,
-                            function_lib=self.function_lib,
-                            userlogic_include=self.include_paths,
-                            userlogic_define=self.macros,
-                            usertest=self.usertest,
-                            memimg=self.memimg)
+        if profile or profile_dir is not None:
+            pycoram.utils.profiler.enable(profile_dir)
+        try:
+            systembuilder = SystemBuilder(cache_dir=self.cache_dir)
+            systembuilder.build(configs,
+                                self.topmodule,
+                                self.rtl_files,
+                                controlthread_funcs=self.controlthreads,
+                                function_lib=self.function_lib,
+                                userlogic_include=self.include_paths,
+                                userlogic_define=self.macros,
+                                usertest=self.usertest,
+                                memimg=self.memimg,
+                                jobs=self.jobs,
+                                thread_options=self.thread_options)
+        finally:
+            prof = pycoram.utils.profiler.disable()
+            if prof is not None:
+                prof.dump()
             
+#-------------------------------------------------------------------------------
+# static HDL and script files are read only once in a process
+template_files = {}
+def readTemplateFile(filename):
+    if filename not in template_files:
+        f = open(TEMPLATE_DIR+filename, 'r')
+        template_files[filename] = f.read()
+        f.close()
+    return template_files[filename]
+
 #-------------------------------------------------------------------------------
 def log2(v):
     return int(math.ceil(math.log(v, 2)))
 
 #-------------------------------------------------------------------------------
 class SystemBuilder(object):
-    def __init__(self):
-        self.env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+    def __init__(self, cache_dir=None, memory_cache=False):
+        self.cache_dir = cache_dir
+        # parsed RTL and compiled threads are kept in memory over builds
+        self.rtl_cache = None
+        self.thread_cache = None
+        if memory_cache and cache_dir is None:
+            self.rtl_cache = pycoram.utils.cache.MemoryCache()
+            self.thread_cache = pycoram.utils.cache.MemoryCache()
+        # compiled templates are stored in the cache directory
+        bytecode_cache = (FileSystemBytecodeCache(self.getBytecodeCacheDir(cache_dir))
+                          if cache_dir is not None else None)
+        self.env = Environment(loader=FileSystemLoader(TEMPLATE_DIR),
+                               bytecode_cache=bytecode_cache)
         self.env.globals['int'] = int
         self.env.globals['log'] = math.log
         self.env.globals['log2'] = log2
         self.env.globals['len'] = len
+        # template file -> (digest of the inputs, rendered code)
+        self.renders = {}
+        self.threads_digest = (None, None)
+        # thread name -> number of FSM states in the last build
+        self.thread_states = {}
+        self.report = None
+        self.render_cache = (pycoram.utils.cache.FileCache(cache_dir, 'render')
+                             if cache_dir is not None else None)
+
+    def getBytecodeCacheDir(self, cache_dir):
+        dirname = os.path.join(cache_dir, 'jinja2')
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        return dirname
 
     #---------------------------------------------------------------------------
     def render(self, template_file,
@@ -138,6 +249,8 @@ class SystemBuilder(object):
                single_clock=False, lite=False,
                hdlname=None, common_hdlname=None, testname=None, ipcore_version=None,
                memimg=None, binfile=False, usertestcode=None, simaddrwidth=None, 
+               simmemory='flat', simpages=None, memimg_pagelist=None, memtiming=None, perfinterval=0,
+               profthreads=None,
                mpd_parameters=None, mpd_ports=None,
                tcl_parameters=None, tcl_ports=None,
                clock_hperiod_userlogic=None,
@@ -166,6 +279,21 @@ class SystemBuilder(object):
             'binfile' : binfile,
             'usertestcode' : '' if usertestcode is None else usertestcode,
             'simaddrwidth' : simaddrwidth,
+            'simmemory' : simmemory,
+            'simpages' : simpages,
+            'memimg_pagelist' : memimg_pagelist if memimg_pagelist is not None else 'None',
+            'mem_read_latency' : 8,
+            'mem_write_latency' : 4,
+            'mem_bytes_per_cycle' : 0,
+            'mem_outstanding' : 0,
+            'mem_row_size' : 2048,
+            'mem_banks' : 8,
+            'mem_row_penalty' : 0,
+            'mem_jitter' : 0,
+            'mem_seed' : 1,
+            'perfinterval' : perfinterval,
+            'dmaports' : self.getDmaPorts(threads),
+            'profthreads' : () if profthreads is None else profthreads,
             
             'mpd_parameters' : () if mpd_parameters is None else mpd_parameters,
             'mpd_ports' : () if mpd_ports is None else mpd_ports,
@@ -180,15 +308,79 @@ class SystemBuilder(object):
             'single_clock' : single_clock,
             'lite' : lite
             }
+        if memtiming is not None:
+            template_dict.update(memtiming)
         
-        template = self.env.get_template(template_file)
-        rslt = template.render(template_dict)
+        # same template and same inputs: the last rendered code is reused
+        key = pycoram.utils.cache.digest(jinja2.__version__,
+                                         pycoram.utils.cache.fileDigest(TEMPLATE_DIR+template_file),
+                                         template_file, self.getThreadsDigest(threads),
+                                         dict([ (k, v) for k, v in template_dict.items()
+                                                if k != 'threads' ]))
+        if template_file in self.renders and self.renders[template_file][0] == key:
+            return self.renders[template_file][1]
+
+        rslt = None
+        if self.render_cache is not None:
+            rslt = self.render_cache.get(key)
+        if rslt is None:
+            template = self.env.get_template(template_file)
+            rslt = template.render(template_dict)
+            if self.render_cache is not None:
+                self.render_cache.put(key, rslt)
+
+        self.renders[template_file] = (key, rslt)
         return rslt
 
+    def getStateCounts(self):
+        return self.thread_states
+
+    def getReport(self):
+        return self.report
+
+    def getDmaPorts(self, threads):
+        # DRAM ports of the test bench, in the order of the templates
+        ret = []
+        for thread in sorted(threads, key=lambda x:x.name):
+            for kind, objs in (('memory', thread.memories),
+                               ('instream', thread.instreams),
+                               ('outstream', thread.outstreams)):
+                for obj in sorted(objs, key=lambda x:x.name):
+                    ret.append({ 'prefix' : thread.name + '_' + obj.name,
+                                 'object' : thread.name + '.' + obj.name,
+                                 'type' : kind })
+        return ret
+
+    def getProfThreads(self, threads, linetables):
+        # values of the state registers, counted by the state profiler of the test bench
+        ret = []
+        for thread in threads:
+            table = linetables[thread.name]
+            ret.append({ 'name' : thread.name,
+                         'size' : max([ state for state, code, lines in table['states'] ]) + 1,
+                         'states' : [ (state, "%d'h%x" % (table['width'], code))
+                                      for state, code, lines in table['states'] ] })
+        return ret
+
+    def getThreadsDigest(self, threads):
+        # the same thread list is passed to all templates in a build
+        if self.threads_digest[0] is not threads:
+            self.threads_digest = (threads, pycoram.utils.cache.digest(threads))
+        return self.threads_digest[1]
+
+    #---------------------------------------------------------------------------
+    def getCompileOptions(self, configs):
+        return { 'fsm_compaction' : configs.get('fsm_compaction', False),
+                 'fsm_scheduling' : configs.get('fsm_scheduling', False),
+                 'fsm_encoding' : configs.get('fsm_encoding', 'binary'),
+                 'subroutine_threshold' : configs.get('subroutine_threshold', 0),
+                 'bitwidth_inference' : configs.get('bitwidth_inference', False) }
+
     #---------------------------------------------------------------------------
     def build(self, configs, userlogic_topmodule,  userlogic_filelist,
               controlthread_filelist=None, controlthread_funcs=None, function_lib=None,
-              userlogic_include=None, userlogic_define=None, memimg=None, usertest=None):
+              userlogic_include=None, userlogic_define=None, memimg=None, usertest=None,
+              jobs=1, thread_options=None):
 
         # default values
         ext_burstlength = 256
@@ -199,12 +391,37 @@ class SystemBuilder(object):
              (configs['hperiod_cthread'] != configs['hperiod_bus']))):
             raise ValueError("All clock periods should be same in single clock mode.")
 
+        if configs['sim_memory'] not in ('flat', 'sparse'):
+            raise ValueError("sim_memory should be flat or sparse, not '%s'." % configs['sim_memory'])
+        if configs['sim_memory'] == 'sparse':
+            if configs['sim_pages'] < 1:
+                raise ValueError("sim_pages should be 1 or more, not %d." % configs['sim_pages'])
+            # page numbers are 32-bit in the page list of the sparse model
+            if configs['sim_addrwidth'] > pycoram.utils.sparsemem.MAX_ADDR_WIDTH:
+                raise ValueError("sim_addrwidth should be %d or less with the sparse memory, not %d." %
+                                 (pycoram.utils.sparsemem.MAX_ADDR_WIDTH, configs['sim_addrwidth']))
+
+        for k in MEM_TIMING:
+            if k != 'mem_seed' and configs[k] < 0:
+                raise ValueError("%s should be 0 or more, not %d." % (k, configs[k]))
+        if configs['mem_row_size'] < 1 or configs['mem_banks'] < 1:
+            raise ValueError("mem_row_size and mem_banks should be 1 or more.")
+
+        if configs['perf_interval'] < 0:
+            raise ValueError("perf_interval should be 0 or more, not %d." % configs['perf_interval'])
+
+        times = collections.OrderedDict()
+
         # User RTL Conversion
         converter = RtlConverter(userlogic_filelist, userlogic_topmodule,
                                  include=userlogic_include,
                                  define=userlogic_define,
-                                 single_clock=configs['single_clock'])
+                                 single_clock=configs['single_clock'],
+                                 cache_dir=self.cache_dir,
+                                 cache_store=self.rtl_cache)
         userlogic_ast = converter.generate()
+        for k, v in converter.getTimes().items():
+            times['rtl_' + k] = v
         top_parameters = converter.getTopParameters()
         top_ioports = converter.getTopIOPorts()
 
@@ -212,39 +429,48 @@ class SystemBuilder(object):
         converter.dumpCoramObject()
         
         # Code Generator
+        start = time.time()
+        pycoram.utils.profiler.begin('codegen')
         asttocode = ASTCodeGenerator()
         userlogic_code= asttocode.visit(userlogic_ast)
+        pycoram.utils.profiler.end('codegen')
+        times['rtl_codegen'] = time.time() - start
 
         # Control Thread
-        controlthread_codes = []
-        generator = ControlThreadGenerator()
+        start = time.time()
+        generator = ControlThreadGenerator(cache_dir=self.cache_dir,
+                                           cache_store=self.thread_cache)
         thread_status = {}
+        controlthread_sources = []
 
         # from files
         if controlthread_filelist is not None: 
             for f in controlthread_filelist:
                 (thread_name, ext) = os.path.splitext(os.path.basename(f))
-                controlthread_codes.append(
-                    generator.compile(thread_name, filename=f, 
-                                      signalwidth=configs['signal_width'], 
-                                      ext_addrwidth=configs['ext_addrwidth'],
-                                      ext_max_datawidth=configs['ext_datawidth'],
-                                      dump=True))
-                thread_status.update(generator.getStatus())
+                controlthread_sources.append(
+                    (thread_name, generator.getSource(filename=f)))
             
         # from func objects
         if controlthread_funcs is not None: 
             for func_name, func in controlthread_funcs.items():
-                controlthread_codes.append(
-                    generator.compile(func_name, func=func,
-                                      function_lib=function_lib,
-                                      signalwidth=configs['signal_width'], 
-                                      ext_addrwidth=configs['ext_addrwidth'],
-                                      ext_max_datawidth=configs['ext_datawidth'],
-                                      dump=True))
-                thread_status.update(generator.getStatus())
+                controlthread_sources.append(
+                    (func_name, generator.getSource(func=func, function_lib=function_lib)))
+
+        controlthread_codes = generator.compileThreads(controlthread_sources,
+                                                       signalwidth=configs['signal_width'], 
+                                                       ext_addrwidth=configs['ext_addrwidth'],
+                                                       ext_max_datawidth=configs['ext_datawidth'],
+                                                       jobs=jobs, dump=True,
+                                                       options=self.getCompileOptions(configs),
+                                                       thread_options=thread_options)
+        thread_status.update(generator.getStatus())
+        self.thread_states = dict([ (thread_name, generator.getStateCount(thread_name))
+                                    for thread_name, source in controlthread_sources ])
+        times['controlthread'] = time.time() - start
             
         # Template Render
+        start = time.time()
+        pycoram.utils.profiler.begin('render')
         threads = []
         for tname, (tmemories, tinstreams, toutstreams, tchannels, tregisters, 
                     tiochannels, tioregisters) in sorted(thread_status.items(), key=lambda x:x[0]):
@@ -295,6 +521,10 @@ class SystemBuilder(object):
                                        ext_burstlength=ext_burstlength,
                                        single_clock=configs['single_clock'], lite=configs['io_lite'])
 
+        thread_names = [ thread.name for thread in threads ]
+        linetables = dict([ (name, generator.getLineTable(name)) for name in thread_names ])
+        profthreads = self.getProfThreads(threads, linetables) if configs['sim_profile'] else None
+
         # finalize of code generation
         synthesized_code_list = []
         synthesized_code_list.append(node_code)
@@ -303,11 +533,11 @@ class SystemBuilder(object):
         synthesized_code_list.append(dmac_memory_code)
 
         common_code_list = []
-        pycoram_object = open(TEMPLATE_DIR+'pycoram_object.v', 'r').read()
-        dmac_memory_common = open(TEMPLATE_DIR+'dmac_memory_common.v', 'r').read()
-        dmac_stream = open(TEMPLATE_DIR+'dmac_stream.v', 'r').read()
-        dmac_iochannel = open(TEMPLATE_DIR+'dmac_iochannel.v', 'r').read()
-        dmac_ioregister = open(TEMPLATE_DIR+'dmac_ioregister.v', 'r').read()
+        pycoram_object = readTemplateFile('pycoram_object.v')
+        dmac_memory_common = readTemplateFile('dmac_memory_common.v')
+        dmac_stream = readTemplateFile('dmac_stream.v')
+        dmac_iochannel = readTemplateFile('dmac_iochannel.v')
+        dmac_ioregister = readTemplateFile('dmac_ioregister.v')
         common_code_list.append(pycoram_object)
         common_code_list.append(dmac_memory_common)
         common_code_list.append(dmac_stream)
@@ -315,18 +545,18 @@ class SystemBuilder(object):
         common_code_list.append(dmac_ioregister)
 
         if configs['if_type'] == 'axi':
-            common_code_list.append( open(TEMPLATE_DIR+'axi_master_interface.v', 'r').read() )
+            common_code_list.append( readTemplateFile('axi_master_interface.v') )
             if configs['io_lite']: 
-                common_code_list.append( open(TEMPLATE_DIR+'axi_lite_slave_interface.v', 'r').read() )
+                common_code_list.append( readTemplateFile('axi_lite_slave_interface.v') )
             else:
-                common_code_list.append( open(TEMPLATE_DIR+'axi_slave_interface.v', 'r').read() )
+                common_code_list.append( readTemplateFile('axi_slave_interface.v') )
 
         if configs['if_type'] == 'avalon':
-            common_code_list.append( open(TEMPLATE_DIR+'avalon_master_interface.v', 'r').read() )
+            common_code_list.append( readTemplateFile('avalon_master_interface.v') )
             if configs['io_lite']: 
-                common_code_list.append( open(TEMPLATE_DIR+'avalon_lite_slave_interface.v', 'r').read() )
+                common_code_list.append( readTemplateFile('avalon_lite_slave_interface.v') )
             else:
-                common_code_list.append( open(TEMPLATE_DIR+'avalon_slave_interface.v', 'r').read() )
+                common_code_list.append( readTemplateFile('avalon_slave_interface.v') )
 
         synthesized_code = ''.join(synthesized_code_list)
         common_code = ''.join(common_code_list)
@@ -337,39 +567,70 @@ class SystemBuilder(object):
         for k, v in sorted(configs.items(), key=lambda x:x[0]):
             print("  %s : %s" % (str(k), str(v)))
 
+        pycoram.utils.profiler.end('render')
+        times['render'] = time.time() - start
+        start = time.time()
+        pycoram.utils.profiler.begin('output')
+
         # write to file, without AXI interfaces
         if configs['if_type'] == 'general':
             self.build_package_general(configs, synthesized_code, common_code)
-            return
+            reportname = os.path.splitext(configs['output'])[0] + '.json'
 
-        if configs['if_type'] == 'axi':
+        elif configs['if_type'] == 'axi':
             self.build_package_axi(configs, synthesized_code, common_code, 
                                    threads, 
                                    top_parameters, top_ioports, userlogic_topmodule,
-                                   memimg, usertest)
-            return
+                                   memimg, usertest, profthreads)
+            reportname = 'pycoram_' + userlogic_topmodule + '_v1_00_a.json'
             
-        if configs['if_type'] == 'avalon':
+        elif configs['if_type'] == 'avalon':
             self.build_package_avalon(configs, synthesized_code, common_code,
                                       threads, 
                                       top_parameters, top_ioports, userlogic_topmodule,
-                                      memimg, usertest)
-            return
+                                      memimg, usertest, profthreads)
+            reportname = 'pycoram_' + userlogic_topmodule + '_v1_00_a.json'
+
+        else:
+            raise ValueError("Interface type '%s' is not supported." % configs['if_type'])
 
-        raise ValueError("Interface type '%s' is not supported." % configs['if_type'])
+        times['package'] = time.time() - start
+
+        # build report next to the package
+        self.report = pycoram.utils.report.getReport(
+            configs, userlogic_topmodule, threads,
+            dict([ (name, generator.getStats(name)) for name in thread_names ]),
+            dict([ (name, generator.getCompileTime(name)) for name in thread_names ]),
+            dict([ (name, generator.getCyclesPerIteration(name)) for name in thread_names ]),
+            times)
+        pycoram.utils.report.writeReport(reportname, self.report)
+
+        # state -> source line table of the control threads
+        linesname = os.path.splitext(reportname)[0] + '.lines.json'
+        pycoram.utils.hotspot.writeLineTable(linesname,
+                                             pycoram.utils.hotspot.getLineTable(thread_names, linetables))
+        pycoram.utils.profiler.end('output')
+
+    #---------------------------------------------------------------------------
+    def writeMemoryImage(self, configs, memimg, memname, pagelistname):
+        if configs['sim_memory'] != 'sparse':
+            pycoram.utils.cache.updateCopy(memimg, memname)
+            return
+        # only the pages in the image are loaded by the sparse model
+        (data, pagelist) = pycoram.utils.sparsemem.getSparseImage(memimg, configs['sim_pages'])
+        pycoram.utils.cache.updateFile(memname, data)
+        pycoram.utils.cache.updateFile(pagelistname, pagelist)
 
     #---------------------------------------------------------------------------
     def build_package_general(self, configs, synthesized_code, common_code):
         code = synthesized_code + common_code
-        f = open(configs['output'], 'w')
-        f.write(code)
-        f.close()
+        pycoram.utils.cache.updateFile(configs['output'], code)
 
     #---------------------------------------------------------------------------
     def build_package_axi(self, configs, synthesized_code, common_code, 
                           threads,
                           top_parameters, top_ioports, userlogic_topmodule, 
-                          memimg, usertest):
+                          memimg, usertest, profthreads=None):
         code = synthesized_code + common_code
 
         # default values
@@ -457,7 +718,8 @@ class SystemBuilder(object):
         # source
         hdlname = 'pycoram_' + userlogic_topmodule + '.v'
         testname = 'test_pycoram_' + userlogic_topmodule + '.v'
-        memname = 'mem.img'
+        memname = 'mem.img' if configs['sim_memory'] != 'sparse' else 'mem.pages'
+        pagelistname = 'mem.pagelist'
         makefilename = 'Makefile'
         copied_memimg = memname if memimg is not None else None
         binfile = (True if memimg is not None and memimg.endswith('.bin') else False)
@@ -507,9 +769,7 @@ class SystemBuilder(object):
                                hdlname=hdlname,
                                ipcore_version=ipcore_version, 
                                mpd_ports=mpd_ports, mpd_parameters=mpd_parameters)
-        f = open(mpdpath+mpdname, 'w')
-        f.write(mpd_code)
-        f.close()
+        pycoram.utils.cache.updateFile(mpdpath+mpdname, mpd_code)
 
         # mui file
         #mui_template_file = 'mui.txt'
@@ -535,17 +795,13 @@ class SystemBuilder(object):
                                hdlname=hdlname,
                                ipcore_version=ipcore_version, 
                                mpd_ports=mpd_ports, mpd_parameters=mpd_parameters)
-        f = open(paopath+paoname, 'w')
-        f.write(pao_code)
-        f.close()
+        pycoram.utils.cache.updateFile(paopath+paoname, pao_code)
 
         # tcl file
         tcl_code = ''
         if not configs['single_clock']:
-            tcl_code = open(TEMPLATE_DIR+'pcore_tcl.tcl', 'r').read()
-        f = open(tclpath+tclname, 'w')
-        f.write(tcl_code)
-        f.close()
+            tcl_code = readTemplateFile('pcore_tcl.tcl')
+        pycoram.utils.cache.updateFile(tclpath+tclname, tcl_code)
 
         # component.xml
         gen = pycoram.utils.componentgen.ComponentGen()
@@ -555,24 +811,18 @@ class SystemBuilder(object):
                                 ext_burstlength=ext_burstlength,
                                 ext_ports=ext_ports,
                                 ext_params=ext_params)
-        f = open(xmlpath+xmlname, 'w')
-        f.write(xml_code)
-        f.close()
+        pycoram.utils.cache.updateFile(xmlpath+xmlname, xml_code)
 
         # xdc
         xdc_code = ''
         if not configs['single_clock']:
-            xdc_code = open(TEMPLATE_DIR+'ipxact.xdc', 'r').read()
-        f = open(xdcpath+xdcname, 'w')
-        f.write(xdc_code)
-        f.close()
+            xdc_code = readTemplateFile('ipxact.xdc')
+        pycoram.utils.cache.updateFile(xdcpath+xdcname, xdc_code)
 
         # bd
         bd_code = ''
-        bd_code = open(TEMPLATE_DIR+'bd.tcl', 'r').read()
-        f = open(bdpath+bdname, 'w')
-        f.write(bd_code)
-        f.close()
+        bd_code = readTemplateFile('bd.tcl')
+        pycoram.utils.cache.updateFile(bdpath+bdname, bd_code)
         
         # xgui file
         xgui_template_file = 'xgui_tcl.txt'
@@ -584,14 +834,10 @@ class SystemBuilder(object):
                                 hdlname=hdlname,
                                 ipcore_version=ipcore_version, 
                                 mpd_ports=mpd_ports, mpd_parameters=mpd_parameters)
-        f = open(xguipath+xguiname, 'w')
-        f.write(xgui_code)
-        f.close()
+        pycoram.utils.cache.updateFile(xguipath+xguiname, xgui_code)
 
         # hdl file
-        f = open(verilogpath+hdlname, 'w')
-        f.write(code)
-        f.close()
+        pycoram.utils.cache.updateFile(verilogpath+hdlname, code)
 
         # user test code
         usertestcode = None 
@@ -609,17 +855,22 @@ class SystemBuilder(object):
                                 memimg=copied_memimg, binfile=binfile, 
                                 usertestcode=usertestcode,
                                 simaddrwidth=configs['sim_addrwidth'], 
+                                simmemory=configs['sim_memory'],
+                                simpages=configs['sim_pages'],
+                                memimg_pagelist=pagelistname,
+                                memtiming=dict([ (k, configs[k]) for k in MEM_TIMING ]),
+                                perfinterval=configs['perf_interval'],
+                                profthreads=profthreads,
                                 clock_hperiod_userlogic=configs['hperiod_ulogic'],
                                 clock_hperiod_controlthread=configs['hperiod_cthread'],
                                 clock_hperiod_bus=configs['hperiod_bus'])
-        f = open(testpath+testname, 'w')
-        f.write(test_code)
-        f.write( open(TEMPLATE_DIR+'axi_master_fifo.v', 'r').read() )
-        f.close()
+        pycoram.utils.cache.updateFile(testpath+testname,
+                                       test_code + readTemplateFile('axi_master_fifo.v'))
 
         # memory image for test
         if memimg is not None:
-            shutil.copyfile(os.path.expanduser(memimg), testpath+memname)
+            self.writeMemoryImage(configs, os.path.expanduser(memimg),
+                                  testpath+memname, testpath+pagelistname)
 
         # makefile file
         makefile_template_file = 'Makefile.txt'
@@ -629,15 +880,13 @@ class SystemBuilder(object):
                                     ext_addrwidth=configs['ext_addrwidth'], ext_burstlength=ext_burstlength,
                                     single_clock=configs['single_clock'], lite=configs['io_lite'],
                                     testname=testname)
-        f = open(makefilepath+makefilename, 'w')
-        f.write(makefile_code)
-        f.close()
+        pycoram.utils.cache.updateFile(makefilepath+makefilename, makefile_code)
 
     #---------------------------------------------------------------------------
     def build_package_avalon(self, configs, synthesized_code, common_code, 
                              threads,
                              top_parameters, top_ioports, userlogic_topmodule, 
-                             memimg, usertest):
+                             memimg, usertest, profthreads=None):
         # default values
         ext_burstlength = 256
 
@@ -688,7 +937,8 @@ class SystemBuilder(object):
         hdlname = 'pycoram_' + userlogic_topmodule + '.v'
         common_hdlname = 'pycoram_common.v'
         testname = 'test_pycoram_' + userlogic_topmodule + '.v'
-        memname = 'mem.img'
+        memname = 'mem.img' if configs['sim_memory'] != 'sparse' else 'mem.pages'
+        pagelistname = 'mem.pagelist'
         makefilename = 'Makefile'
         copied_memimg = memname if memimg is not None else None
         binfile = (True if memimg is not None and memimg.endswith('.bin') else False)
@@ -716,19 +966,13 @@ class SystemBuilder(object):
                                single_clock=configs['single_clock'], lite=configs['io_lite'],
                                hdlname=hdlname, common_hdlname=common_hdlname,
                                tcl_ports=tcl_ports, tcl_parameters=tcl_parameters)
-        f = open(tclpath+tclname, 'w')
-        f.write(tcl_code)
-        f.close()
+        pycoram.utils.cache.updateFile(tclpath+tclname, tcl_code)
 
         # hdl file
-        f = open(verilogpath+hdlname, 'w')
-        f.write(synthesized_code)
-        f.close()
+        pycoram.utils.cache.updateFile(verilogpath+hdlname, synthesized_code)
 
         # common hdl file
-        f = open(verilogpath+common_hdlname, 'w')
-        f.write(common_code)
-        f.close()
+        pycoram.utils.cache.updateFile(verilogpath+common_hdlname, common_code)
 
         # user test code
         usertestcode = None 
@@ -746,17 +990,21 @@ class SystemBuilder(object):
                                 memimg=copied_memimg, binfile=binfile, 
                                 usertestcode=usertestcode,
                                 simaddrwidth=configs['sim_addrwidth'], 
+                                simmemory=configs['sim_memory'],
+                                simpages=configs['sim_pages'],
+                                memimg_pagelist=pagelistname,
+                                memtiming=dict([ (k, configs[k]) for k in MEM_TIMING ]),
+                                perfinterval=configs['perf_interval'],
+                                profthreads=profthreads,
                                 clock_hperiod_userlogic=configs['hperiod_ulogic'],
                                 clock_hperiod_controlthread=configs['hperiod_cthread'],
                                 clock_hperiod_bus=configs['hperiod_bus'])
-        f = open(testpath+testname, 'w')
-        f.write(test_code)
-        f.write( open(TEMPLATE_DIR+'avalon_master_fifo.v', 'r').read() )
-        f.close()
+        pycoram.utils.cache.updateFile(testpath+testname,
+                                       test_code + readTemplateFile('avalon_master_fifo.v'))
 
         # memory image for test
         if memimg is not None:
-            shutil.copy(memimg, testpath+memname)
+            self.writeMemoryImage(configs, memimg, testpath+memname, testpath+pagelistname)
 
         # makefile file
         makefile_template_file = 'Makefile.txt'
@@ -766,6 +1014,4 @@ class SystemBuilder(object):
                                     ext_addrwidth=configs['ext_addrwidth'], ext_burstlength=ext_burstlength,
                                     single_clock=configs['single_clock'], lite=configs['io_lite'],
                                     testname=testname)
-        f = open(makefilepath+makefilename, 'w')
-        f.write(makefile_code)
-        f.close()
+        pycoram.utils.cache.updateFile(makefilepath+makefilename, makefile_code)
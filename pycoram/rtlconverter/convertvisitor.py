@@ -37,6 +37,18 @@ class InstanceConvertVisitor(SignalVisitor):
 
         self.additionalport = [] # temporal variable
 
+        # only the modules including CoRAM objects are visited and converted
+        self.instance_modules = {}
+        self.coram_modules = set([])
+        self.setCoramModules()
+
+        # memoized parameter evaluation
+        self.param_names = {} # module name -> parameter names
+        self.coram_parameters = {} # id(instance) -> (instance, resolved parameters)
+        self.scope_consts = {} # (scope, expression) -> evaluated value
+        self.optimized_consts = {} # dataflow tree -> evaluated value
+        self.const_names = {} # (scope, name) -> scoped name of the definition
+
     #----------------------------------------------------------------------------
     def get_new_moduleinfotable(self):
         return self.new_moduleinfotable
@@ -65,11 +77,33 @@ class InstanceConvertVisitor(SignalVisitor):
             if src == dst:
                 self.new_moduleinfotable.dict[dst] = self.moduleinfotable.dict[src]
             else:
-                self.new_moduleinfotable.dict[dst] = copy.deepcopy(self.moduleinfotable.dict[src])
-                self.new_moduleinfotable.dict[dst].definition.name = dst
+                self.new_moduleinfotable.dict[dst] = copyModuleInfo(self.moduleinfotable.dict[src], dst)
         if (src != dst) and (dst not in self.moduleinfotable.dict):
-            self.moduleinfotable.dict[dst] = copy.deepcopy(self.moduleinfotable.dict[src])
-            self.moduleinfotable.dict[dst].definition.name = dst
+            self.moduleinfotable.dict[dst] = copyModuleInfo(self.moduleinfotable.dict[src], dst)
+
+    def copyModuleTree(self, name):
+        if name in self.new_moduleinfotable.dict: return
+        self.copyModuleInfo(name, name)
+        for module in self.instance_modules[name]:
+            self.copyModuleTree(module)
+
+    #----------------------------------------------------------------------------
+    def setCoramModules(self):
+        for name, info in self.moduleinfotable.dict.items():
+            self.instance_modules[name] = getInstanceModules(info.definition)
+        changed = True
+        while changed:
+            changed = False
+            for name, modules in self.instance_modules.items():
+                if name in self.coram_modules: continue
+                for module in modules:
+                    if re.match('(Coram.*)', module) or module in self.coram_modules:
+                        self.coram_modules.add(name)
+                        changed = True
+                        break
+
+    def hasCoramObject(self, name):
+        return (name in self.coram_modules)
 
     #----------------------------------------------------------------------------
     def changeModuleName(self, dst, name):
@@ -127,7 +161,7 @@ class InstanceConvertVisitor(SignalVisitor):
 
     #----------------------------------------------------------------------------
     def updateInstancePort(self, node, generate=False):
-        new_node = copy.deepcopy(node)
+        new_node = copyInstanceList(node)
         instance = new_node.instances[0]
         
         ioport = not (len(instance.portlist) == 0 or 
@@ -135,11 +169,10 @@ class InstanceConvertVisitor(SignalVisitor):
         new_portlist = list(instance.portlist)
         if ioport:
             for i, a in enumerate(self.additionalport):
-                new_portlist.append(PortArg(copy.deepcopy(a.name),
-                                            Identifier(copy.deepcopy(a.name))))
+                new_portlist.append(PortArg(a.name, Identifier(a.name)))
         else:
             for a in self.additionalport:
-                new_portlist.append(PortArg(None, Identifier(copy.deepcopy(a.name))))
+                new_portlist.append(PortArg(None, Identifier(a.name)))
         instance.portlist = tuple(new_portlist)
 
         if generate:
@@ -183,47 +216,26 @@ class InstanceConvertVisitor(SignalVisitor):
                       isinstance(node.portlist.ports[0], Port))
         if ioport:
             for a in self.additionalport:
-                new_portlist.append(Ioport(copy.deepcopy(a)))
+                new_portlist.append(Ioport(a))
         else:
             for a in self.additionalport:
                 new_portlist.append(Port(a.name, width=a.width, type=None))
         self.extendInstPorts(node, new_portlist)
         if not ioport:
-            new_items = copy.deepcopy(self.additionalport)
+            new_items = list(self.additionalport)
             new_items.extend(list(node.items))
             self.extendItems(node, new_items)
 
     #----------------------------------------------------------------------------
     def convertCoramInstance(self, node, mode, generate=False, opt=None):
-        threadname = None
-        threadindex = None # unused
-
-        ramid = None
-        ramsubid = None
-
-        addrmsb = None
-        datamsb = None
-
         current = self.frames.getCurrent()
-        param_names = self.moduleinfotable.getParamNames(node.module)
-
-        for param_i, param in enumerate(node.parameterlist):
-            param_name = param_names[param_i] if param.paramname is None else param.paramname 
-            if param_name == 'CORAM_THREAD_NAME':
-                threadname = copy.deepcopy(param.argname)
-            elif param_name == 'CORAM_THREAD_ID':
-                print("warning: CORAM_THREAD_INDEX is not used.")
-                threadindex = copy.deepcopy(param.argname)
-            elif param_name == 'CORAM_ID':
-                ramid = copy.deepcopy(param.argname)
-            elif param_name == 'CORAM_SUB_ID':
-                ramsubid = copy.deepcopy(param.argname)
-            elif param_name == 'CORAM_ADDR_LEN':
-                addrmsb = copy.deepcopy(param.argname)
-            elif param_name == 'CORAM_DATA_WIDTH':
-                datamsb = copy.deepcopy(param.argname)
-            else:
-                raise NameError("No such parameter '%s' in %s" % (param_name, mode))
+        params = self.getCoramParameters(node, mode)
+        threadname = params.get('CORAM_THREAD_NAME')
+        threadindex = params.get('CORAM_THREAD_ID')
+        ramid = params.get('CORAM_ID')
+        ramsubid = params.get('CORAM_SUB_ID')
+        addrmsb = params.get('CORAM_ADDR_LEN')
+        datamsb = params.get('CORAM_DATA_WIDTH')
 
         addrwidth = None
         if addrmsb is not None:
@@ -248,19 +260,19 @@ class InstanceConvertVisitor(SignalVisitor):
             #raise ValueError("CORAM_SUB_ID must be set in instance '%s'." % node.name)
             ramsubid = IntConst('0')
 
-        evalthreadname = self.optimize(self.getTree(threadname, current))
+        evalthreadname = self.evalConstant(threadname, current)
         if not isinstance(evalthreadname, dataflow.DFEvalValue) or not isinstance(evalthreadname.value, str):
             raise TypeError("CORAM_THREAD_NAME should be string in thread '%s' in instance '%s' " % (str(threadname), node.name))
         evalthreadname_value = evalthreadname.value
 
-        evalramid_value = self.optimize(self.getTree(ramid, current)).value
+        evalramid_value = self.evalConstant(ramid, current).value
         evalramsubid_value = None
         if mode == 'CoramMemory':
-            evalramsubid_value = self.optimize(self.getTree(ramsubid, current)).value
-        evaladdrwidth_msb_value = self.optimize(self.getTree(addrwidth.msb, current)).value
-        evaladdrwidth_lsb_value = self.optimize(self.getTree(addrwidth.lsb, current)).value
-        evaldatawidth_msb_value = self.optimize(self.getTree(datawidth.msb, current)).value
-        evaldatawidth_lsb_value = self.optimize(self.getTree(datawidth.lsb, current)).value
+            evalramsubid_value = self.evalConstant(ramsubid, current).value
+        evaladdrwidth_msb_value = self.evalConstant(addrwidth.msb, current).value
+        evaladdrwidth_lsb_value = self.evalConstant(addrwidth.lsb, current).value
+        evaldatawidth_msb_value = self.evalConstant(datawidth.msb, current).value
+        evaldatawidth_lsb_value = self.evalConstant(datawidth.lsb, current).value
 
         evaladdrwidth = Width(IntConst(str(evaladdrwidth_msb_value)), IntConst(str(evaladdrwidth_lsb_value)))
         evaladdrwidth_p1 = Width(IntConst(str(evaladdrwidth_msb_value+1)), IntConst(str(evaladdrwidth_lsb_value)))
@@ -320,7 +332,7 @@ class InstanceConvertVisitor(SignalVisitor):
             self.additionalport.append( Input(name=nameprefix+'_deq') )
             self.additionalport.append( Output(name=nameprefix+'_empty') )
 
-        new_node = copy.deepcopy(node)
+        new_node = copyInstanceList(node)
         instance = new_node.instances[0]
         
         noportname = (len(instance.portlist) == 0 or
@@ -447,6 +459,59 @@ class InstanceConvertVisitor(SignalVisitor):
             ret = new_node
             self.appendInstance(node, ret)
 
+    #----------------------------------------------------------------------------
+    def getParamNames(self, module):
+        if module not in self.param_names:
+            self.param_names[module] = self.moduleinfotable.getParamNames(module)
+        return self.param_names[module]
+
+    def getCoramParameters(self, node, mode):
+        key = id(node)
+        if key in self.coram_parameters:
+            return self.coram_parameters[key][1]
+
+        ret = {}
+        param_names = self.getParamNames(node.module)
+        for param_i, param in enumerate(node.parameterlist):
+            param_name = param_names[param_i] if param.paramname is None else param.paramname 
+            if param_name == 'CORAM_THREAD_ID':
+                print("warning: CORAM_THREAD_INDEX is not used.")
+            elif param_name not in ('CORAM_THREAD_NAME', 'CORAM_ID', 'CORAM_SUB_ID',
+                                    'CORAM_ADDR_LEN', 'CORAM_DATA_WIDTH'):
+                raise NameError("No such parameter '%s' in %s" % (param_name, mode))
+            ret[param_name] = param.argname
+
+        # the node is kept to keep its id unique
+        self.coram_parameters[key] = (node, ret)
+        return ret
+
+    def evalConstant(self, node, scope):
+        key = (scope, node)
+        if key in self.scope_consts:
+            return self.scope_consts[key]
+        tree = self.getTree(node, scope)
+        if tree not in self.optimized_consts:
+            self.optimized_consts[tree] = self.optimize(tree)
+        ret = self.optimized_consts[tree]
+        self.scope_consts[key] = ret
+        return ret
+
+    def searchConstantValue(self, key, name):
+        # definitions are searched once per scope, but values are not cached
+        # because a genvar is updated in each iteration of generate-for
+        return self.getConstant(self.searchConstantName(key, name))
+
+    def searchConstantName(self, key, name):
+        if (key, name) in self.const_names:
+            return self.const_names[(key, name)]
+        frame = self.frames.dict[key]
+        if frame.hasConstant(name) or frame.hasSignal(name) or frame.isModule():
+            ret = self.searchConstantDefinition(key, name)[0]
+        else:
+            ret = self.searchConstantName(frame.getPrevious(), name)
+        self.const_names[(key, name)] = ret
+        return ret
+
     #----------------------------------------------------------------------------
     def addCoramObject(self, mode, threadname, idx, subid, addrwidth, datawidth):
         self.coram_object[mode].append( (threadname, idx, subid, addrwidth, datawidth) )
@@ -500,6 +565,11 @@ class InstanceConvertVisitor(SignalVisitor):
 
     #----------------------------------------------------------------------------
     def _visit_InstanceList_normal(self, node):
+        if not self.hasCoramObject(node.module):
+            # emitted as it is
+            self.copyModuleTree(node.module)
+            return
+
         if self.isUsed(node.module):
             tmp = self.additionalport
             self.additionalport = []
@@ -541,6 +611,52 @@ class InstanceConvertVisitor(SignalVisitor):
                 tmp.extend(self.additionalport)
             self.additionalport = tmp
         
+#-------------------------------------------------------------------------------
+def getInstanceModules(node):
+    ret = []
+    nodes = [ node ]
+    while nodes:
+        n = nodes.pop()
+        if isinstance(n, InstanceList):
+            if n.module not in ret: ret.append(n.module)
+            continue
+        nodes.extend(n.children())
+    return ret
+
+#-------------------------------------------------------------------------------
+# Copy-on-write of module definitions
+#-------------------------------------------------------------------------------
+# nodes rewritten or used as replacement keys during the conversion
+REWRITTEN_NODES = (ModuleDef, Portlist, InstanceList, Instance)
+
+def copyTree(node):
+    # only the rewritten nodes and their ancestors are copied, the others are shared
+    copied = {}
+    for c in node.children():
+        new_c = copyTree(c)
+        if new_c is not c: copied[id(c)] = new_c
+    if not copied and not isinstance(node, REWRITTEN_NODES):
+        return node
+    new_node = copy.copy(node)
+    for name, child in children_items(node):
+        if isinstance(child, (list, tuple)):
+            setattr(new_node, name, type(child)([ copied.get(id(c), c) for c in child ]))
+        elif id(child) in copied:
+            setattr(new_node, name, copied[id(child)])
+    return new_node
+
+def copyModuleInfo(info, name):
+    # signals, constants and ports are not modified after ModuleVisitor
+    ret = copy.copy(info)
+    ret.definition = copyTree(info.definition)
+    ret.definition.name = name
+    return ret
+
+def copyInstanceList(node):
+    new_node = copy.copy(node)
+    new_node.instances = tuple([ copy.copy(instance) for instance in node.instances ])
+    return new_node
+
 #-------------------------------------------------------------------------------
 def ischild(node, attr):
     if not isinstance(node, Node): return False
@@ -554,10 +670,13 @@ def ischild(node, attr):
     return True
 
 def children_items(node):
-    children = [ attr for attr in dir(node) if ischild(node, attr) ]
+    # the children are instance attributes: only those are tested, in the
+    # order of dir(), instead of every attribute and method of the class
+    if not isinstance(node, Node): return []
     ret = []
-    for c in children:
-        ret.append( (c, getattr(node, c)) )
+    for c in sorted(vars(node).keys()):
+        if ischild(node, c):
+            ret.append( (c, getattr(node, c)) )
     return ret
 
 class InstanceReplaceVisitor(NodeVisitor):
@@ -630,6 +749,9 @@ class InstanceReplaceVisitor(NodeVisitor):
         return self.getReplacedNode(node)
 
     def visit_ModuleDef(self, node):
+        if not self.hasReplacedInstPorts(node) and not self.hasReplacedItems(node):
+            # no CoRAM object in this module
+            return node
         if self.hasReplacedInstPorts(node):
             node.portlist.ports = tuple(self.getReplacedInstPorts(node))
         if self.hasReplacedItems(node):
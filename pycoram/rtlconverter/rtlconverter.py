@@ -10,29 +10,51 @@ from __future__ import absolute_import
 from __future__ import print_function
 import sys
 import os
+import re
+import time
 import collections
 
 from pycoram.rtlconverter.convertvisitor import InstanceConvertVisitor
 from pycoram.rtlconverter.convertvisitor import InstanceReplaceVisitor
+import pycoram.utils.cache as cache
+import pycoram.utils.profiler as profiler
 
 import pyverilog.vparser.ast as vast
+import pyverilog.vparser.parser
+import pyverilog.dataflow.modulevisitor
 import pyverilog.utils.signaltype as signaltype
-from pyverilog.vparser.parser import VerilogCodeParser
+from pyverilog.vparser.parser import VerilogParser
+from pyverilog.vparser.preprocessor import VerilogPreprocessor
 from pyverilog.dataflow.modulevisitor import ModuleVisitor
 from pyverilog.utils.scope import ScopeLabel, ScopeChain
 
+#-------------------------------------------------------------------------------
+# the parser tables are built only once in a process
+verilog_parser = None
+def getVerilogParser():
+    global verilog_parser
+    if verilog_parser is None:
+        verilog_parser = VerilogParser()
+    verilog_parser.lexer.reset_lineno()
+    return verilog_parser
+
+#-------------------------------------------------------------------------------
 class RtlConverter(object):
     def __init__(self, filelist, topmodule='userlogic', include=None,
-                 define=None, single_clock=False):
+                 define=None, single_clock=False, cache_dir=None, cache_store=None):
         self.filelist = filelist
         self.topmodule = topmodule
         self.include = include
         self.define = define
         self.single_clock = single_clock
+        self.cache = cache_store
+        if self.cache is None and cache_dir is not None:
+            self.cache = cache.FileCache(cache_dir, 'rtlconverter')
 
         self.top_parameters = collections.OrderedDict()
         self.top_ioports = collections.OrderedDict()
         self.coram_object = collections.OrderedDict()
+        self.times = collections.OrderedDict()
 
     def getTopParameters(self):
         return self.top_parameters
@@ -54,22 +76,20 @@ class RtlConverter(object):
                       (mode, idx, ( '' if subid is None else ''.join( ('[', str(subid), ']') ) ),
                        threadname, str(addrwidth), str(datawidth)))
         
-    def generate(self):
-        preprocess_define = []
-        if self.single_clock:
-            preprocess_define.append('CORAM_SINGLE_CLOCK')
-        if self.define:
-            preprocess_define.extend(self.define)
+    def getTimes(self):
+        return self.times
 
-        code_parser = VerilogCodeParser(self.filelist,
-                                        preprocess_include=self.include,
-                                        preprocess_define=preprocess_define)
-        ast = code_parser.parse()
-
-        module_visitor = ModuleVisitor()
-        module_visitor.visit(ast)
-        modulenames = module_visitor.get_modulenames()
-        moduleinfotable = module_visitor.get_moduleinfotable()
+    def generate(self):
+        start = time.time()
+        profiler.begin('parse')
+        if self.cache is not None:
+            ast, moduleinfotable = self.parseCached()
+        else:
+            ast, moduleinfotable = self.parse(self.filelist)
+        profiler.end('parse')
+        self.times['parse'] = time.time() - start
+        start = time.time()
+        profiler.begin('convert')
 
         instanceconvert_visitor = InstanceConvertVisitor(moduleinfotable, self.topmodule)
         instanceconvert_visitor.start_visit()
@@ -121,5 +141,109 @@ class RtlConverter(object):
             self.top_parameters[signame] = param
 
         self.coram_object = instanceconvert_visitor.getCoramObject()
+        profiler.end('convert')
+        self.times['convert'] = time.time() - start
 
         return ret
+
+    #-------------------------------------------------------------------------
+    def getPreprocessDefine(self):
+        preprocess_define = []
+        if self.single_clock:
+            preprocess_define.append('CORAM_SINGLE_CLOCK')
+        if self.define:
+            preprocess_define.extend(self.define)
+        return preprocess_define
+
+    def parse(self, filelist):
+        preprocess_output = 'preprocess.output'
+        preprocessor = VerilogPreprocessor(filelist, preprocess_output,
+                                           self.include, self.getPreprocessDefine())
+        preprocessor.preprocess()
+        f = open(preprocess_output)
+        text = f.read()
+        f.close()
+        os.remove(preprocess_output)
+        ast = getVerilogParser().parse(text)
+
+        module_visitor = ModuleVisitor()
+        module_visitor.visit(ast)
+        moduleinfotable = module_visitor.get_moduleinfotable()
+        return ast, moduleinfotable
+
+    #-------------------------------------------------------------------------
+    def parseCached(self):
+        parser_digest = cache.digest(
+            cache.packageDigest(os.path.dirname(os.path.abspath(pyverilog.vparser.parser.__file__))),
+            cache.packageDigest(os.path.dirname(os.path.abspath(pyverilog.dataflow.modulevisitor.__file__))))
+        preprocess_define = self.getPreprocessDefine()
+        filekeys = [ cache.digest(parser_digest, cache.fileDigest(f),
+                                  self.getIncludeDigests(f), preprocess_define)
+                     for f in self.filelist ]
+        key = cache.digest(filekeys)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+
+        if self.hasMacroDefinition():
+            # macros defined in a file are visible from the following files
+            ast, moduleinfotable = self.parse(self.filelist)
+        else:
+            definitions = []
+            for f, filekey in zip(self.filelist, filekeys):
+                description = self.cache.get(filekey)
+                if description is None:
+                    description = self.parse([f])[0].description
+                    self.cache.put(filekey, description)
+                definitions.extend(description.definitions)
+            ast = vast.Source('', vast.Description(tuple(definitions)))
+            module_visitor = ModuleVisitor()
+            module_visitor.visit(ast)
+            moduleinfotable = module_visitor.get_moduleinfotable()
+
+        self.cache.put(key, (ast, moduleinfotable))
+        return ast, moduleinfotable
+
+    def getIncludeDigests(self, filename, visited=None):
+        # contents of all the candidates of the included files
+        if visited is None: visited = set()
+        visited.add(os.path.abspath(filename))
+        ret = []
+        for name, paths in self.findIncludes(filename):
+            for path in paths:
+                ret.append( (name, cache.fileDigest(path)) )
+                if os.path.abspath(path) not in visited:
+                    ret.append( self.getIncludeDigests(path, visited) )
+            ret.append(name)
+        return ret
+
+    def findIncludes(self, filename):
+        # (name, candidate paths) of each `include in the file
+        dirs = [ os.path.dirname(os.path.abspath(filename)), os.getcwd() ]
+        if self.include: dirs.extend(self.include)
+        ret = []
+        for name in re.findall(r'`include\s+"([^"]+)"', self.readFile(filename)):
+            paths = [ os.path.join(d, name) for d in dirs
+                      if os.path.isfile(os.path.join(d, name)) ]
+            ret.append( (name, paths) )
+        return ret
+
+    def hasMacroDefinition(self):
+        # in the files or in any header that they include
+        visited = set()
+        files = list(self.filelist)
+        while files:
+            f = files.pop()
+            if os.path.abspath(f) in visited: continue
+            visited.add(os.path.abspath(f))
+            if re.search(r'`(define|undef)\b', self.readFile(f)): return True
+            for name, paths in self.findIncludes(f):
+                files.extend(paths)
+        return False
+
+    def readFile(self, filename):
+        f = open(filename, 'rb')
+        text = f.read().decode('utf-8', 'replace')
+        f.close()
+        return text
@@ -15,6 +15,7 @@ from optparse import OptionParser
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 import pycoram.utils.version
+import pycoram.utils.cache
 from pycoram.rtlconverter.rtlconverter import RtlConverter
 from pyverilog.ast_code_generator.codegen import ASTCodeGenerator
 
@@ -43,6 +44,11 @@ def main():
                          default=[],help="Macro Definition")
     optparser.add_option("--singleclock",action="store_true",dest="single_clock",
                          default=False,help="Use single clock mode")
+    optparser.add_option("--cache",action="store_true",dest="cache",
+                         default=False,help="Reuse parsed RTL from the cache directory")
+    optparser.add_option("--cachedir",dest="cachedir",
+                         default=None,help="Cache directory (implies --cache), Default=%s" %
+                         pycoram.utils.cache.getDefaultCacheDir())
     (options, args) = optparser.parse_args()
 
     filelist = args
@@ -55,10 +61,17 @@ def main():
     if len(filelist) == 0:
         showVersion()
 
+    cache_dir = None
+    if options.cachedir is not None:
+        cache_dir = options.cachedir
+    elif options.cache:
+        cache_dir = pycoram.utils.cache.getDefaultCacheDir()
+
     converter = RtlConverter(filelist, options.topmodule,
                              include=options.include, 
                              define=options.define,
-                             single_clock=options.single_clock)
+                             single_clock=options.single_clock,
+                             cache_dir=cache_dir)
     ast = converter.generate()
     converter.dumpCoramObject()
     
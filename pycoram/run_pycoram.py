@@ -11,6 +11,8 @@ from __future__ import print_function
 import os
 import sys
 import glob
+import time
+import traceback
 from optparse import OptionParser
 if sys.version_info[0] < 3:
     import ConfigParser as configparser
@@ -19,8 +21,95 @@ else:
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pycoram.pycoram import SystemBuilder
+from pycoram.pycoram import SystemBuilder, MEM_TIMING
 import pycoram.utils.version
+import pycoram.utils.cache
+import pycoram.utils.profiler
+
+#---------------------------------------------------------------------------
+def readConfigs(configfile):
+    # default values
+    configs = {
+        'signal_width' : 32,
+        'ext_addrwidth' : 32,
+        'ext_datawidth' : 512,
+        'single_clock' : True,
+        'io_lite' : True,
+        'if_type' : 'axi',
+        'output' : 'out.v',
+        'fsm_compaction' : False,
+        'fsm_scheduling' : False,
+        'fsm_encoding' : 'binary',
+        'subroutine_threshold' : 0,
+        'bitwidth_inference' : False,
+        'sim_addrwidth' : 27,
+        'sim_memory' : 'flat',
+        'sim_pages' : 4096,
+        'mem_read_latency' : 8,
+        'mem_write_latency' : 4,
+        'mem_bytes_per_cycle' : 0,
+        'mem_outstanding' : 0,
+        'mem_row_size' : 2048,
+        'mem_banks' : 8,
+        'mem_row_penalty' : 0,
+        'mem_jitter' : 0,
+        'mem_seed' : 1,
+        'perf_interval' : 0,
+        'sim_profile' : False,
+        'hperiod_ulogic' : 5,
+        'hperiod_cthread' : 5,
+        'hperiod_bus' : 5,
+    }
+
+    # SafeConfigParser is ConfigParser in Python 3, and removed in 3.12
+    confp = (configparser.SafeConfigParser() if sys.version_info[0] < 3 else
+             configparser.ConfigParser())
+    if configfile is not None:
+        confp.read(configfile)
+
+    if confp.has_section('synthesis'):
+        for k, v in confp.items('synthesis'):
+            if (k == 'single_clock' or k == 'io_lite' or
+                k == 'fsm_compaction' or k == 'fsm_scheduling' or k == 'bitwidth_inference'):
+                configs[k] = False if 'n' in v or 'N' in v else True
+            elif (k == 'signal_width' or k == 'ext_addrwidth' or k == 'ext_datawidth' or
+                  k == 'subroutine_threshold'):
+                configs[k] = int(v)
+            elif k not in configs:
+                raise ValueError("No such configuration item: %s" % k)
+            else:
+                configs[k] = v
+
+    if confp.has_section('simulation'):
+        for k, v in confp.items('simulation'):
+            if (k == 'sim_addrwidth' or k == 'hperiod_ulogic' or k == 'hperiod_cthread' or k == 'hperiod_bus' or
+                k == 'sim_pages' or k in MEM_TIMING or k == 'perf_interval'):
+                configs[k] = int(v)
+            elif k == 'sim_profile':
+                configs[k] = False if 'n' in v or 'N' in v else True
+            elif k not in configs:
+                raise ValueError("No such configuration item: %s" % k)
+            else:
+                configs[k] = v
+
+    # per-thread compile options in [cthread:<thread name>]
+    thread_options = {}
+    for section in confp.sections():
+        if not section.startswith('cthread:'): continue
+        thread_name = section[len('cthread:'):].strip()
+        opts = {}
+        for k, v in confp.items(section):
+            if k == 'fsm_compaction' or k == 'fsm_scheduling' or k == 'bitwidth_inference':
+                opts[k] = False if 'n' in v or 'N' in v else True
+            elif k == 'fsm_encoding':
+                opts[k] = v
+            elif k == 'subroutine_threshold':
+                opts[k] = int(v)
+            else:
+                raise ValueError("No such configuration item: %s" % k)
+        thread_options[thread_name] = opts
+
+    return (configs, thread_options)
 
 #---------------------------------------------------------------------------
 def main():
@@ -47,6 +136,21 @@ def main():
                          default=None,help="Memory image file, Default=None")
     optparser.add_option("--usertest",dest="usertest",
                          default=None,help="User-defined test bench file, Default=None")
+    optparser.add_option("-j","--jobs",dest="jobs",type="int",
+                         default=1,help="Number of processes to compile control-threads (0: all cores), Default=1")
+    optparser.add_option("--cache",action="store_true",dest="cache",
+                         default=False,help="Reuse parsed RTL and compiled control-threads from the cache directory")
+    optparser.add_option("--cachedir",dest="cachedir",
+                         default=None,help="Cache directory (implies --cache), Default=%s" %
+                         pycoram.utils.cache.getDefaultCacheDir())
+    optparser.add_option("--watch",action="store_true",dest="watch",
+                         default=False,help="Keep running and rebuild when an input file changes")
+    optparser.add_option("--interval",dest="interval",type="float",
+                         default=1.0,help="Polling interval of --watch in seconds, Default=1.0")
+    optparser.add_option("--profile",action="store_true",dest="profile",
+                         default=False,help="Print the time spent in each compile stage")
+    optparser.add_option("--profiledir",dest="profiledir",
+                         default=None,help="Directory of cProfile data per stage (implies --profile), Default=None")
 
     (options, args) = optparser.parse_args()
 
@@ -82,54 +186,77 @@ def main():
     print("  Control-thread: %s" % ', '.join(controlthread_filelist) )
     print("----------------------------------------")
 
-    # default values
-    configs = {
-        'signal_width' : 32,
-        'ext_addrwidth' : 32,
-        'ext_datawidth' : 512,
-        'single_clock' : True,
-        'io_lite' : True,
-        'if_type' : 'axi',
-        'output' : 'out.v',
-        'sim_addrwidth' : 27,
-        'hperiod_ulogic' : 5,
-        'hperiod_cthread' : 5,
-        'hperiod_bus' : 5,
-    }
+    cache_dir = None
+    if options.cachedir is not None:
+        cache_dir = options.cachedir
+    elif options.cache:
+        cache_dir = pycoram.utils.cache.getDefaultCacheDir()
 
-    confp = configparser.SafeConfigParser()
-    if configfile is not None:
-        confp.read(configfile)
+    systembuilder = SystemBuilder(cache_dir=cache_dir, memory_cache=options.watch)
 
-    if confp.has_section('synthesis'):
-        for k, v in confp.items('synthesis'):
-            if k == 'single_clock' or k == 'io_lite':
-                configs[k] = False if 'n' in v or 'N' in v else True
-            elif k == 'signal_width' or k == 'ext_addrwidth' or k == 'ext_datawidth':
-                configs[k] = int(v)
-            elif k not in configs:
-                raise ValueError("No such configuration item: %s" % k)
-            else:
-                configs[k] = v
+    def build():
+        if options.profile or options.profiledir is not None:
+            pycoram.utils.profiler.enable(options.profiledir)
+        try:
+            (configs, thread_options) = readConfigs(configfile)
+            systembuilder.build(configs,
+                                options.topmodule,
+                                userlogic_filelist,
+                                controlthread_filelist,
+                                userlogic_include=options.include,
+                                userlogic_define=options.define,
+                                usertest=options.usertest,
+                                memimg=options.memimg,
+                                jobs=options.jobs,
+                                thread_options=thread_options)
+        finally:
+            prof = pycoram.utils.profiler.disable()
+            if prof is not None:
+                prof.dump()
 
-    if confp.has_section('simulation'):
-        for k, v in confp.items('simulation'):
-            if k == 'sim_addrwidth' or k == 'hperiod_ulogic' or k == 'hperiod_cthread' or k == 'hperiod_bus':
-                configs[k] = int(v)
-            elif k not in configs:
-                raise ValueError("No such configuration item: %s" % k)
-            else:
-                configs[k] = v
+    if not options.watch:
+        build()
+        return
+
+    watchlist = list(filelist)
+    if options.usertest is not None: watchlist.append(options.usertest)
+    if options.memimg is not None: watchlist.append(options.memimg)
+
+    def getStamps():
+        # Verilog headers in the include paths can change without any input change
+        files = list(watchlist)
+        for d in options.include:
+            files.extend( glob.glob(os.path.join(os.path.expanduser(d), '*')) )
+        stamps = {}
+        for f in files:
+            try:
+                st = os.stat(os.path.expanduser(f))
+                stamps[f] = (st.st_mtime, st.st_size)
+            except OSError:
+                stamps[f] = None
+        return stamps
 
-    systembuilder = SystemBuilder()
-    systembuilder.build(configs,
-                        options.topmodule,
-                        userlogic_filelist,
-                        controlthread_filelist,
-                        userlogic_include=options.include,
-                        userlogic_define=options.define,
-                        usertest=options.usertest,
-                        memimg=options.memimg)
+    stamps = getStamps()
+    while True:
+        try:
+            build()
+        except Exception:
+            traceback.print_exc()
+        print("----------------------------------------")
+        print("Waiting for changes (Ctrl-C to quit)")
+        try:
+            while True:
+                time.sleep(options.interval)
+                new_stamps = getStamps()
+                if new_stamps != stamps: break
+        except KeyboardInterrupt:
+            print("")
+            return
+        changed = sorted([ f for f in set(stamps.keys()) | set(new_stamps.keys())
+                           if stamps.get(f) != new_stamps.get(f) ])
+        stamps = new_stamps
+        print("----------------------------------------")
+        print("Changed: %s" % ', '.join(changed))
     
 if __name__ == '__main__':
     main()
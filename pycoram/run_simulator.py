@@ -0,0 +1,102 @@
+#-------------------------------------------------------------------------------
+# run_simulator.py
+#
+# Functional simulation of the control threads without an HDL simulator
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import glob
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycoram.controlthread.simulator import Simulator
+from pycoram.run_pycoram import readConfigs
+import pycoram.utils.version
+
+#-------------------------------------------------------------------------------
+def loadUserLogic(sim, filename):
+    # the model file defines userlogic(sim) to set the handlers and the host inputs
+    namespace = { '__name__' : '__userlogic__', '__file__' : filename }
+    exec(compile(open(filename, 'r').read(), filename, 'exec'), namespace)
+    if 'userlogic' not in namespace:
+        raise ValueError("No userlogic(sim) function in %s" % filename)
+    namespace['userlogic'](sim)
+
+#-------------------------------------------------------------------------------
+def main():
+    INFO = "PyCoRAM simulator: Functional simulation of the control threads"
+    VERSION = pycoram.utils.version.VERSION
+    USAGE = "Usage: python run_simulator.py [config] [--memimg=filename] [--userlogic=filename] [--timing] [--trace=filename] [--memout=filename] [file.py]+"
+
+    def showVersion():
+        print(INFO)
+        print(VERSION)
+        print(USAGE)
+        sys.exit()
+
+    optparser = OptionParser()
+    optparser.add_option("-v","--version",action="store_true",dest="showversion",
+                         default=False,help="Show the version")
+    optparser.add_option("--memimg",dest="memimg",
+                         default=None,help="Memory image file, Default=None")
+    optparser.add_option("--userlogic",dest="userlogic",
+                         default=None,help="Python model of the user-logic and the host, Default=None")
+    optparser.add_option("--timing",action="store_true",dest="timing",
+                         default=False,help="Approximate DMA timing with the memory timing model of the configuration")
+    optparser.add_option("--trace",dest="trace",
+                         default=None,help="DMA trace CSV file, Default=None")
+    optparser.add_option("--memout",dest="memout",
+                         default=None,help="Memory image file written at the end, Default=None")
+    optparser.add_option("--maxcycles",dest="maxcycles",type="int",
+                         default=None,help="Time out of the simulation in cycles, Default=None")
+
+    (options, args) = optparser.parse_args()
+
+    filelist = []
+    for arg in args:
+        filelist.extend( glob.glob(os.path.expanduser(arg)) )
+
+    if options.showversion:
+        showVersion()
+
+    for f in filelist:
+        if not os.path.exists(f): raise IOError("file not found: " + f)
+
+    if len(filelist) == 0:
+        showVersion()
+
+    configfile = None
+    controlthread_filelist = []
+    for f in filelist:
+        if f.endswith('.py'):
+            controlthread_filelist.append(f)
+        if f.endswith('.config'):
+            if configfile is not None: raise IOError("Multiple configuration files")
+            configfile = f
+
+    (configs, thread_options) = readConfigs(configfile)
+
+    sim = Simulator(configs, timing=options.timing, max_cycles=options.maxcycles)
+    for f in controlthread_filelist:
+        sim.addThreadFile(f)
+    if options.memimg is not None:
+        sim.loadMemoryImage(os.path.expanduser(options.memimg))
+    if options.userlogic is not None:
+        loadUserLogic(sim, os.path.expanduser(options.userlogic))
+
+    sim.run()
+    sim.dump()
+
+    if options.trace is not None:
+        sim.writeTrace(options.trace)
+    if options.memout is not None:
+        sim.dram.save(options.memout)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+#-------------------------------------------------------------------------------
+# run_sweep.py
+#
+# Design-space exploration: builds (and simulates) the variants of a parameter grid
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import re
+import ast
+import csv
+import glob
+import time
+import itertools
+import traceback
+import subprocess
+import multiprocessing
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycoram.pycoram import SystemBuilder
+from pycoram.rtlconverter.rtlconverter import RtlConverter
+from pycoram.run_pycoram import readConfigs
+import pycoram.utils.version
+import pycoram.utils.cache
+
+#-------------------------------------------------------------------------------
+def parseParameter(param):
+    if '=' not in param:
+        raise ValueError("Parameter should be 'name=value[,value]*': %s" % param)
+    name, values = param.split('=', 1)
+    name = name.strip()
+    values = [ v.strip() for v in values.split(',') if v.strip() ]
+    if not name or not values:
+        raise ValueError("Parameter should be 'name=value[,value]*': %s" % param)
+    return (name, values)
+
+def getVariants(params):
+    names = [ name for name, values in params ]
+    ret = []
+    for values in itertools.product(*[ values for name, values in params ]):
+        ret.append( tuple(zip(names, values)) )
+    return ret
+
+#-------------------------------------------------------------------------------
+def getConfigValue(configs, name, value):
+    if isinstance(configs[name], bool):
+        return False if 'n' in value or 'N' in value else True
+    if isinstance(configs[name], int):
+        return int(value)
+    return value
+
+def getConstantLines(source, name):
+    # top-level assignments of the name, as (first line, last line)
+    ret = []
+    for node in ast.parse(source).body:
+        if not isinstance(node, ast.Assign): continue
+        if len(node.targets) != 1: continue
+        if not isinstance(node.targets[0], ast.Name): continue
+        if node.targets[0].id != name: continue
+        ret.append( (node.lineno, getattr(node, 'end_lineno', node.lineno)) )
+    return ret
+
+def replaceConstants(source, constants):
+    lines = source.split('\n')
+    for name, value in constants:
+        for begin, end in getConstantLines('\n'.join(lines), name):
+            lines[begin-1] = ''.join( (name, ' = ', value) )
+            for i in range(begin, end):
+                lines[i] = ''
+    return '\n'.join(lines)
+
+#-------------------------------------------------------------------------------
+def buildVariant(args):
+    (index, variant, outdir, configfile, topmodule, userlogic_filelist,
+     controlthread_sources, include, define, usertest, memimg,
+     cache_dir, simulate, simulator) = args
+
+    dirname = os.path.join(outdir, 'variant_%04d' % index)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    result = { 'variant' : index, 'dir' : dirname, 'status' : 'ok' }
+    result.update(dict(variant))
+
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    log = open(os.path.join(dirname, 'build.log'), 'w')
+    try:
+        os.chdir(dirname)
+        sys.stdout = log
+
+        (configs, thread_options) = readConfigs(configfile)
+        constants = []
+        for name, value in variant:
+            if name in configs:
+                configs[name] = getConfigValue(configs, name, value)
+            else:
+                constants.append( (name, value) )
+
+        # control-thread sources with the swept constants, under the same file names
+        controlthread_filelist = []
+        for filename, source in controlthread_sources:
+            path = os.path.basename(filename)
+            pycoram.utils.cache.updateFile(path, replaceConstants(source, constants))
+            controlthread_filelist.append(path)
+
+        start = time.time()
+        systembuilder = SystemBuilder(cache_dir=cache_dir)
+        systembuilder.build(configs, topmodule,
+                            userlogic_filelist, controlthread_filelist,
+                            userlogic_include=include,
+                            userlogic_define=define,
+                            usertest=usertest,
+                            memimg=memimg,
+                            thread_options=thread_options)
+        result['build_time'] = '%.3f' % (time.time() - start)
+
+        states = systembuilder.getStateCounts()
+        result['states'] = sum(states.values())
+        for thread_name, count in states.items():
+            result['states:' + thread_name] = count
+        report = systembuilder.getReport()
+        for k in ('registers', 'register_bits', 'bram'):
+            result[k] = report[k]
+
+        if simulate:
+            testdir = 'pycoram_' + topmodule + '_v1_00_a/test'
+            result.update(runSimulation(testdir, simulator, configs['hperiod_cthread']))
+
+    except Exception:
+        traceback.print_exc(file=log)
+        result['status'] = 'error'
+
+    finally:
+        sys.stdout = stdout
+        log.close()
+        os.chdir(cwd)
+
+    return result
+
+def runSimulation(testdir, simulator, hperiod):
+    targets = (('compile', 'run') if simulator == 'iverilog' else
+               ('vcs_compile', 'vcs_run'))
+    log = open('sim.log', 'w')
+    try:
+        for target in targets:
+            if subprocess.call(['make', target, '-C', testdir], stdout=log, stderr=log) != 0:
+                return { 'status' : 'sim_error' }
+    finally:
+        log.close()
+
+    text = open('sim.log', 'r').read()
+    m = re.search(r'\[CoRAM\] time:\s*(\d+) all threads finished', text)
+    if m is None:
+        return { 'status' : 'sim_timeout' }
+    sim_time = int(m.group(1))
+    return { 'sim_time' : sim_time, 'sim_cycles' : sim_time // (2 * hperiod) }
+
+#-------------------------------------------------------------------------------
+def main():
+    INFO = "PyCoRAM sweep: Design-space exploration over a parameter grid"
+    VERSION = pycoram.utils.version.VERSION
+    USAGE = "Usage: python run_sweep.py [config] [-t topmodule] [-I includepath]+ [-p name=value[,value]*]+ [--sim] [file]+"
+
+    def showVersion():
+        print(INFO)
+        print(VERSION)
+        print(USAGE)
+        sys.exit()
+
+    optparser = OptionParser()
+    optparser.add_option("-v","--version",action="store_true",dest="showversion",
+                         default=False,help="Show the version")
+    optparser.add_option("-t","--top",dest="topmodule",
+                         default="TOP",help="Top module of user logic, Default=userlogic")
+    optparser.add_option("-I","--include",dest="include",action="append",
+                         default=[],help="Include path")
+    optparser.add_option("-D",dest="define",action="append",
+                         default=[],help="Macro Definition")
+    optparser.add_option("--memimg",dest="memimg",
+                         default=None,help="Memory image file, Default=None")
+    optparser.add_option("--usertest",dest="usertest",
+                         default=None,help="User-defined test bench file, Default=None")
+    optparser.add_option("-p","--param",dest="params",action="append",
+                         default=[],help="Swept parameter: a configuration item or a top-level constant of the control-threads (name=value[,value]*)")
+    optparser.add_option("-o","--outdir",dest="outdir",
+                         default="sweep",help="Output directory, Default=sweep")
+    optparser.add_option("--csv",dest="csv",
+                         default=None,help="Result CSV file, Default=<outdir>/result.csv")
+    optparser.add_option("-j","--jobs",dest="jobs",type="int",
+                         default=1,help="Number of variants built in parallel (0: all cores), Default=1")
+    optparser.add_option("--sim",action="store_true",dest="sim",
+                         default=False,help="Run the generated test bench of each variant")
+    optparser.add_option("--simulator",dest="simulator",
+                         default="iverilog",help="Simulator (iverilog or vcs), Default=iverilog")
+    optparser.add_option("--cachedir",dest="cachedir",
+                         default=None,help="Cache directory shared by the variants, Default=%s" %
+                         pycoram.utils.cache.getDefaultCacheDir())
+
+    (options, args) = optparser.parse_args()
+
+    filelist = []
+    for arg in args:
+        filelist.extend( glob.glob(os.path.expanduser(arg)) )
+
+    if options.showversion:
+        showVersion()
+
+    for f in filelist:
+        if not os.path.exists(f): raise IOError("file not found: " + f)
+
+    if len(filelist) == 0:
+        showVersion()
+
+    if options.simulator not in ('iverilog', 'vcs'):
+        raise ValueError("Simulator should be iverilog or vcs, not '%s'." % options.simulator)
+
+    # variants are built in their own directories
+    configfile = None
+    userlogic_filelist = []
+    controlthread_sources = []
+    for f in filelist:
+        f = os.path.abspath(f)
+        if f.endswith('.v'):
+            userlogic_filelist.append(f)
+        if f.endswith('.py'):
+            # a thread is named after its file, and copied into the variant by this name
+            if [ c for c, source in controlthread_sources
+                 if os.path.basename(c) == os.path.basename(f) ]:
+                raise IOError("Multiple control-thread files named %s" % os.path.basename(f))
+            controlthread_sources.append( (f, open(f, 'r').read()) )
+        if f.endswith('.config'):
+            if configfile is not None: raise IOError("Multiple configuration files")
+            configfile = f
+
+    include = [ os.path.abspath(os.path.expanduser(d)) for d in options.include ]
+    usertest = (os.path.abspath(options.usertest)
+                if options.usertest is not None else None)
+    memimg = (os.path.abspath(os.path.expanduser(options.memimg))
+              if options.memimg is not None else None)
+    cache_dir = (options.cachedir if options.cachedir is not None else
+                 pycoram.utils.cache.getDefaultCacheDir())
+    outdir = os.path.abspath(options.outdir)
+    csvfile = (options.csv if options.csv is not None else
+               os.path.join(outdir, 'result.csv'))
+
+    params = [ parseParameter(p) for p in options.params ]
+    configs = readConfigs(configfile)[0]
+    for name, values in params:
+        if name in configs: continue
+        if not [ f for f, source in controlthread_sources if getConstantLines(source, name) ]:
+            raise ValueError("No such configuration item or control-thread constant: %s" % name)
+
+    variants = getVariants(params)
+
+    print("----------------------------------------")
+    print("Sweep")
+    for name, values in params:
+        print("  %s : %s" % (name, ', '.join(values)))
+    print("  # variants = %d" % len(variants))
+    print("----------------------------------------")
+
+    # the user RTL is parsed once here, and the variants share the cached parse
+    converter = RtlConverter(userlogic_filelist, options.topmodule,
+                             include=include, define=options.define,
+                             single_clock=configs['single_clock'], cache_dir=cache_dir)
+    converter.parseCached()
+
+    tasks = [ (index, variant, outdir, configfile, options.topmodule, userlogic_filelist,
+               controlthread_sources, include, options.define, usertest, memimg,
+               cache_dir, options.sim, options.simulator)
+              for index, variant in enumerate(variants) ]
+
+    jobs = options.jobs
+    if jobs is None or jobs < 1:
+        jobs = multiprocessing.cpu_count()
+
+    # every variant is built in a worker process
+    results = []
+    pool = multiprocessing.Pool(min(jobs, len(tasks)))
+    try:
+        for result in pool.imap(buildVariant, tasks):
+            print("  variant %04d: %s %s" %
+                  (result['variant'], result['status'],
+                   ' '.join([ '%s=%s' % (name, result[name]) for name, values in params ])))
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    fields = ['variant'] + [ name for name, values in params ] + ['status', 'states']
+    thread_fields = set()
+    for result in results:
+        thread_fields.update([ k for k in result.keys() if k.startswith('states:') ])
+    fields.extend(sorted(thread_fields))
+    fields.extend(['registers', 'register_bits', 'bram'])
+    fields.extend(['sim_time', 'sim_cycles', 'build_time', 'dir'])
+
+    csvdir = os.path.dirname(os.path.abspath(csvfile))
+    if not os.path.isdir(csvdir):
+        os.makedirs(csvdir)
+    f = open(csvfile, 'w')
+    writer = csv.DictWriter(f, fieldnames=fields, restval='', extrasaction='ignore')
+    writer.writeheader()
+    for result in results:
+        writer.writerow(result)
+    f.close()
+
+    print("----------------------------------------")
+    print("Result: %s" % csvfile)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#-------------------------------------------------------------------------------
+# bin2hex_bench.py
+#
+# Throughput of bin2hex.py in MB/s, against the byte-at-a-time conversion
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import struct
+import shutil
+import tempfile
+import filecmp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bin2hex
+
+#-------------------------------------------------------------------------------
+# byte-at-a-time conversion (bin2hex.py ver.1.0.0) as the reference
+def ref_bin2hex(ifilename, ofilename, size):
+    ifile = open(ifilename, 'rb')
+    ofile = open(ofilename, 'w')
+    line = []
+    index = 0
+
+    buf = ifile.read(1)
+    while buf:
+        line.append("%02x" % struct.unpack("B", buf)[0])
+        if (index % size) == (size -1):
+            line.append('\n')
+            ofile.write(''.join(reversed(line)))
+            line = []
+        buf = ifile.read(1)
+        index += 1
+    ofile.close()
+
+def ref_bin2hex_bank(ifilename, ofilename, size):
+    ifile = open(ifilename, 'rb')
+    ofilelist = []
+    for i in range(size):
+        ofilelist.append( open( ("%03d" % i) + ofilename, 'w') )
+
+    index = 0
+    buf = ifile.read(1)
+    while buf:
+        ofilelist[ index % size ].write( ("%02x\n" % struct.unpack("B", buf)[0]) )
+        buf = ifile.read(1)
+        index += 1
+    for ofile in ofilelist:
+        ofile.close()
+
+#-------------------------------------------------------------------------------
+def measure(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+def report(name, mbytes, elapsed, base=None):
+    line = "  %-24s %8.3f s %10.2f MB/s" % (name, elapsed, mbytes / elapsed if elapsed > 0 else 0.0)
+    if base is not None and elapsed > 0:
+        line += "  x%.1f" % (base / elapsed)
+    print(line)
+
+def run(mbytes, size, banks, reference):
+    binfile = 'in.bin'
+    f = open(binfile, 'wb')
+    for i in range(int(mbytes * 1024 * 1024) // (1024 * 1024)):
+        f.write(os.urandom(1024 * 1024))
+    f.write(os.urandom(int(mbytes * 1024 * 1024) % (1024 * 1024)))
+    f.close()
+    mb = os.path.getsize(binfile) / (1024.0 * 1024.0)
+    print("Input: %.2f MB" % mb)
+
+    print("Word mode (--size=%d)" % size)
+    base = None
+    if reference:
+        base = measure(ref_bin2hex, binfile, 'ref.hex', size)
+        report('byte-at-a-time', mb, base)
+    t = measure(bin2hex.bin2hex, binfile, 'out.hex', size)
+    report('chunked', mb, t, base)
+    if reference and not filecmp.cmp('ref.hex',
+                                     'out.hex', shallow=False):
+        raise ValueError("Different outputs in word mode")
+    t = measure(bin2hex.hex2bin, 'out.hex',
+                'back.bin', size)
+    report('reverse', mb, t)
+    data = open(binfile, 'rb').read()
+    if data[:len(data) - len(data) % size] != open('back.bin', 'rb').read():
+        raise ValueError("Reverse conversion in word mode does not reproduce the input")
+
+    print("Bank mode (--bank --size=%d)" % banks)
+    base = None
+    if reference:
+        base = measure(ref_bin2hex_bank, binfile, 'ref.hex', banks)
+        report('byte-at-a-time', mb, base)
+    t = measure(bin2hex.bin2hex_bank, binfile, 'out.hex', banks)
+    report('chunked', mb, t, base)
+    if reference:
+        for i in range(banks):
+            if not filecmp.cmp('%03dref.hex' % i,
+                               '%03dout.hex' % i, shallow=False):
+                raise ValueError("Different outputs in bank mode")
+    t = measure(bin2hex.hex2bin_bank, 'out.hex',
+                'back_bank.bin', banks)
+    report('reverse', mb, t)
+    if not filecmp.cmp(binfile, 'back_bank.bin', shallow=False):
+        raise ValueError("Reverse conversion in bank mode does not reproduce the input")
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    from optparse import OptionParser
+    optparser = OptionParser()
+    optparser.add_option("--mbytes",dest="mbytes",type='float',
+                         default=16,help="Size of the random input in MB, default=16")
+    optparser.add_option("--size",dest="size",type='int',
+                         default=64,help="Chunk size of word mode, default=64")
+    optparser.add_option("--banks",dest="banks",type='int',
+                         default=4,help="Number of banks of bank mode, default=4")
+    optparser.add_option("--noref",action="store_false",dest="reference",
+                         default=True,help="Skip the byte-at-a-time conversion")
+    (options, args) = optparser.parse_args()
+
+    # the banked files are named with the bank number in front of the file name
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp()
+    try:
+        os.chdir(workdir)
+        run(options.mbytes, options.size, options.banks, options.reference)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
@@ -0,0 +1,269 @@
+#-------------------------------------------------------------------------------
+# cache.py
+#
+# Content-addressed on-disk cache for build artifacts
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import glob
+import shutil
+import hashlib
+import tempfile
+import collections
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import pycoram.utils.version
+import pyverilog
+
+# bytes of the entries of a namespace of the on-disk cache
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+#-------------------------------------------------------------------------------
+def getDefaultCacheDir():
+    if 'PYCORAM_CACHE_DIR' in os.environ:
+        return os.environ['PYCORAM_CACHE_DIR']
+    if 'XDG_CACHE_HOME' in os.environ:
+        return os.path.join(os.environ['XDG_CACHE_HOME'], 'pycoram')
+    return os.path.join(os.path.expanduser('~'), '.cache', 'pycoram')
+
+def getDefaultCacheSize():
+    if 'PYCORAM_CACHE_SIZE' in os.environ:
+        return int(os.environ['PYCORAM_CACHE_SIZE']) * 1024 * 1024
+    return DEFAULT_CACHE_SIZE
+
+#-------------------------------------------------------------------------------
+def digest(*items):
+    h = hashlib.sha1()
+    for item in items:
+        _update(h, item)
+    return h.hexdigest()
+
+def _update(h, obj):
+    if obj is None:
+        h.update(b'N;')
+    elif isinstance(obj, bool):
+        h.update(b'B' + (b'1' if obj else b'0') + b';')
+    elif isinstance(obj, bytes):
+        h.update(b'Y' + str(len(obj)).encode('ascii') + b':')
+        h.update(obj)
+    elif isinstance(obj, (int, float)) or type(obj).__name__ == 'long':
+        h.update(b'I' + repr(obj).encode('ascii') + b';')
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'L' + str(len(obj)).encode('ascii') + b'(')
+        for o in obj:
+            _update(h, o)
+        h.update(b')')
+    elif isinstance(obj, dict):
+        h.update(b'D' + str(len(obj)).encode('ascii') + b'(')
+        for k, v in sorted(obj.items(), key=lambda x:str(x[0])):
+            _update(h, k)
+            _update(h, v)
+        h.update(b')')
+    elif isinstance(obj, (set, frozenset)):
+        h.update(b'S(')
+        for d in sorted([ digest(o) for o in obj ]):
+            h.update(d.encode('ascii'))
+        h.update(b')')
+    elif hasattr(obj, '__dict__'):
+        h.update(b'O' + obj.__class__.__name__.encode('utf-8') + b'(')
+        _update(h, vars(obj))
+        h.update(b')')
+    else:
+        s = obj if isinstance(obj, str) else str(obj)
+        if not isinstance(s, bytes):
+            s = s.encode('utf-8')
+        h.update(b'T' + str(len(s)).encode('ascii') + b':')
+        h.update(s)
+
+#-------------------------------------------------------------------------------
+def fileDigest(filename):
+    h = hashlib.sha1()
+    f = open(filename, 'rb')
+    while True:
+        data = f.read(1024 * 1024)
+        if not data: break
+        h.update(data)
+    f.close()
+    return h.hexdigest()
+
+_package_digests = {}
+def packageDigest(dirname):
+    if dirname in _package_digests:
+        return _package_digests[dirname]
+    items = [ pycoram.utils.version.VERSION,
+              getattr(pyverilog, '__version__', None),
+              os.path.dirname(os.path.abspath(pyverilog.__file__)) ]
+    for f in sorted(glob.glob(os.path.join(dirname, '*.py'))):
+        items.append( (os.path.basename(f), fileDigest(f)) )
+    ret = digest(*items)
+    _package_digests[dirname] = ret
+    return ret
+
+#-------------------------------------------------------------------------------
+def writeAtomic(filename, data):
+    def write(f):
+        f.write(data)
+    _replaceAtomic(filename, write)
+
+def copyAtomic(src, dst):
+    def write(f):
+        s = open(src, 'rb')
+        try:
+            shutil.copyfileobj(s, f)
+        finally:
+            s.close()
+    _replaceAtomic(dst, write)
+
+def _replaceAtomic(filename, write):
+    dirname = os.path.dirname(os.path.abspath(filename))
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.tmp')
+    try:
+        f = os.fdopen(fd, 'wb')
+        write(f)
+        f.close()
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmpname, 0o666 & ~umask)
+        if hasattr(os, 'replace'):
+            os.replace(tmpname, filename)
+        else:
+            os.rename(tmpname, filename)
+    except:
+        if os.path.exists(tmpname): os.remove(tmpname)
+        raise
+
+#-------------------------------------------------------------------------------
+# an unchanged file keeps its mtime, so that make and the vendor tools
+# do not redo the work depending on it
+def updateFile(filename, data):
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    if os.path.isfile(filename) and os.path.getsize(filename) == len(data):
+        f = open(filename, 'rb')
+        old = f.read()
+        f.close()
+        if old == data: return False
+    writeAtomic(filename, data)
+    return True
+
+def updateCopy(src, dst):
+    if (os.path.isfile(dst) and os.path.getsize(src) == os.path.getsize(dst) and
+        fileDigest(src) == fileDigest(dst)):
+        return False
+    copyAtomic(src, dst)
+    return True
+
+#-------------------------------------------------------------------------------
+class FileCache(object):
+    # the least recently used entries are removed beyond maxsize bytes,
+    # so that --watch and the sweeps do not fill the disk with old versions:
+    # an entry is touched at every hit, and the mtime is the time of the last use
+    def __init__(self, dirname, namespace, maxsize=None):
+        self.dirname = os.path.join(dirname, namespace)
+        self.maxsize = maxsize if maxsize is not None else getDefaultCacheSize()
+        # total size of the entries, scanned at the first put
+        self.size = None
+
+    def getPath(self, key):
+        return os.path.join(self.dirname, key[:2], key[2:] + '.pickle')
+
+    def get(self, key):
+        path = self.getPath(key)
+        if not os.path.exists(path): return None
+        try:
+            f = open(path, 'rb')
+            try:
+                value = pickle.load(f)
+            finally:
+                f.close()
+        except Exception:
+            # broken, incompatible or just removed entry: treat as a miss
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RuntimeError, TypeError) as e:
+            # too deep or unpicklable object: not cached
+            print("Warning: cannot write cache entry %s: %s" % (key, str(e)))
+            return
+        try:
+            writeAtomic(self.getPath(key), data)
+        except (IOError, OSError) as e:
+            print("Warning: cannot write cache entry %s: %s" % (key, str(e)))
+            return
+        if self.size is None:
+            self.size = self.getEntries()[1]
+        else:
+            self.size += len(data)
+        # other processes also write: scanned again before removing
+        if self.size > self.maxsize:
+            self.prune()
+
+    def getEntries(self):
+        # ([(mtime, size, path)], total size)
+        entries = []
+        for root, dirs, names in os.walk(self.dirname):
+            for name in names:
+                if not name.endswith('.pickle'): continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append( (st.st_mtime, st.st_size, path) )
+        return (entries, sum([ size for mtime, size, path in entries ]))
+
+    def prune(self):
+        (entries, total) = self.getEntries()
+        for mtime, size, path in sorted(entries):
+            if total <= self.maxsize: break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self.size = total
+
+#-------------------------------------------------------------------------------
+class MemoryCache(object):
+    # entries are kept pickled so that every get returns a fresh copy;
+    # the least recently used entries are dropped beyond maxsize, so that
+    # a long --watch session does not keep every old version of the sources
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries: return None
+        data = self.entries.pop(key)
+        self.entries[key] = data
+        return pickle.loads(data)
+
+    def put(self, key, value):
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RuntimeError, TypeError) as e:
+            print("Warning: cannot write cache entry %s: %s" % (key, str(e)))
+            return
+        if key in self.entries: del self.entries[key]
+        self.entries[key] = data
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries = collections.OrderedDict()
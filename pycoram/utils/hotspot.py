@@ -0,0 +1,149 @@
+#-------------------------------------------------------------------------------
+# hotspot.py
+#
+# Per-line hot spot report of the control threads from the state profile
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import csv
+import json
+import collections
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pycoram.utils.version
+import pycoram.utils.cache
+
+#-------------------------------------------------------------------------------
+def getLineTable(thread_names, linetables):
+    ret = collections.OrderedDict()
+    ret['version'] = pycoram.utils.version.VERSION
+    threads = []
+    for name in thread_names:
+        table = linetables[name]
+        thread = collections.OrderedDict()
+        thread['name'] = name
+        thread['width'] = table['width']
+        thread['states'] = [ collections.OrderedDict([ ('state', state), ('code', code),
+                                                       ('lines', list(lines)) ])
+                             for state, code, lines in table['states'] ]
+        thread['source'] = table['source']
+        threads.append(thread)
+    ret['threads'] = threads
+    return ret
+
+def writeLineTable(filename, table):
+    pycoram.utils.cache.updateFile(filename, json.dumps(table, indent=2) + '\n')
+
+def readLineTable(filename):
+    return json.load(open(filename, 'r'))
+
+def readProfile(filename):
+    # thread name -> state -> cycles
+    ret = {}
+    for row in csv.DictReader(open(filename, 'r')):
+        cycles = ret.setdefault(row['thread'], {})
+        state = int(row['state'])
+        cycles[state] = cycles.get(state, 0) + int(row['cycles'])
+    return ret
+
+#-------------------------------------------------------------------------------
+def getStateRanges(states):
+    ret = []
+    for state in sorted(states):
+        if ret and ret[-1][1] + 1 == state:
+            ret[-1][1] = state
+        else:
+            ret.append([state, state])
+    return ','.join([ str(b) if b == e else '%d-%d' % (b, e) for b, e in ret ])
+
+def getHotSpots(thread, cycles=None):
+    # line -> [cycles, states]: the cycles of a state merged from several
+    # statements are shared by their lines equally
+    lines = {}
+    other = [0, []]
+    for entry in thread['states']:
+        state = entry['state']
+        c = 0 if cycles is None else cycles.get(state, 0)
+        if not entry['lines']:
+            other[0] += c
+            other[1].append(state)
+            continue
+        for lineno in entry['lines']:
+            spot = lines.setdefault(lineno, [0, []])
+            spot[0] += float(c) / len(entry['lines'])
+            spot[1].append(state)
+    return lines, other
+
+def printReport(table, profile=None, thread_name=None, sort=False, top=None, buf=sys.stdout):
+    for thread in table['threads']:
+        if thread_name is not None and thread['name'] != thread_name: continue
+        cycles = None
+        if profile is not None:
+            if thread['name'] not in profile:
+                print("Warning: no profile of thread '%s'" % thread['name'], file=buf)
+                continue
+            cycles = profile[thread['name']]
+        lines, other = getHotSpots(thread, cycles)
+        total = sum(cycles.values()) if cycles is not None else 0
+        source = thread['source']
+
+        spots = sorted(lines.items(), key=lambda x:x[0])
+        if sort:
+            spots = sorted(spots, key=lambda x:(-x[1][0], x[0]))
+        if top is not None:
+            spots = spots[:top]
+
+        print("----------------------------------------", file=buf)
+        print("Thread: %s" % thread['name'], file=buf)
+        if cycles is not None:
+            print("Total cycles: %d" % total, file=buf)
+        print("", file=buf)
+        print("%6s %12s %8s  %-12s %s" % ('Line', 'Cycles', '% Time', 'States', 'Line Contents'), file=buf)
+        print("=" * 72, file=buf)
+        for lineno, (c, states) in spots:
+            text = source[lineno-1] if 0 < lineno and lineno <= len(source) else ''
+            ratio = 100.0 * c / total if total > 0 else 0.0
+            print("%6d %12.1f %8.1f  %-12s %s" %
+                  (lineno, c, ratio, getStateRanges(states), text.rstrip()), file=buf)
+        if other[1]:
+            ratio = 100.0 * other[0] / total if total > 0 else 0.0
+            print("%6s %12.1f %8.1f  %-12s %s" %
+                  ('-', other[0], ratio, getStateRanges(other[1]), '(finished or idle)'), file=buf)
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    from optparse import OptionParser
+    INFO = "Per-line hot spot report of the control threads"
+    VERSION = "ver.1.0.0"
+    USAGE = "Usage: python hotspot.py [--sort] [--top N] [--thread name] linetable [profile]"
+
+    def showVersion():
+        print(INFO)
+        print(VERSION)
+        print(USAGE)
+        sys.exit()
+
+    optparser = OptionParser()
+    optparser.add_option("-v","--version",action="store_true",dest="showversion",
+                         default=False,help="Show the version")
+    optparser.add_option("--thread",dest="thread",
+                         default=None,help="Control thread to report, default=all")
+    optparser.add_option("--sort",action="store_true",dest="sort",
+                         default=False,help="Sort the lines by the cycles")
+    optparser.add_option("--top",dest="top",type='int',
+                         default=None,help="Number of lines to report, default=all")
+    (options, args) = optparser.parse_args()
+
+    if options.showversion or len(args) < 1 or len(args) > 2:
+        showVersion()
+
+    table = readLineTable(args[0])
+    profile = readProfile(args[1]) if len(args) > 1 else None
+    printReport(table, profile, options.thread, options.sort, options.top)
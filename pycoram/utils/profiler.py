@@ -0,0 +1,187 @@
+#-------------------------------------------------------------------------------
+# profiler.py
+#
+# Per-stage compile profiler
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import copy
+import time
+import cProfile
+
+# (stage, label) in the order of a build
+STAGES = ( ('parse', 'RTL parse'),
+           ('convert', 'Instance conversion'),
+           ('visit', 'Control-thread AST visit'),
+           ('optimize', 'Optimization'),
+           ('codegen', 'Code generation'),
+           ('workers', 'Control-thread workers'),
+           ('render', 'Template rendering'),
+           ('output', 'File output') )
+
+COUNTS = ( ('optimize', 'Optimizer calls'),
+           ('optimize_miss', 'Optimizer cache misses'),
+           ('deepcopy', 'Deepcopies') )
+
+#-------------------------------------------------------------------------------
+class Profiler(object):
+    def __init__(self, dumpdir=None, prefix=''):
+        self.dumpdir = dumpdir
+        self.prefix = prefix
+        self.times = {}
+        self.calls = {}
+        self.counts = {}
+        self.profiles = {}
+        # stages compiled in worker processes: they run in parallel to the 'workers' stage
+        self.worker_times = {}
+        self.worker_calls = {}
+        self.workers = 0
+        # [stage, start time of the current slice]
+        self.stack = []
+        self.start = time.time()
+        self.total = None
+
+    # time of a stage excludes the time of the stages nested in it
+    def begin(self, stage):
+        now = time.time()
+        if self.stack:
+            self.suspend(self.stack[-1], now)
+        self.stack.append([stage, now])
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+        if self.dumpdir is not None:
+            if stage not in self.profiles:
+                self.profiles[stage] = cProfile.Profile()
+            self.profiles[stage].enable()
+
+    def end(self, stage):
+        now = time.time()
+        if not self.stack or self.stack[-1][0] != stage:
+            raise ValueError("Profiling stage '%s' is not running." % stage)
+        self.suspend(self.stack.pop(), now)
+        if self.stack:
+            self.stack[-1][1] = now
+            if self.dumpdir is not None:
+                self.profiles[self.stack[-1][0]].enable()
+
+    def suspend(self, entry, now):
+        stage, since = entry
+        self.times[stage] = self.times.get(stage, 0.0) + now - since
+        if self.dumpdir is not None:
+            self.profiles[stage].disable()
+
+    def count(self, event, n=1):
+        self.counts[event] = self.counts.get(event, 0) + n
+
+    def finish(self):
+        # stages left open by an exception
+        while self.stack:
+            self.end(self.stack[-1][0])
+        self.total = time.time() - self.start
+
+    #-------------------------------------------------------------------------
+    def getData(self):
+        return (self.times, self.calls, self.counts)
+
+    def merge(self, data):
+        (times, calls, counts) = data
+        for k, v in times.items():
+            self.worker_times[k] = self.worker_times.get(k, 0.0) + v
+        for k, v in calls.items():
+            self.worker_calls[k] = self.worker_calls.get(k, 0) + v
+        for k, v in counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+        self.workers += 1
+
+    def writeStats(self):
+        if self.dumpdir is None: return []
+        if not os.path.isdir(self.dumpdir):
+            os.makedirs(self.dumpdir)
+        ret = []
+        for stage, profile in sorted(self.profiles.items(), key=lambda x:x[0]):
+            filename = os.path.join(self.dumpdir, ''.join( (self.prefix, stage, '.pstats') ))
+            profile.dump_stats(filename)
+            ret.append(filename)
+        return ret
+
+    #-------------------------------------------------------------------------
+    def dump(self, buf=sys.stdout):
+        total = self.total if self.total is not None else time.time() - self.start
+        stages = [ s for s, l in STAGES ]
+        labels = dict(STAGES)
+        for stage in sorted(set(self.times.keys()) | set(self.worker_times.keys())):
+            if stage not in labels:
+                stages.append(stage)
+                labels[stage] = stage
+
+        print("----------------------------------------", file=buf)
+        print("Profile", file=buf)
+        print("  %-28s %10s %7s %10s" % ('Stage', 'Time [s]', '%', 'Calls'), file=buf)
+        for stage in stages:
+            if stage not in self.times: continue
+            t = self.times.get(stage, 0.0)
+            print("  %-28s %10.3f %7.1f %10d" %
+                  (labels[stage], t, 100.0 * t / total if total > 0 else 0.0,
+                   self.calls.get(stage, 0)), file=buf)
+        other = total - sum(self.times.values())
+        print("  %-28s %10.3f %7.1f" %
+              ('Other', other, 100.0 * other / total if total > 0 else 0.0), file=buf)
+        print("  %-28s %10.3f %7.1f" % ('Total', total, 100.0), file=buf)
+
+        if self.workers > 0:
+            print("  Worker processes (%d threads, summed over the processes):" % self.workers,
+                  file=buf)
+            for stage in stages:
+                if stage not in self.worker_times: continue
+                print("    %-26s %10.3f %7s %10d" %
+                      (labels[stage], self.worker_times[stage], '',
+                       self.worker_calls.get(stage, 0)), file=buf)
+
+        for event, label in COUNTS:
+            print("  %s: %d" % (label, self.counts.get(event, 0)), file=buf)
+
+        for filename in self.writeStats():
+            print("  Profile data: %s" % filename, file=buf)
+
+#-------------------------------------------------------------------------------
+# the profiler of the current build, None when profiling is disabled
+profiler = None
+
+def enable(dumpdir=None, prefix=''):
+    global profiler
+    profiler = Profiler(dumpdir, prefix)
+    if copy.deepcopy is not countingDeepcopy:
+        copy.deepcopy = countingDeepcopy
+    return profiler
+
+def disable():
+    global profiler
+    ret = profiler
+    profiler = None
+    copy.deepcopy = original_deepcopy
+    if ret is not None:
+        ret.finish()
+    return ret
+
+def getProfiler():
+    return profiler
+
+def begin(stage):
+    if profiler is not None: profiler.begin(stage)
+
+def end(stage):
+    if profiler is not None: profiler.end(stage)
+
+def count(event, n=1):
+    if profiler is not None: profiler.count(event, n)
+
+#-------------------------------------------------------------------------------
+original_deepcopy = copy.deepcopy
+def countingDeepcopy(x, memo=None, _nil=[]):
+    # nested copies of the members get a memo, and are not counted
+    if memo is None: count('deepcopy')
+    return original_deepcopy(x, memo, _nil)
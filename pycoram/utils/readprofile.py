@@ -1,5 +1,8 @@
+import sys
 import pstats
-p = pstats.Stats('profile.rslt')
+# profile.rslt, or the per-stage files of pycoram --profiledir (merged)
+files = sys.argv[1:] if len(sys.argv) > 1 else ['profile.rslt']
+p = pstats.Stats(*files)
 p.strip_dirs().sort_stats('cumulative').print_stats(20)
 #p.strip_dirs().sort_stats('time').print_stats(20)
 p.print_callers(.5, 'deepcopy')
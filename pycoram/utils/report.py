@@ -0,0 +1,95 @@
+#-------------------------------------------------------------------------------
+# report.py
+#
+# Machine-readable build report
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+import math
+import json
+import collections
+
+import pycoram.utils.version
+import pycoram.utils.cache
+
+# aspect ratios (width, depth) of a 36Kb block RAM
+BRAM_SHAPES = ( (1, 32768), (2, 16384), (4, 8192), (9, 4096),
+                (18, 2048), (36, 1024), (72, 512) )
+
+# kinds of CoRAM objects: (attribute of ControlThread, external interface)
+CORAM_KINDS = ( ('memories', 'master'), ('instreams', 'master'), ('outstreams', 'master'),
+                ('channels', None), ('registers', None),
+                ('iochannels', 'slave'), ('ioregisters', 'slave') )
+
+#-------------------------------------------------------------------------------
+def estimateBram(datawidth, depth):
+    if not datawidth or not depth: return 0
+    return min([ int(math.ceil(float(datawidth) / w)) * int(math.ceil(float(depth) / d))
+                 for w, d in BRAM_SHAPES ])
+
+def getInterfaceName(if_type, thread_name, obj_name):
+    if if_type == 'axi':
+        return ''.join( (thread_name, '_', obj_name, '_AXI') )
+    if if_type == 'avalon':
+        return ''.join( (thread_name, '_', obj_name) )
+    return None
+
+#-------------------------------------------------------------------------------
+def getCoramObjectReport(obj, kind, interface, if_type, thread_name):
+    ret = collections.OrderedDict()
+    ret['name'] = obj.name
+    ret['kind'] = obj.__class__.__name__
+    ret['id'] = int(str(obj.idx))
+    ret['datawidth'] = obj.datawidth
+    ret['depth'] = obj.size
+    ret['length'] = obj.length
+    # registers are flip-flops, the others are block RAMs or block RAM FIFOs
+    banks = obj.length if obj.length is not None else 1
+    ret['bram'] = (0 if kind in ('registers', 'ioregisters') else
+                   banks * estimateBram(obj.datawidth, obj.size))
+    ret['ext_datawidth'] = obj.ext_datawidth
+    name = (getInterfaceName(if_type, thread_name, obj.name)
+            if interface is not None else None)
+    ret['interface'] = (collections.OrderedDict([ ('name', name), ('type', interface) ])
+                        if name is not None else None)
+    return ret
+
+def getThreadReport(thread, stats, compile_time, cycles, if_type):
+    ret = collections.OrderedDict()
+    ret['name'] = thread.name
+    ret['states'] = stats['states']
+    ret['registers'] = stats['registers']
+    ret['register_bits'] = stats['register_bits']
+    objects = []
+    for kind, interface in CORAM_KINDS:
+        for obj in getattr(thread, kind):
+            objects.append( getCoramObjectReport(obj, kind, interface, if_type, thread.name) )
+    ret['coram_objects'] = objects
+    ret['bram'] = sum([ o['bram'] for o in objects ])
+    ret['cycles_per_iteration'] = ([ collections.OrderedDict([ ('begin', begin), ('end', end),
+                                                               ('cycles', c) ])
+                                     for (begin, end), c in sorted(cycles.items()) ]
+                                   if cycles else [])
+    ret['compile_time'] = round(compile_time, 6)
+    return ret
+
+def getReport(configs, topmodule, threads, stats, compile_times, cycles, times):
+    ret = collections.OrderedDict()
+    ret['version'] = pycoram.utils.version.VERSION
+    ret['topmodule'] = topmodule
+    ret['configs'] = collections.OrderedDict(sorted(configs.items(), key=lambda x:x[0]))
+    ret['threads'] = [ getThreadReport(thread, stats[thread.name], compile_times[thread.name],
+                                       cycles[thread.name], configs['if_type'])
+                       for thread in threads ]
+    ret['states'] = sum([ t['states'] for t in ret['threads'] ])
+    ret['registers'] = sum([ t['registers'] for t in ret['threads'] ])
+    ret['register_bits'] = sum([ t['register_bits'] for t in ret['threads'] ])
+    ret['bram'] = sum([ t['bram'] for t in ret['threads'] ])
+    ret['times'] = collections.OrderedDict([ (k, round(v, 6)) for k, v in times.items() ])
+    return ret
+
+def writeReport(filename, report):
+    pycoram.utils.cache.updateFile(filename, json.dumps(report, indent=2) + '\n')
@@ -0,0 +1,90 @@
+#-------------------------------------------------------------------------------
+# sparsemem.py
+#
+# Memory image in 4KB pages for the sparse DRAM model of the test benches
+#
+# Copyright (C) 2013, Shinya Takamaeda-Yamazaki
+# License: Apache 2.0
+#-------------------------------------------------------------------------------
+from __future__ import absolute_import
+from __future__ import print_function
+import re
+
+import pycoram.utils.bin2hex as bin2hex
+
+PAGE_WIDTH = 12
+PAGE_SIZE = 2 ** PAGE_WIDTH
+ZERO_PAGE = bytes(bytearray(PAGE_SIZE))
+# page numbers of 32 bits in the page list
+MAX_ADDR_WIDTH = PAGE_WIDTH + 32
+
+COMMENT = re.compile(br'//[^\n]*')
+
+#-------------------------------------------------------------------------------
+def putBytes(pages, addr, data):
+    pos = 0
+    while pos < len(data):
+        (page, offset) = divmod(addr + pos, PAGE_SIZE)
+        size = min(PAGE_SIZE - offset, len(data) - pos)
+        if page not in pages:
+            pages[page] = bytearray(PAGE_SIZE)
+        pages[page][offset:offset+size] = data[pos:pos+size]
+        pos += size
+
+def getBinaryPages(filename):
+    pages = {}
+    f = open(filename, 'rb')
+    page = 0
+    while True:
+        data = f.read(PAGE_SIZE)
+        if not data: break
+        if data != ZERO_PAGE[:len(data)]:
+            putBytes(pages, page * PAGE_SIZE, data)
+        page += 1
+    f.close()
+    return pages
+
+def getHexText(filename):
+    # chunks of the text cut at newlines, not to cut a comment
+    f = open(filename, 'rb')
+    rest = b''
+    while True:
+        buf = f.read(bin2hex.CHUNK)
+        if not buf: break
+        buf = rest + buf
+        pos = buf.rfind(b'\n')
+        rest = buf[pos+1:]
+        if pos >= 0: yield buf[:pos+1]
+    if rest: yield rest
+    f.close()
+
+def getHexPages(filename):
+    # $readmemh format of a byte array: a byte per word, and '@address'
+    pages = {}
+    addr = 0
+    for text in getHexText(filename):
+        parts = COMMENT.sub(b'', text).split(b'@')
+        for i, part in enumerate(parts):
+            if i > 0:
+                words = part.split(None, 1)
+                addr = int(words[0], 16)
+                part = words[1] if len(words) > 1 else b''
+            data = bin2hex.textToBytes(part, 1, filename)
+            putBytes(pages, addr, data)
+            addr += len(data)
+    return pages
+
+#-------------------------------------------------------------------------------
+def getSparseImage(filename, max_pages):
+    # pages of zeros are not stored: a page not in the image reads as zeros
+    pages = (getBinaryPages(filename) if filename.endswith('.bin') else
+             getHexPages(filename))
+    numbers = sorted([ page for page, data in pages.items() if data != ZERO_PAGE ])
+    if len(numbers) > max_pages:
+        raise ValueError("Memory image %s has %d pages, more than sim_pages (%d)" %
+                         (filename, len(numbers), max_pages))
+    data = b''.join([ bytes(pages[page]) for page in numbers ])
+    # the number of pages, the page numbers, and padding up to the page list of the model
+    pagelist = ([ '%x' % len(numbers) ] + [ '%x' % page for page in numbers ] +
+                [ '0' ] * (max_pages - len(numbers)))
+    return (data, '\n'.join(pagelist) + '\n')
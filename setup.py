@@ -27,9 +27,12 @@ setup(name='pycoram',
       install_requires=[ 'pyverilog>=1.0.4', 'Jinja2>=2.8' ],
       extras_require={
           'test' : [ 'pytest>=2.8.2', 'pytest-pythonpath>=0.7' ],
+          'sim' : [ 'numpy>=1.8' ],
       },
       entry_points="""
       [console_scripts]
       %s = pycoram.run_pycoram:main
-      """ % script_name,
+      %s-sweep = pycoram.run_sweep:main
+      %s-sim = pycoram.run_simulator:main
+      """ % (script_name, script_name, script_name),
 )
@@ -0,0 +1,83 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import sys
+import random
+import subprocess
+
+import pytest
+
+import pycoram.utils.bin2hex as bin2hex
+
+SCRIPT = bin2hex.__file__.replace('.pyc', '.py')
+
+def getData(length, seed=0):
+    r = random.Random(seed)
+    return bytes(bytearray([ r.randrange(256) for i in range(length) ]))
+
+def reference(data, size):
+    # the line-by-line conversion of the original implementation
+    ret = []
+    for pos in range(0, len(data) - len(data) % size, size):
+        word = bytearray(data[pos:pos+size])
+        ret.append('\n' + ''.join([ '%02x' % b for b in reversed(word) ]))
+    return ''.join(ret)
+
+def run(tmp_path, *args):
+    subprocess.check_call([sys.executable, SCRIPT] + list(args), cwd=str(tmp_path))
+
+@pytest.mark.parametrize('size', [1, 4, 16, 64])
+def test_word(tmp_path, monkeypatch, size):
+    monkeypatch.setattr(bin2hex, 'CHUNK', 1024)
+    data = getData(5000)
+    ifile = tmp_path.joinpath('in.bin')
+    ifile.write_bytes(data)
+    hexfile = str(tmp_path.joinpath('out.hex'))
+    bin2hex.bin2hex(str(ifile), hexfile, size)
+    assert open(hexfile).read() == reference(data, size)
+
+    binfile = str(tmp_path.joinpath('out.bin'))
+    bin2hex.hex2bin(hexfile, binfile, size)
+    assert open(binfile, 'rb').read() == data[:len(data) - len(data) % size]
+
+def test_bank(tmp_path, monkeypatch):
+    monkeypatch.setattr(bin2hex, 'CHUNK', 1024)
+    monkeypatch.chdir(tmp_path)
+    data = getData(4099)
+    tmp_path.joinpath('in.bin').write_bytes(data)
+    bin2hex.bin2hex_bank('in.bin', 'out.hex', 4)
+    for i in range(4):
+        text = tmp_path.joinpath('%03d' % i + 'out.hex').read_text()
+        assert text == ''.join([ '%02x\n' % b for b in bytearray(data[i::4]) ])
+
+    bin2hex.hex2bin_bank('out.hex', 'out.bin', 4)
+    assert tmp_path.joinpath('out.bin').read_bytes() == data
+
+def test_inconsistent_bank(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tmp_path.joinpath('000out.hex').write_text('00\n')
+    tmp_path.joinpath('001out.hex').write_text('01\n02\n')
+    with pytest.raises(ValueError):
+        bin2hex.hex2bin_bank('out.hex', 'out.bin', 2)
+
+def test_short_words(tmp_path):
+    # hex words of less digits are padded with zeros
+    hexfile = tmp_path.joinpath('in.hex')
+    hexfile.write_text('1\n  0203\n\n40506\n')
+    binfile = str(tmp_path.joinpath('out.bin'))
+    bin2hex.hex2bin(str(hexfile), binfile, 4)
+    assert open(binfile, 'rb').read() == b'\x01\x00\x00\x00\x03\x02\x00\x00\x06\x05\x04\x00'
+
+    hexfile.write_text('123456789\n')
+    with pytest.raises(ValueError):
+        bin2hex.hex2bin(str(hexfile), binfile, 4)
+
+def test_command(tmp_path):
+    data = getData(1000, seed=1)
+    tmp_path.joinpath('in.bin').write_bytes(data)
+    run(tmp_path, '--size', '8', 'in.bin')
+    run(tmp_path, '--size', '8', '--reverse', '-o', 'word.bin', 'out.hex')
+    assert tmp_path.joinpath('word.bin').read_bytes() == data
+
+    run(tmp_path, '--size', '4', '--bank', '-o', 'bank.hex', 'in.bin')
+    run(tmp_path, '--size', '4', '--bank', '--reverse', 'bank.hex')
+    assert tmp_path.joinpath('out.bin').read_bytes() == data
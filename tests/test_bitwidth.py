@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+from pycoram.controlthread.fsm import Fsm
+from pycoram.controlthread.bitwidth import BitwidthAnalyzer
+from pycoram.controlthread.bitwidth import getBitLength
+from pycoram.controlthread.bitwidth import getIntConst
+
+import pyverilog.vparser.ast as vast
+
+def var(name):
+    return vast.Identifier(name)
+
+def const(value):
+    return vast.IntConst(str(value))
+
+def loop(bound, body=None):
+    # for i in range(bound): body
+    fsm = Fsm()
+    fsm.setBind(var('i'), const(0), 0)
+    fsm.set(0, 1)
+    fsm.set(1, 2, cond=vast.LessThan(var('i'), bound), elsedst=3)
+    if body is not None:
+        fsm.setBind(var(body[0]), body[1], 2)
+    fsm.setBind(var('i'), vast.Plus(var('i'), const(1)), 2)
+    fsm.set(2, 1)
+    fsm.setLoop(1, 2, var('i'), const(1))
+    fsm.count = 3
+    return fsm
+
+def test_constants():
+    assert getBitLength(0) == 1
+    assert getBitLength(1) == 1
+    assert getBitLength(255) == 8
+    assert getBitLength(256) == 9
+    assert getIntConst(const(10)) == (10, 32)
+    assert getIntConst(vast.IntConst("8'hff")) == (255, 8)
+    assert getIntConst(vast.IntConst("'b1_0")) == (2, 32)
+    assert getIntConst(vast.IntConst('x')) is None
+
+def test_loop_counter():
+    fsm = loop(const(100))
+    widths = BitwidthAnalyzer(fsm, ['i'], {}, signalwidth=64).getWidths()
+    assert widths == {'i':7}
+
+def test_loop_counter_constant_bound():
+    fsm = loop(var('n'))
+    widths = BitwidthAnalyzer(fsm, ['i'], {'n':const(1000)}, signalwidth=64).getWidths()
+    assert widths == {'i':10}
+
+def test_unbounded():
+    # an accumulator keeps the signal width, and so do unknown inputs
+    fsm = loop(const(16), ('s', vast.Plus(var('s'), var('i'))))
+    fsm.setBind(var('x'), var('input_data'), 3)
+    widths = BitwidthAnalyzer(fsm, ['i', 's', 'x'], {}, signalwidth=64).getWidths()
+    assert widths == {'i':5}
+
+def test_derived():
+    fsm = loop(const(16), ('a', vast.Times(var('i'), const(4))))
+    widths = BitwidthAnalyzer(fsm, ['i', 'a'], {}, signalwidth=64).getWidths()
+    assert widths == {'i':5, 'a':7}
+
+def test_annotation():
+    fsm = loop(const(100))
+    analyzer = BitwidthAnalyzer(fsm, ['i'], {}, signalwidth=64, annotations={'i':16})
+    assert analyzer.getWidths() == {'i':16}
+
+def test_legalize():
+    # a narrowed value that would overflow in its new context is widened again:
+    # i - 1 underflows at i == 0 in a narrow comparison
+    fsm = loop(const(16))
+    fsm.set(3, 4, cond=vast.LessThan(vast.Minus(var('i'), const(1)), var('n')), elsedst=5)
+    widths = BitwidthAnalyzer(fsm, ['i'], {}, signalwidth=64).getWidths()
+    assert widths == {}
@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+
+import pycoram.utils.cache as cache
+from pycoram.controlthread.controlthread import ControlThreadGenerator
+
+TESTDIR = os.path.dirname(os.path.abspath(__file__))
+THREAD = os.path.join(TESTDIR, 'single_memory', 'ctrl_thread.py')
+
+def read(filename):
+    f = open(filename, 'r')
+    ret = f.read()
+    f.close()
+    return ret
+
+def test_digest():
+    assert cache.digest('a', 1, None) == cache.digest('a', 1, None)
+    assert cache.digest('a', 1) != cache.digest('a', '1')
+    assert cache.digest(['ab', 'c']) != cache.digest(['a', 'bc'])
+    assert cache.digest(True) != cache.digest(1)
+    assert cache.digest({'x':1, 'y':2}) == cache.digest({'y':2, 'x':1})
+    assert cache.digest({'x':1}) != cache.digest({'x':2})
+
+def test_file_cache(tmp_path):
+    c = cache.FileCache(str(tmp_path), 'test')
+    key = cache.digest('key')
+    assert c.get(key) is None
+    c.put(key, ('value', [1, 2]))
+    assert c.get(key) == ('value', [1, 2])
+    # another instance sees the same entry
+    assert cache.FileCache(str(tmp_path), 'test').get(key) == ('value', [1, 2])
+    # a broken entry is a miss
+    f = open(c.getPath(key), 'wb')
+    f.write(b'broken')
+    f.close()
+    assert c.get(key) is None
+
+def test_file_cache_size(tmp_path, monkeypatch):
+    value = 'x' * 1000
+    size = len(cache.pickle.dumps(value, cache.pickle.HIGHEST_PROTOCOL))
+    c = cache.FileCache(str(tmp_path), 'test', maxsize=size * 3)
+    keys = [ cache.digest(i) for i in range(5) ]
+    for i, key in enumerate(keys[:3]):
+        c.put(key, value)
+        # the time of the last use
+        os.utime(c.getPath(key), (1000000000 + i, 1000000000 + i))
+    # a hit makes the oldest entry the newest
+    assert c.get(keys[0]) == value
+    c.put(keys[3], value)
+    assert [ c.get(key) is not None for key in keys[:4] ] == [True, False, True, True]
+    assert c.getEntries()[1] <= size * 3
+
+    # the limit in MB from the environment
+    monkeypatch.setenv('PYCORAM_CACHE_SIZE', '2')
+    assert cache.FileCache(str(tmp_path), 'test').maxsize == 2 * 1024 * 1024
+    monkeypatch.delenv('PYCORAM_CACHE_SIZE')
+    assert cache.FileCache(str(tmp_path), 'test').maxsize == cache.DEFAULT_CACHE_SIZE
+
+def test_memory_cache():
+    c = cache.MemoryCache(maxsize=2)
+    c.put('a', [1])
+    value = c.get('a')
+    assert value == [1]
+    # every get returns a fresh copy
+    value.append(2)
+    assert c.get('a') == [1]
+    c.put('b', [2])
+    c.get('a')
+    c.put('c', [3])
+    # the least recently used entry is dropped
+    assert c.get('b') is None
+    assert c.get('a') == [1]
+    assert c.get('c') == [3]
+    c.clear()
+    assert c.get('a') is None
+
+def test_update_file(tmp_path):
+    filename = str(tmp_path.joinpath('out.v'))
+    assert cache.updateFile(filename, 'module a;')
+    assert not cache.updateFile(filename, 'module a;')
+    assert cache.updateFile(filename, 'module b;')
+    assert read(filename) == 'module b;'
+
+def test_compile_cache(tmp_path):
+    source = read(THREAD)
+    expected = ControlThreadGenerator().compileSource('ctrl_thread', source)
+
+    generator = ControlThreadGenerator(cache_dir=str(tmp_path))
+    key = generator.getCacheKey('ctrl_thread', source, 64, 64, 512,
+                                generator.getOptions())
+    assert generator.cache.get(key) is None
+    # miss: compiled and stored
+    assert generator.compileSource('ctrl_thread', source) == expected
+    assert generator.cache.get(key) is not None
+
+    # hit: the same code and status from a new generator
+    cached = ControlThreadGenerator(cache_dir=str(tmp_path))
+    assert cached.compileSource('ctrl_thread', source) == expected
+    assert cached.getDump('ctrl_thread') == generator.getDump('ctrl_thread')
+    assert cached.getStats('ctrl_thread') == generator.getStats('ctrl_thread')
+
+def test_compile_cache_invalidation(tmp_path):
+    source = read(THREAD)
+    generator = ControlThreadGenerator(cache_dir=str(tmp_path))
+    base = generator.getCacheKey('ctrl_thread', source, 64, 64, 512,
+                                 generator.getOptions())
+    modified = source.replace('range(8)', 'range(4)')
+    keys = [ generator.getCacheKey('ctrl_thread', modified, 64, 64, 512,
+                                   generator.getOptions()),
+             generator.getCacheKey('ctrl_thread', source, 32, 64, 512,
+                                   generator.getOptions()),
+             generator.getCacheKey('ctrl_thread', source, 64, 64, 512,
+                                   generator.getOptions({'fsm_compaction':True})) ]
+    for key in keys:
+        assert key != base
+
+    # a modified source is compiled again, not taken from the cache
+    generator.compileSource('ctrl_thread', source)
+    code = generator.compileSource('ctrl_thread', modified)
+    assert code == ControlThreadGenerator().compileSource('ctrl_thread', modified)
+    assert code != ControlThreadGenerator().compileSource('ctrl_thread', source)
@@ -0,0 +1,249 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import ast
+import glob
+
+import pytest
+
+from pycoram.controlthread.controlthread import ControlThreadGenerator
+from pycoram.controlthread.controlthread import FunctionVisitor
+from pycoram.controlthread.controlthread import CompileVisitor
+from pycoram.controlthread.codegen import CodeGenerator
+from pycoram.controlthread.bitwidth import getIntConst
+
+import pyverilog.vparser.ast as vast
+
+TESTDIR = os.path.dirname(os.path.abspath(__file__))
+THREADS = sorted(glob.glob(os.path.join(TESTDIR, '*', 'ctrl_thread*.py')))
+
+OPTIONS = [
+    {'fsm_compaction' : True},
+    {'fsm_scheduling' : True},
+    {'fsm_encoding' : 'onehot'},
+    {'fsm_encoding' : 'gray'},
+    {'subroutine_threshold' : 1},
+    {'bitwidth_inference' : True},
+    {'fsm_scheduling' : True, 'subroutine_threshold' : 1, 'bitwidth_inference' : True},
+]
+
+# threads without CoRAM objects, which run in the FSM interpreter below
+PROGRAMS = [
+'''
+def f(n):
+    s = 0
+    for i in range(n):
+        s += i * 2
+    return s
+a = 1
+b = 2
+c = a + b
+d = f(5)
+e = f(c)
+print(c, d, e)
+''',
+'''
+x = 0
+y = 100
+while x < 50:
+    x += 3
+    if x % 4 == 0: continue
+    y = y - 1
+    if y < 90: break
+print(x, y)
+''',
+'''
+def mac(a, b, c):
+    return a * b + c
+acc = 0
+for i in range(4):
+    for j in range(i, 6):
+        acc = mac(i, j, acc)
+    t = acc % 7
+    print(i, acc, t)
+u = acc >> 2
+v = u & 255
+print(u, v)
+''',
+]
+
+def read(filename):
+    f = open(filename, 'r')
+    ret = f.read()
+    f.close()
+    return ret
+
+def compile_thread(source, options=None):
+    generator = ControlThreadGenerator()
+    code = generator.compileSource('ctrl_thread', source, options=options)
+    return code, generator
+
+#-------------------------------------------------------------------------------
+# FSM interpreter
+#-------------------------------------------------------------------------------
+def generate(source, subroutine_threshold=0, **options):
+    tree = ast.parse(source)
+    functionvisitor = FunctionVisitor()
+    functionvisitor.visit(tree)
+    compilevisitor = CompileVisitor('th', functionvisitor.getFunctions(), 64,
+                                    subroutine_threshold=subroutine_threshold)
+    compilevisitor.visit(tree)
+    codegen = CodeGenerator('th', *compilevisitor.getStatus(), **options)
+    codegen.generate()
+    return codegen
+
+BINOPS = {
+    vast.Plus : lambda a, b: a + b,
+    vast.Minus : lambda a, b: a - b,
+    vast.Times : lambda a, b: a * b,
+    vast.Divide : lambda a, b: a // b,
+    vast.Mod : lambda a, b: a % b,
+    vast.LessThan : lambda a, b: int(a < b),
+    vast.GreaterThan : lambda a, b: int(a > b),
+    vast.LessEq : lambda a, b: int(a <= b),
+    vast.GreaterEq : lambda a, b: int(a >= b),
+    vast.Eq : lambda a, b: int(a == b),
+    vast.NotEq : lambda a, b: int(a != b),
+    vast.Eql : lambda a, b: int(a == b),
+    vast.NotEql : lambda a, b: int(a != b),
+    vast.Land : lambda a, b: int(bool(a) and bool(b)),
+    vast.Lor : lambda a, b: int(bool(a) or bool(b)),
+    vast.And : lambda a, b: a & b,
+    vast.Or : lambda a, b: a | b,
+    vast.Xor : lambda a, b: a ^ b,
+    vast.Sll : lambda a, b: a << b,
+    vast.Srl : lambda a, b: a >> b,
+}
+
+def run(codegen, steps=100000):
+    # executes the FSM and the binds cycle by cycle, with the registers
+    # truncated to their widths; returns the printed values and the cycles
+    fsm = codegen.fsm
+    env = {}
+
+    def evaluate(node):
+        if isinstance(node, vast.IntConst):
+            return getIntConst(node)[0]
+        if isinstance(node, vast.Identifier):
+            if node.name in codegen.const_binds:
+                return evaluate(codegen.const_binds[node.name])
+            return env.get(node.name, 0)
+        if isinstance(node, vast.Cond):
+            return evaluate(node.true_value) if evaluate(node.cond) else evaluate(node.false_value)
+        if isinstance(node, vast.Ulnot):
+            return int(not evaluate(node.right))
+        return BINOPS[node.__class__](evaluate(node.left), evaluate(node.right))
+
+    printed = []
+    state = 0
+    for cycle in range(steps):
+        if env.get('finish'): return printed, cycle
+        updates = []
+        for bind in fsm.getBind(state, codegen._optimize):
+            if bind.cond is not None and not evaluate(bind.cond): continue
+            if bind.dst is None:
+                if bind.value.syscall == 'display':
+                    printed.append(tuple([ evaluate(a) for a in bind.value.args
+                                           if not isinstance(a, (vast.StringConst, vast.SystemCall)) ]))
+                continue
+            width = codegen.widths.get(bind.dst.name, codegen.signalwidth)
+            updates.append( (bind.dst.name, evaluate(bind.value) % (2 ** width)) )
+        nxt = state
+        for node in fsm.get(state):
+            if node.cond is None or evaluate(codegen._optimize(node.cond)):
+                nxt = node.dst
+            elif node.elsedst is not None:
+                nxt = node.elsedst
+        for name, value in updates:
+            env[name] = value
+        state = nxt
+    raise RuntimeError('thread did not finish in %d cycles' % steps)
+
+#-------------------------------------------------------------------------------
+def test_interpreter():
+    printed, cycles = run(generate(PROGRAMS[0]))
+    assert printed == [ (3, 20, 6), () ]
+
+@pytest.mark.parametrize('source', PROGRAMS)
+@pytest.mark.parametrize('options', OPTIONS)
+def test_same_behavior(source, options):
+    printed, cycles = run(generate(source))
+    opt_printed, opt_cycles = run(generate(source, **options))
+    assert opt_printed == printed
+    if options.get('fsm_compaction') or options.get('fsm_scheduling'):
+        assert opt_cycles < cycles
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_scheduling_not_slower(source):
+    compacted = generate(source, fsm_compaction=True)
+    scheduled = generate(source, fsm_scheduling=True)
+    assert run(scheduled)[1] <= run(compacted)[1]
+    assert scheduled.fsm.getNumStates() <= compacted.fsm.getNumStates()
+
+def test_bitwidth_inference():
+    codegen = generate(PROGRAMS[2], bitwidth_inference=True)
+    # the loop counters are narrowed, the accumulator is not bounded
+    assert codegen.widths
+    assert max(codegen.widths.values()) < codegen.signalwidth
+    assert not [ name for name in codegen.widths if name.endswith('acc') ]
+
+#-------------------------------------------------------------------------------
+@pytest.mark.parametrize('filename', THREADS, ids=os.path.basename)
+def test_default_options(filename):
+    source = read(filename)
+    code, generator = compile_thread(source)
+    explicit = { 'fsm_compaction' : False, 'fsm_scheduling' : False,
+                 'fsm_encoding' : 'binary', 'subroutine_threshold' : 0,
+                 'bitwidth_inference' : False }
+    assert compile_thread(source, explicit)[0] == code
+
+@pytest.mark.parametrize('filename', THREADS, ids=os.path.basename)
+@pytest.mark.parametrize('options', OPTIONS)
+def test_options(filename, options):
+    source = read(filename)
+    code, generator = compile_thread(source)
+    opt_code, opt_generator = compile_thread(source, options)
+    # the same CoRAM objects, and no more states than without the option
+    assert str(opt_generator.getStatus()) == str(generator.getStatus())
+    states = generator.getStateCount('ctrl_thread')
+    assert opt_generator.getStateCount('ctrl_thread') <= states
+    assert 'module ctrl_thread' in opt_code
+    if 'fsm_encoding' in options:
+        assert opt_code != code
+
+@pytest.mark.parametrize('options', [{}, {'fsm_compaction' : True}])
+def test_state_count(options):
+    # the states of the generated FSM, with the finishing states
+    source = read(os.path.join(TESTDIR, 'single_memory', 'ctrl_thread.py'))
+    code, generator = compile_thread(source, options)
+    states = generator.getStats('ctrl_thread')['states']
+    assert states == len(generator.getLineTable('ctrl_thread')['states'])
+    assert states == (15 if options else 20)
+
+@pytest.mark.parametrize('encoding', ['binary', 'onehot', 'gray'])
+def test_fsm_encoding(encoding):
+    codegen = generate(PROGRAMS[0], fsm_encoding=encoding)
+    codes = [ codegen._getStateCode(s) for s in sorted(codegen.fsm.getStates()) ]
+    assert len(set(codes)) == len(codes)
+    assert max(codes) < 2 ** codegen._getStateWidth()
+    if encoding == 'onehot':
+        assert all([ bin(c).count('1') == 1 for c in codes ])
+    if encoding == 'gray':
+        for a, b in zip(codes, codes[1:]):
+            assert bin(a ^ b).count('1') == 1
+
+def test_invalid_option():
+    with pytest.raises(ValueError):
+        compile_thread(PROGRAMS[0], {'fsm_encoding' : 'johnson'})
+    with pytest.raises(ValueError):
+        compile_thread(PROGRAMS[0], {'no_such_option' : True})
+
+def test_parallel_compile():
+    sources = [ (os.path.basename(os.path.dirname(f)) + '_' +
+                 os.path.splitext(os.path.basename(f))[0], read(f)) for f in THREADS ]
+    serial = ControlThreadGenerator()
+    parallel = ControlThreadGenerator()
+    options = {'fsm_compaction' : True}
+    assert (parallel.compileThreads(sources, jobs=2, options=options) ==
+            serial.compileThreads(sources, jobs=1, options=options))
+    assert str(parallel.getStatus()) == str(serial.getStatus())
@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+from pycoram.rtlconverter.convertvisitor import copyTree
+from pycoram.rtlconverter.convertvisitor import children_items
+from pycoram.rtlconverter.convertvisitor import ischild
+from pycoram.rtlconverter.rtlconverter import getVerilogParser
+
+import pyverilog.vparser.ast as vast
+from pyverilog.ast_code_generator.codegen import ASTCodeGenerator
+
+SOURCE = '''
+module top(input CLK, input RST, output reg [7:0] q);
+  wire [7:0] d;
+  sub inst_sub(.CLK(CLK), .q(d));
+  always @(posedge CLK) begin
+    if (RST) q <= 0;
+    else q <= d + 1;
+  end
+endmodule
+'''
+
+def parse():
+    return getVerilogParser().parse(SOURCE).description.definitions[0]
+
+def nodes(node):
+    ret = [node]
+    for c in node.children():
+        ret.extend(nodes(c))
+    return ret
+
+def test_children_items():
+    for node in nodes(parse()):
+        expected = [ (attr, getattr(node, attr)) for attr in dir(node) if ischild(node, attr) ]
+        assert children_items(node) == expected
+    assert children_items(None) == []
+
+def test_copy_tree():
+    module = parse()
+    copied = copyTree(module)
+    assert ASTCodeGenerator().visit(copied) == ASTCodeGenerator().visit(module)
+    assert copied is not module
+    assert copied.portlist is not module.portlist
+    for item, copied_item in zip(module.items, copied.items):
+        if isinstance(item, vast.InstanceList):
+            # rewritten nodes are copied
+            assert copied_item is not item
+            assert copied_item.instances[0] is not item.instances[0]
+        else:
+            # the others are shared
+            assert copied_item is item
+    # a copy can be renamed and rewritten without touching the original
+    copied.name = 'top_r0'
+    copied.portlist.ports = ()
+    assert module.name == 'top'
+    assert len(module.portlist.ports) == 3
@@ -0,0 +1,126 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+from pycoram.controlthread.fsm import Fsm
+
+import pyverilog.vparser.ast as vast
+
+def var(name):
+    return vast.Identifier(name)
+
+def const(value):
+    return vast.IntConst(str(value))
+
+def chain(binds):
+    # a straight-line FSM: state i binds binds[i] and goes to i + 1
+    fsm = Fsm()
+    for state, (dst, value) in enumerate(binds):
+        fsm.setLineno(state + 1)
+        fsm.setBind(var(dst), value, state)
+        fsm.set(state, state + 1)
+    fsm.count = len(binds)
+    return fsm
+
+def dsts(fsm, state):
+    return [ b.dst.name for b in fsm.getBind(state) ]
+
+#-------------------------------------------------------------------------------
+def test_compact_independent():
+    fsm = chain([ ('r', const(0)), ('a', const(1)), ('b', const(2)), ('c', const(3)) ])
+    mapping, loop_mapping = fsm.compact(set(['r', 'a', 'b', 'c']))
+    assert fsm.getNumStates() == 2
+    assert dsts(fsm, 0) == ['r', 'a', 'b', 'c']
+    assert fsm.getLines(0) == (1, 2, 3, 4)
+    assert mapping == {0:0, 1:0, 2:0, 3:0, 4:1}
+    assert fsm.get(0)[0].dst == 1
+
+def test_compact_dependent():
+    # read-after-write keeps the states apart
+    fsm = chain([ ('r', const(0)), ('a', const(1)), ('b', vast.Plus(var('a'), const(1))) ])
+    fsm.compact(set(['r', 'a', 'b']))
+    assert fsm.getNumStates() == 3
+    assert dsts(fsm, 0) == ['r', 'a']
+    assert dsts(fsm, 1) == ['b']
+
+def test_compact_interface():
+    # an interface signal written before a read of another one keeps its cycle
+    fsm = chain([ ('r', const(0)), ('req', const(1)), ('a', var('ack')) ])
+    fsm.compact(set(['r', 'a']))
+    assert fsm.getNumStates() == 3
+    assert dsts(fsm, 0) == ['r', 'req']
+    assert dsts(fsm, 1) == ['a']
+
+def test_compact_branch():
+    fsm = Fsm()
+    fsm.setBind(var('i'), const(0), 0)
+    fsm.set(0, 1)
+    fsm.set(1, 2, cond=vast.LessThan(var('i'), const(4)), elsedst=4)
+    fsm.setBind(var('i'), vast.Plus(var('i'), const(1)), 2)
+    fsm.set(2, 3)
+    fsm.setBind(var('s'), vast.Plus(var('s'), const(2)), 3)
+    fsm.set(3, 1)
+    fsm.setLoop(1, 3)
+    fsm.count = 4
+    mapping, loop_mapping = fsm.compact(set(['i', 's']))
+    # the two independent updates of the loop body share a state
+    assert fsm.getNumStates() == 4
+    assert dsts(fsm, 2) == ['i', 's']
+    assert fsm.get(2)[0].dst == 1
+    assert loop_mapping == {(1, 3):(1, 2)}
+    assert fsm.getCyclesPerIteration() == {(1, 2):2}
+
+def test_renumber():
+    fsm = Fsm()
+    fsm.set(0, 5)
+    fsm.setBind(var('a'), const(1), 5)
+    fsm.set(5, 9)
+    fsm.count = 10
+    mapping, loop_mapping = fsm.renumber({3:5})
+    assert mapping == {0:0, 5:1, 9:2, 3:1}
+    assert sorted(fsm.getStates()) == [0, 1, 2]
+    assert fsm.get(1)[0].dst == 2
+    assert dsts(fsm, 1) == ['a']
+    assert fsm.count == 3
+
+#-------------------------------------------------------------------------------
+def test_schedule_asap():
+    # an independent statement moves up before the dependent chain,
+    # which compaction only merges forward
+    binds = [ ('r', const(0)),
+              ('a', const(1)), ('b', vast.Plus(var('a'), const(1))),
+              ('c', vast.Plus(var('b'), const(1))),
+              ('d', const(7)), ('e', vast.Plus(var('d'), const(1))) ]
+    variables = set(['r', 'a', 'b', 'c', 'd', 'e'])
+    compacted = chain(binds)
+    compacted.compact(variables)
+    assert compacted.getNumStates() == 5
+    scheduled = chain(binds)
+    scheduled.schedule(variables)
+    assert scheduled.getNumStates() == 4
+    assert dsts(scheduled, 0) == ['r', 'a', 'd']
+    assert dsts(scheduled, 1) == ['b']
+    # the last statement of a block stays in its last cycle
+    assert dsts(scheduled, 2) == ['c', 'e']
+
+def test_schedule_war():
+    # write-after-read may share a cycle
+    fsm = chain([ ('r', const(0)), ('b', vast.Plus(var('a'), const(1))), ('a', const(3)) ])
+    assert fsm.scheduleBlock([1, 2], set(['r', 'a', 'b'])) == [0, 0]
+
+def test_schedule_block():
+    fsm = Fsm()
+    for state in range(5):
+        fsm.set(state, state + 1)
+    fsm.setBind(var('a'), const(1), 1)
+    fsm.setBind(var('b'), const(2), 2)
+    fsm.setBind(var('c'), vast.Plus(var('a'), var('b')), 3)
+    fsm.count = 5
+    assert fsm.getBlocks() == [[1, 2, 3, 4]]
+    assert fsm.scheduleBlock([1, 2, 3, 4], set(['a', 'b', 'c'])) == [0, 0, 1, 1]
+
+def test_schedule_external_order():
+    fsm = chain([ ('r', const(0)), ('req', const(1)), ('a', const(1)), ('req2', const(1)) ])
+    cycles = fsm.scheduleBlock([1, 2, 3], set(['r', 'a']))
+    # the two interface writes stay in distinct cycles, in order
+    assert cycles[0] < cycles[2]
+    assert cycles[1] == 0
@@ -0,0 +1,84 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+
+import pycoram.utils.hotspot as hotspot
+from pycoram.controlthread.controlthread import ControlThreadGenerator
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+TESTDIR = os.path.dirname(os.path.abspath(__file__))
+THREAD = os.path.join(TESTDIR, 'single_memory', 'ctrl_thread.py')
+
+def getTable():
+    generator = ControlThreadGenerator()
+    generator.compile('ctrl_thread', filename=THREAD)
+    return hotspot.getLineTable(['ctrl_thread'],
+                                { 'ctrl_thread' : generator.getLineTable('ctrl_thread') })
+
+def test_line_table(tmp_path):
+    table = getTable()
+    thread = table['threads'][0]
+    assert thread['name'] == 'ctrl_thread'
+    assert thread['source'][0] == 'def ctrl_thread():'
+    # every line of a state is in the source
+    for entry in thread['states']:
+        for lineno in entry['lines']:
+            assert 0 < lineno and lineno <= len(thread['source'])
+
+    filename = str(tmp_path.joinpath('test.lines.json'))
+    hotspot.writeLineTable(filename, table)
+    assert hotspot.readLineTable(filename) == table
+
+def test_state_ranges():
+    assert hotspot.getStateRanges([]) == ''
+    assert hotspot.getStateRanges([5, 1, 2, 3, 7, 8]) == '1-3,5,7-8'
+
+def test_hot_spots():
+    thread = { 'states' : [ { 'state' : 0, 'lines' : [2] },
+                            { 'state' : 1, 'lines' : [3, 4] },
+                            { 'state' : 2, 'lines' : [3] },
+                            { 'state' : 3, 'lines' : [] } ] }
+    lines, other = hotspot.getHotSpots(thread, { 0 : 10, 1 : 20, 2 : 5, 3 : 100 })
+    # the cycles of a state of two lines are shared by them
+    assert lines == { 2 : [10, [0]], 3 : [15, [1, 2]], 4 : [10, [1]] }
+    assert other == [100, [3]]
+    lines, other = hotspot.getHotSpots(thread)
+    assert lines[3] == [0, [1, 2]]
+
+def test_report(tmp_path):
+    table = getTable()
+    thread = table['threads'][0]
+    profilename = tmp_path.joinpath('profile.csv')
+    rows = [ 'thread,state,cycles' ]
+    rows += [ 'ctrl_thread,%d,%d' % (entry['state'], 10) for entry in thread['states'] ]
+    # cycles of the same state are added
+    rows.append('ctrl_thread,0,5')
+    profilename.write_text('\n'.join(rows) + '\n')
+    profile = hotspot.readProfile(str(profilename))
+    assert profile['ctrl_thread'][0] == 15
+    total = 10 * len(thread['states']) + 5
+
+    buf = StringIO()
+    hotspot.printReport(table, profile, sort=True, top=3, buf=buf)
+    report = buf.getvalue().split('\n')
+    assert 'Thread: ctrl_thread' in report
+    assert 'Total cycles: %d' % total in report
+    header = report.index('=' * 72)
+    spots = report[header+1:header+4]
+    cycles = [ float(line.split()[1]) for line in spots ]
+    assert cycles == sorted(cycles, reverse=True)
+
+def test_report_without_profile():
+    table = getTable()
+    buf = StringIO()
+    hotspot.printReport(table, { 'other_thread' : { 0 : 1 } }, buf=buf)
+    # the warning is in the report, not on the standard output
+    assert buf.getvalue() == "Warning: no profile of thread 'ctrl_thread'\n"
+
+    buf = StringIO()
+    hotspot.printReport(table, thread_name='other_thread', buf=buf)
+    assert buf.getvalue() == ''
@@ -0,0 +1,64 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import pycoram.controlthread.maketree as maketree
+from pycoram.controlthread.optimizer import CachedOptimizer
+
+import pyverilog.vparser.ast as vast
+import pyverilog.dataflow.dataflow as vdflow
+import pyverilog.dataflow.optimizer as vopt
+from pyverilog.ast_code_generator.codegen import ASTCodeGenerator
+
+def expr(offset=1):
+    # (a + 1) * (b - 2) + offset
+    return vast.Plus(vast.Times(vast.Plus(vast.Identifier('a'), vast.IntConst('1')),
+                                vast.Minus(vast.Identifier('b'), vast.IntConst('2'))),
+                     vast.IntConst(str(offset)))
+
+def const():
+    # (3 + 4) * 2
+    return vast.Times(vast.Plus(vast.IntConst('3'), vast.IntConst('4')), vast.IntConst('2'))
+
+def emit(node):
+    return ASTCodeGenerator().visit(node)
+
+def reference(node):
+    optimizer = vopt.VerilogOptimizer({}, default_width=64)
+    return maketree.makeASTTree(optimizer.optimize(maketree.getDFTree(node)))
+
+def test_same_result():
+    optimizer = CachedOptimizer()
+    for node in (expr(), const(), vast.Identifier('a'), vast.Rvalue(expr(3))):
+        assert emit(optimizer.optimize(node)) == emit(reference(node))
+
+def test_hash_consing():
+    optimizer = CachedOptimizer()
+    assert optimizer.getKey(expr())[0] == optimizer.getKey(expr())[0]
+    assert optimizer.getKey(expr())[0] == optimizer.getKey(vast.Rvalue(expr()))[0]
+    assert optimizer.getKey(expr(1))[0] != optimizer.getKey(expr(2))[0]
+    assert optimizer.getKey(expr())[1] == frozenset(['a', 'b'])
+    assert optimizer.getKey(const())[1] == frozenset()
+
+def test_memoization():
+    optimizer = CachedOptimizer()
+    first = optimizer.optimize(expr())
+    assert (optimizer.hits, optimizer.misses) == (0, 1)
+    # a structurally equal tree is a hit and returns the same optimized tree
+    assert optimizer.optimize(expr()) is first
+    assert (optimizer.hits, optimizer.misses) == (1, 1)
+    optimizer.optimize(expr(2))
+    assert (optimizer.hits, optimizer.misses) == (1, 2)
+
+def test_invalidation():
+    optimizer = CachedOptimizer()
+    before = emit(optimizer.optimize(expr()))
+    optimizer.optimize(const())
+    optimizer.setConstant('a', vdflow.DFEvalValue(5, 32))
+    # the results referring to 'a' are optimized again with the constant
+    after = emit(optimizer.optimize(expr()))
+    assert after != before
+    assert 'a' not in after
+    # the others are kept
+    misses = optimizer.misses
+    optimizer.optimize(const())
+    assert optimizer.misses == misses
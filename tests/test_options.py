@@ -0,0 +1,44 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+from pycoram.pycoram import PycoramIp
+from pycoram.run_pycoram import readConfigs
+
+CONFIG = '''
+[synthesis]
+fsm_compaction = yes
+
+[cthread:ctrl_thread]
+fsm_compaction = no
+fsm_scheduling = yes
+fsm_encoding = onehot
+subroutine_threshold = 4
+bitwidth_inference = yes
+
+[cthread:other_thread]
+fsm_encoding = gray
+'''
+
+def ctrl_thread():
+    pass
+
+def other_thread():
+    pass
+
+def test_thread_options(tmp_path):
+    configfile = tmp_path.joinpath('test.config')
+    configfile.write_text(CONFIG)
+    configs, thread_options = readConfigs(str(configfile))
+    assert configs['fsm_compaction']
+
+    ip = PycoramIp()
+    ip.add_controlthread(ctrl_thread, fsm_compaction=False, fsm_scheduling=True,
+                         fsm_encoding='onehot', subroutine_threshold=4,
+                         bitwidth_inference=True)
+    ip.add_controlthread(other_thread, fsm_encoding='gray')
+    assert ip.thread_options == thread_options
+
+def test_no_thread_options():
+    ip = PycoramIp()
+    ip.add_controlthread(ctrl_thread)
+    assert ip.thread_options == {}
@@ -0,0 +1,90 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+
+from pycoram.pycoram import SystemBuilder
+from pycoram.run_pycoram import readConfigs
+
+from test_render import getThreads
+
+def read(filename):
+    f = open(filename, 'rb')
+    ret = f.read()
+    f.close()
+    return ret
+
+def age(filename):
+    # moves the mtime to the past, so that a rewrite is visible
+    os.utime(filename, (1000000000, 1000000000))
+
+def test_unchanged_package(tmp_path):
+    output = str(tmp_path.joinpath('out.v'))
+    configs = { 'output' : output }
+    builder = SystemBuilder()
+    builder.build_package_general(configs, 'module a;\n', 'endmodule\n')
+    assert read(output) == b'module a;\nendmodule\n'
+    age(output)
+    builder.build_package_general(configs, 'module a;\n', 'endmodule\n')
+    assert os.path.getmtime(output) == 1000000000
+    builder.build_package_general(configs, 'module b;\n', 'endmodule\n')
+    assert read(output) == b'module b;\nendmodule\n'
+    assert os.path.getmtime(output) != 1000000000
+
+def test_memory_image(tmp_path):
+    memimg = str(tmp_path.joinpath('mem.hex'))
+    f = open(memimg, 'w')
+    f.write('00\n01\n02\n03\n')
+    f.close()
+    memname = str(tmp_path.joinpath('test', 'mem.img'))
+    pagelistname = str(tmp_path.joinpath('test', 'mem.pagelist'))
+    configs = { 'sim_memory' : 'flat', 'sim_pages' : 16 }
+    builder = SystemBuilder()
+    builder.writeMemoryImage(configs, memimg, memname, pagelistname)
+    assert read(memname) == read(memimg)
+    assert not os.path.exists(pagelistname)
+    age(memname)
+    builder.writeMemoryImage(configs, memimg, memname, pagelistname)
+    assert os.path.getmtime(memname) == 1000000000
+
+    # the sparse model writes pages and their list, also only when changed
+    configs['sim_memory'] = 'sparse'
+    builder.writeMemoryImage(configs, memimg, memname, pagelistname)
+    assert read(memname) != read(memimg)
+    assert os.path.exists(pagelistname)
+    age(memname)
+    age(pagelistname)
+    builder.writeMemoryImage(configs, memimg, memname, pagelistname)
+    assert os.path.getmtime(memname) == 1000000000
+    assert os.path.getmtime(pagelistname) == 1000000000
+
+def test_unchanged_ip_package(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    configs, thread_options = readConfigs(None)
+    threads = getThreads()
+
+    def build(code):
+        SystemBuilder().build_package_axi(configs, code, '', threads, {}, {},
+                                          'userlogic', None, None)
+
+    def files():
+        ret = {}
+        for root, dirs, names in os.walk('pycoram_userlogic_v1_00_a'):
+            for name in names:
+                path = os.path.join(root, name)
+                ret[path] = read(path)
+        return ret
+
+    build('module a;\nendmodule\n')
+    before = files()
+    assert os.path.join('pycoram_userlogic_v1_00_a', 'hdl', 'verilog', 'pycoram_userlogic.v') in before
+    for path in before:
+        age(path)
+    # a new build with the same inputs writes no file
+    build('module a;\nendmodule\n')
+    assert files() == before
+    changed = [ path for path in before if os.path.getmtime(path) != 1000000000 ]
+    assert changed == []
+    # a change of the code rewrites the HDL only
+    build('module b;\nendmodule\n')
+    changed = [ path for path in before if os.path.getmtime(path) != 1000000000 ]
+    assert changed == [ os.path.join('pycoram_userlogic_v1_00_a', 'hdl', 'verilog', 'pycoram_userlogic.v') ]
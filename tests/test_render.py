@@ -0,0 +1,64 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+
+from pycoram.pycoram import SystemBuilder
+from pycoram.controlthread.controlthread import ControlThreadGenerator
+from pycoram.controlthread.coram_module import ControlThread
+
+TESTDIR = os.path.dirname(os.path.abspath(__file__))
+THREAD = os.path.join(TESTDIR, 'single_memory', 'ctrl_thread.py')
+
+def getThreads():
+    generator = ControlThreadGenerator()
+    generator.compile('ctrl_thread', filename=THREAD)
+    return [ ControlThread(name, *status) for name, status in generator.getStatus().items() ]
+
+class CountingBuilder(SystemBuilder):
+    # counts the templates actually rendered
+    def __init__(self, *args, **kwargs):
+        SystemBuilder.__init__(self, *args, **kwargs)
+        self.rendered = []
+        get_template = self.env.get_template
+        def counting_get_template(name, *args, **kwargs):
+            self.rendered.append(name)
+            return get_template(name, *args, **kwargs)
+        self.env.get_template = counting_get_template
+
+def render(builder, threads, template_file='node_axi.txt', ext_addrwidth=32):
+    return builder.render(template_file, 'userlogic', threads,
+                          [], [], [], [], ext_addrwidth=ext_addrwidth)
+
+def test_render_memoization():
+    threads = getThreads()
+    builder = CountingBuilder()
+    code = render(builder, threads)
+    assert 'userlogic' in code
+    assert render(builder, threads) == code
+    # equal threads from another compilation are the same input
+    assert render(builder, getThreads()) == code
+    assert builder.rendered == ['node_axi.txt']
+
+    # another input or another template is rendered again
+    wider = render(builder, threads, ext_addrwidth=64)
+    assert wider != code
+    assert render(builder, threads, template_file='dmac_memory.txt') != code
+    assert builder.rendered == ['node_axi.txt', 'node_axi.txt', 'dmac_memory.txt']
+    # only the last result of a template is kept
+    assert render(builder, threads) == code
+    assert builder.rendered[-1] == 'node_axi.txt'
+
+def test_render_cache(tmp_path):
+    threads = getThreads()
+    expected = render(SystemBuilder(), threads)
+
+    cache_dir = str(tmp_path)
+    builder = CountingBuilder(cache_dir=cache_dir)
+    assert render(builder, threads) == expected
+    assert builder.rendered == ['node_axi.txt']
+
+    # another process: from the cache, without rendering
+    builder = CountingBuilder(cache_dir=cache_dir)
+    assert render(builder, threads) == expected
+    assert builder.rendered == []
+    assert os.path.isdir(os.path.join(cache_dir, 'jinja2'))
@@ -0,0 +1,132 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import shutil
+
+import pytest
+
+import pycoram.utils.cache as cache
+from pycoram.rtlconverter.rtlconverter import RtlConverter
+from pycoram.rtlconverter.rtlconverter import getVerilogParser
+
+from pyverilog.ast_code_generator.codegen import ASTCodeGenerator
+
+MODULE_A = '''
+module a(input CLK, output [7:0] q);
+  assign q = 8'd1;
+endmodule
+'''
+
+MODULE_B = '''
+module b(input CLK, output [7:0] q);
+  a inst_a(.CLK(CLK), .q(q));
+endmodule
+'''
+
+def write(dirname, name, text):
+    path = dirname.joinpath(name)
+    path.write_text(text)
+    return str(path)
+
+class CountingConverter(RtlConverter):
+    # parses without the preprocessor (no Icarus Verilog is required),
+    # skipping the directives, and counts the files parsed
+    def __init__(self, *args, **kwargs):
+        RtlConverter.__init__(self, *args, **kwargs)
+        self.parsed = []
+
+    def parse(self, filelist):
+        self.parsed.append(list(filelist))
+        text = ''.join([ self.readFile(f) for f in filelist ])
+        text = '\n'.join([ line for line in text.splitlines() if not line.startswith('`') ])
+        ast = getVerilogParser().parse(text)
+        return ast, None
+
+def emit(ast):
+    return ASTCodeGenerator().visit(ast)
+
+#-------------------------------------------------------------------------------
+def test_macro_definition(tmp_path):
+    a = write(tmp_path, 'a.v', MODULE_A)
+    b = write(tmp_path, 'b.v', '`include "defs.vh"\n' + MODULE_B)
+    write(tmp_path, 'defs.vh', '`define WIDTH 8\n')
+    assert not RtlConverter([a]).hasMacroDefinition()
+    # a macro defined in an included header is visible from the following files
+    assert RtlConverter([b, a]).hasMacroDefinition()
+    c = write(tmp_path, 'c.v', '`define DEPTH 4\n' + MODULE_A)
+    assert RtlConverter([c]).hasMacroDefinition()
+
+def test_macro_definition_include_path(tmp_path):
+    incdir = tmp_path.joinpath('include')
+    incdir.mkdir()
+    write(incdir, 'defs.vh', '`undef WIDTH\n')
+    write(incdir, 'nested.vh', '`include "defs.vh"\n')
+    b = write(tmp_path, 'b.v', '`include "nested.vh"\n' + MODULE_B)
+    assert not RtlConverter([b]).hasMacroDefinition()
+    assert RtlConverter([b], include=[str(incdir)]).hasMacroDefinition()
+
+def test_include_digests(tmp_path):
+    b = write(tmp_path, 'b.v', '`include "defs.vh"\n' + MODULE_B)
+    header = write(tmp_path, 'defs.vh', '// header\n')
+    before = RtlConverter([b]).getIncludeDigests(b)
+    assert before == RtlConverter([b]).getIncludeDigests(b)
+    write(tmp_path, 'defs.vh', '// modified header\n')
+    assert RtlConverter([b]).getIncludeDigests(b) != before
+    os.remove(header)
+    assert RtlConverter([b]).getIncludeDigests(b) == ['defs.vh']
+
+def test_parse_cached(tmp_path):
+    cache_dir = str(tmp_path.joinpath('cache'))
+    a = write(tmp_path, 'a.v', MODULE_A)
+    b = write(tmp_path, 'b.v', MODULE_B)
+
+    converter = CountingConverter([a, b], cache_dir=cache_dir)
+    ast, moduleinfotable = converter.parseCached()
+    # miss: parsed file by file
+    assert converter.parsed == [[a], [b]]
+    assert emit(ast) == emit(getVerilogParser().parse(MODULE_A + MODULE_B))
+    assert moduleinfotable.getDefinitions().keys() >= set(['a', 'b'])
+
+    # hit: not parsed at all
+    converter = CountingConverter([a, b], cache_dir=cache_dir)
+    assert emit(converter.parseCached()[0]) == emit(ast)
+    assert converter.parsed == []
+
+    # a modified file is parsed again, the other one comes from the cache
+    write(tmp_path, 'b.v', MODULE_B.replace('inst_a', 'inst_a0'))
+    converter = CountingConverter([a, b], cache_dir=cache_dir)
+    assert 'inst_a0' in emit(converter.parseCached()[0])
+    assert converter.parsed == [[b]]
+
+    # another define is another key
+    converter = CountingConverter([a, b], define=['FOO'], cache_dir=cache_dir)
+    converter.parseCached()
+    assert converter.parsed == [[a], [b]]
+
+def test_parse_cached_macro(tmp_path):
+    cache_dir = str(tmp_path.joinpath('cache'))
+    a = write(tmp_path, 'a.v', MODULE_A)
+    b = write(tmp_path, 'b.v', '`include "defs.vh"\n' + MODULE_B)
+    write(tmp_path, 'defs.vh', '// `define in a header\n`define WIDTH 8\n')
+    converter = CountingConverter([a, b], cache_dir=cache_dir)
+    converter.parseCached()
+    # the whole list is parsed at once
+    assert converter.parsed == [[a, b]]
+
+def test_memory_cache(tmp_path):
+    a = write(tmp_path, 'a.v', MODULE_A)
+    store = cache.MemoryCache()
+    converter = CountingConverter([a], cache_store=store)
+    converter.parseCached()
+    converter = CountingConverter([a], cache_store=store)
+    converter.parseCached()
+    assert converter.parsed == []
+
+@pytest.mark.skipif(shutil.which('iverilog') is None, reason='Icarus Verilog is not installed')
+def test_parse_cached_preprocessed(tmp_path):
+    cache_dir = str(tmp_path.joinpath('cache'))
+    a = write(tmp_path, 'a.v', MODULE_A)
+    b = write(tmp_path, 'b.v', MODULE_B)
+    whole = RtlConverter([a, b]).parse([a, b])[0]
+    cached = RtlConverter([a, b], cache_dir=cache_dir).parseCached()[0]
+    assert emit(cached) == emit(whole)
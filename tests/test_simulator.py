@@ -0,0 +1,117 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import struct
+
+import pytest
+
+from pycoram.controlthread.simulator import Simulator, Dram
+
+TESTDIR = os.path.dirname(os.path.abspath(__file__))
+
+def pattern(addr, size):
+    # the DRAM of the test bench without a memory image
+    return bytes(bytearray([ ((a >> 2) >> (8 * (a % 4))) & 0xff for a in range(addr, addr + size) ]))
+
+def words(data):
+    return struct.unpack('<%dI' % (len(data) // 4), data)
+
+def test_dram_default():
+    dram = Dram(27)
+    assert dram.read(0, 4096 * 3) == pattern(0, 4096 * 3)
+    assert words(dram.read(0x1000, 8)) == (0x400, 0x401)
+    assert dram.read(0x1003, 6) == pattern(0x1003, 6)
+
+    # a page written is kept as the others read
+    dram.write(0x2002, b'\xff\xff')
+    assert dram.read(0x2000, 8) == pattern(0x2000, 2) + b'\xff\xff' + pattern(0x2004, 4)
+    assert dram.read(0x2000 + 4096 - 8, 8) == pattern(0x2000 + 4096 - 8, 8)
+    assert list(dram.pages.keys()) == [2]
+
+def test_dram_image(tmp_path):
+    memimg = tmp_path.joinpath('mem.hex')
+    memimg.write_text('@1000\n01\n02\n')
+    dram = Dram(27)
+    dram.load(str(memimg))
+    # a page out of the image reads as zeros
+    assert dram.read(0x1000, 4) == b'\x01\x02\x00\x00'
+    assert dram.read(0, 4) == b'\x00' * 4
+    dram.write(0x5000, b'\x03')
+    assert dram.read(0x5000, 4) == b'\x03\x00\x00\x00'
+
+def test_dram_wrap():
+    dram = Dram(16)
+    assert dram.read(0x10000 + 8, 4) == dram.read(8, 4)
+    assert dram.read(-4, 8) == pattern(0xfffc, 4) + pattern(0, 4)
+    dram.write(0xfffe, b'\x01\x02\x03\x04')
+    assert dram.read(0, 2) == b'\x03\x04'
+    assert dram.read(0xfffe, 2) == b'\x01\x02'
+
+def simulate(filename, timing, userlogic=None):
+    sim = Simulator(timing=timing, max_cycles=100000)
+    sim.addThreadFile(os.path.join(TESTDIR, filename))
+    if userlogic is not None:
+        userlogic(sim)
+    sim.run()
+    return sim
+
+@pytest.mark.parametrize('timing', [False, True])
+def test_single_memory(timing):
+    # 128 words DRAM -> BRAM -> DRAM, 8 times
+    sim = simulate(os.path.join('single_memory', 'ctrl_thread.py'), timing)
+    assert sim.contexts[0].finished
+    trace = sim.getTrace()
+    assert len(trace) == 16
+    for addr in range(0, 512 * 8, 512):
+        assert sim.dram.read(addr + 1024 * 16, 512) == pattern(addr, 512)
+    for start, done, thread, obj, command, mem_addr, ram_addr, size, nbytes in trace:
+        assert (done > start) == timing
+    assert sim.contexts[0].time == (trace[-1][1] + 1 if timing else 32)
+
+@pytest.mark.parametrize('timing', [False, True])
+def test_stream(timing):
+    def userlogic(sim):
+        outstream = sim.getPort('ctrl_thread', 'coramoutstream_0')
+        def loopback(obj, command, *args):
+            # the data of the instream to the outstream
+            outstream.fifo.extend(obj.popBytes())
+        sim.setHandler('ctrl_thread', 'coraminstream_0', loopback)
+    sim = simulate(os.path.join('stream', 'ctrl_thread.py'), timing, userlogic)
+    assert sim.contexts[0].finished
+    for addr in range(0, 512 * 8, 512):
+        assert sim.dram.read(addr + 1024 * 16, 512) == pattern(addr, 512)
+
+@pytest.mark.parametrize('timing', [False, True])
+def test_examples(timing):
+    for dirname in ('doublebuffer', 'multipage', 'nonblocking', 'scattergather'):
+        sim = simulate(os.path.join(dirname, 'ctrl_thread.py'), timing)
+        assert sim.contexts[0].finished
+        assert sim.getTrace()
+
+THREAD = '''
+ram = CoramMemory(0, 32, 16)
+before = CoramRegister(0, 32)
+after = CoramRegister(1, 32)
+ram.write_nonblocking(0, %d, 16)
+before.write(int(ram.getBram()[4]))
+ram.wait()
+after.write(int(ram.getBram()[4]))
+'''
+
+@pytest.mark.parametrize('timing', [False, True])
+def test_transfer_time(timing):
+    sim = Simulator(timing=timing)
+    # the address register is of signal_width bits
+    sim.addThread('ctrl_thread', THREAD % (2 ** 32 + 64))
+    times = []
+    def handler(obj, command, *args):
+        times.append(sim.now())
+    sim.setHandler('ctrl_thread', 'corammemory_0', handler)
+    sim.run()
+
+    (start, done, thread, obj, command, mem_addr, ram_addr, size, nbytes) = sim.getTrace()[0]
+    assert mem_addr == 64
+    # the data is in the block RAM when the transfer is done
+    assert sim.getPort('ctrl_thread', 'coramregister_0').values[0] == (0 if timing else 17)
+    assert sim.getPort('ctrl_thread', 'coramregister_1').values[0] == 17
+    assert times == [done]
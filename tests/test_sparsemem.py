@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import pytest
+
+import pycoram.utils.sparsemem as sparsemem
+from pycoram.pycoram import SystemBuilder
+from pycoram.run_pycoram import readConfigs
+
+PAGE_SIZE = sparsemem.PAGE_SIZE
+
+def getPages(data, pagelist):
+    # page number -> page contents of the packed image
+    lines = pagelist.split()
+    num = int(lines[0], 16)
+    numbers = [ int(p, 16) for p in lines[1:num+1] ]
+    return dict([ (page, data[i*PAGE_SIZE:(i+1)*PAGE_SIZE]) for i, page in enumerate(numbers) ])
+
+def test_binary_pages(tmp_path):
+    image = bytearray(PAGE_SIZE * 5 + 100)
+    image[3] = 1
+    image[PAGE_SIZE * 3 + 10] = 2
+    image[-1] = 3
+    memimg = tmp_path.joinpath('mem.bin')
+    memimg.write_bytes(bytes(image))
+
+    (data, pagelist) = sparsemem.getSparseImage(str(memimg), 8)
+    # pages of zeros are not stored, the last page is padded
+    assert len(data) == PAGE_SIZE * 3
+    assert pagelist.split() == ['3', '0', '3', '5', '0', '0', '0', '0', '0']
+    pages = getPages(data, pagelist)
+    assert pages[0] == bytes(image[:PAGE_SIZE])
+    assert pages[3] == bytes(image[PAGE_SIZE*3:PAGE_SIZE*4])
+    assert pages[5] == bytes(image[PAGE_SIZE*5:]) + bytes(bytearray(PAGE_SIZE - 100))
+
+def test_hex_pages(tmp_path):
+    memimg = tmp_path.joinpath('mem.hex')
+    memimg.write_text('01 02 // comment @10\n'
+                      '@%x\n'
+                      'ff\n'
+                      '@%x fe\n'
+                      '00\n' % (PAGE_SIZE * 0x12345 - 1, PAGE_SIZE * 2))
+    (data, pagelist) = sparsemem.getSparseImage(str(memimg), 4)
+    pages = getPages(data, pagelist)
+    assert sorted(pages.keys()) == [0, 2, 0x12344]
+    assert pages[0][:3] == b'\x01\x02\x00'
+    assert pages[0x12344][-1:] == b'\xff'
+    assert pages[2][:2] == b'\xfe\x00'
+    assert pagelist.split()[1:4] == ['0', '2', '12344']
+
+def test_too_many_pages(tmp_path):
+    memimg = tmp_path.joinpath('mem.bin')
+    memimg.write_bytes(b'\x01' * (PAGE_SIZE * 3))
+    assert len(sparsemem.getSparseImage(str(memimg), 3)[0]) == PAGE_SIZE * 3
+    with pytest.raises(ValueError):
+        sparsemem.getSparseImage(str(memimg), 2)
+
+@pytest.mark.parametrize('name, value', [('sim_pages', 0),
+                                          ('sim_addrwidth', sparsemem.MAX_ADDR_WIDTH + 1)])
+def test_sparse_configs(name, value):
+    configs = readConfigs(None)[0]
+    configs['sim_memory'] = 'sparse'
+    configs[name] = value
+    with pytest.raises(ValueError):
+        SystemBuilder().build(configs, 'userlogic', [])
@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+
+import pytest
+
+import pycoram.run_sweep as run_sweep
+
+THREAD = '''DSIZE = 4
+RAMSIZE = (
+    1024)
+
+def ctrl_thread():
+    ram = CoramMemory(idx=0, datawidth=DSIZE*8, size=RAMSIZE)
+
+ctrl_thread()
+'''
+
+CONFIG = '''
+[synthesis]
+fsm_compaction = yes
+
+[cthread:ctrl_thread]
+fsm_encoding = onehot
+'''
+
+def test_parameter():
+    assert run_sweep.parseParameter('DSIZE=4, 8,16') == ('DSIZE', ['4', '8', '16'])
+    with pytest.raises(ValueError):
+        run_sweep.parseParameter('DSIZE')
+    with pytest.raises(ValueError):
+        run_sweep.parseParameter('DSIZE=')
+
+def test_variants():
+    params = [ ('a', ['1', '2']), ('b', ['x', 'y', 'z']) ]
+    variants = run_sweep.getVariants(params)
+    assert len(variants) == 6
+    assert variants[0] == (('a', '1'), ('b', 'x'))
+    assert variants[-1] == (('a', '2'), ('b', 'z'))
+    assert run_sweep.getVariants([]) == [()]
+
+def test_config_value():
+    configs = { 'io_lite' : True, 'signal_width' : 32, 'if_type' : 'axi' }
+    assert run_sweep.getConfigValue(configs, 'io_lite', 'no') is False
+    assert run_sweep.getConfigValue(configs, 'io_lite', 'yes') is True
+    assert run_sweep.getConfigValue(configs, 'signal_width', '64') == 64
+    assert run_sweep.getConfigValue(configs, 'if_type', 'avalon') == 'avalon'
+
+def test_replace_constants():
+    assert run_sweep.getConstantLines(THREAD, 'RAMSIZE') == [(2, 3)]
+    assert run_sweep.getConstantLines(THREAD, 'ram') == []
+    source = run_sweep.replaceConstants(THREAD, [('DSIZE', '8'), ('RAMSIZE', '2048')])
+    lines = source.split('\n')
+    assert lines[0] == 'DSIZE = 8'
+    assert lines[1] == 'RAMSIZE = 2048'
+    # the lines of the statement are kept, for the line numbers of the profile
+    assert len(lines) == len(THREAD.split('\n'))
+    assert lines[2] == ''
+    assert lines[5] == THREAD.split('\n')[5]
+
+class FakeBuilder(object):
+    # records the build arguments instead of building
+    builds = []
+    def __init__(self, cache_dir=None):
+        pass
+    def build(self, configs, topmodule, userlogic_filelist, controlthread_filelist, **kwargs):
+        sources = [ open(f).read() for f in controlthread_filelist ]
+        FakeBuilder.builds.append( (configs, controlthread_filelist, sources, kwargs) )
+    def getStateCounts(self):
+        return { 'ctrl_thread' : 10 }
+    def getReport(self):
+        return { 'registers' : 1, 'register_bits' : 2, 'bram' : 3 }
+
+def test_build_variant(tmp_path, monkeypatch):
+    configfile = tmp_path.joinpath('test.config')
+    configfile.write_text(CONFIG)
+    monkeypatch.setattr(run_sweep, 'SystemBuilder', FakeBuilder)
+    FakeBuilder.builds = []
+    variant = (('signal_width', '64'), ('DSIZE', '8'))
+    args = (3, variant, str(tmp_path), str(configfile), 'userlogic', [],
+            [ ('/src/ctrl_thread.py', THREAD) ], [], [], None, None, None, False, 'iverilog')
+    result = run_sweep.buildVariant(args)
+    assert result['status'] == 'ok'
+    assert result['states'] == 10
+    assert result['signal_width'] == '64'
+
+    configs, filelist, sources, kwargs = FakeBuilder.builds[0]
+    assert configs['signal_width'] == 64
+    assert configs['fsm_compaction']
+    # the per-thread options of the configuration are passed to the build
+    assert kwargs['thread_options'] == { 'ctrl_thread' : { 'fsm_encoding' : 'onehot' } }
+    assert filelist == ['ctrl_thread.py']
+    assert sources[0].startswith('DSIZE = 8\n')
+    assert os.path.isfile(os.path.join(str(tmp_path), 'variant_0003', 'ctrl_thread.py'))
+
+def test_duplicate_thread_names(tmp_path, monkeypatch):
+    for d in ('a', 'b'):
+        tmp_path.joinpath(d).mkdir()
+        tmp_path.joinpath(d, 'ctrl_thread.py').write_text(THREAD)
+    tmp_path.joinpath('userlogic.v').write_text('module userlogic; endmodule\n')
+    monkeypatch.setattr(sys, 'argv', ['pycoram-sweep', '-p', 'DSIZE=4,8',
+                                      str(tmp_path.joinpath('userlogic.v')),
+                                      str(tmp_path.joinpath('a', 'ctrl_thread.py')),
+                                      str(tmp_path.joinpath('b', 'ctrl_thread.py'))])
+    with pytest.raises(IOError):
+        run_sweep.main()